@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Compare two benchmark reports and flag regressions.
+
+Usage: python bench/compare.py baseline.json candidate.json [--threshold 10]
+
+Exits with status 1 if any figure got worse by more than the threshold
+(in percent).
+"""
+
+import argparse
+import json
+import sys
+
+# (path in the report, True if higher is better)
+FIGURES = [
+    (("overall", "rps"), True),
+    (("overall", "latency_ms", "p50"), False),
+    (("overall", "latency_ms", "p95"), False),
+    (("overall", "latency_ms", "p99"), False),
+    (("overall", "ttft_ms", "p50"), False),
+    (("overall", "ttft_ms", "p95"), False),
+    (("overall", "ttft_ms", "p99"), False),
+    (("overall", "tokens_per_sec"), True),
+    (("overall", "output_tokens_per_sec"), True),
+    (("overall", "errors"), False),
+]
+
+
+def lookup(report, path):
+    value = report
+    for key in path:
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
+def compare(baseline, candidate, threshold):
+    """Return (rows, regressions) comparing each figure of two reports."""
+    rows = []
+    regressions = []
+    for path, higher_is_better in FIGURES:
+        name = ".".join(path[1:])
+        before, after = lookup(baseline, path), lookup(candidate, path)
+        if before is None or after is None:
+            rows.append((name, before, after, None))
+            continue
+
+        if before == 0:
+            change = 0.0 if after == 0 else float("inf")
+        else:
+            change = (after - before) / abs(before) * 100
+        rows.append((name, before, after, change))
+
+        worse = -change if higher_is_better else change
+        if worse > threshold:
+            regressions.append(name)
+    return rows, regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=10.0, help="Allowed regression in percent")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    rows, regressions = compare(baseline, candidate, args.threshold)
+    print(f"{'figure':<24} {'baseline':>12} {'candidate':>12} {'change':>9}")
+    for name, before, after, change in rows:
+        change_text = "n/a" if change is None else f"{change:+.1f}%"
+        flag = "  <-- regression" if name in regressions else ""
+        print(f"{name:<24} {str(before):>12} {str(after):>12} {change_text:>9}{flag}")
+
+    if regressions:
+        print(f"\n{len(regressions)} figure(s) regressed by more than {args.threshold:g}%")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+"""
+Deterministic stand-in for llama-cli and llama-server used by the benchmarks.
+
+Usage: fake_llama.py cli|server [llama.cpp arguments...]
+
+Output depends only on the prompt, and timing is controlled by environment
+variables so runs are reproducible:
+
+  FAKE_LLAMA_TPS         generated tokens per second (default 100)
+  FAKE_LLAMA_PROMPT_TPS  prompt tokens evaluated per second (default 2000)
+  FAKE_LLAMA_LOAD_MS     model load time in milliseconds (default 200)
+  FAKE_LLAMA_MAX_TOKENS  tokens generated when n_predict is unset (default 128)
+  FAKE_LLAMA_TOKEN_WORK  CPU work per token, in 64 KiB hashes split across
+                         --threads threads (default 0: paced by FAKE_LLAMA_TPS)
+
+With FAKE_LLAMA_TOKEN_WORK set the fake is CPU bound like llama.cpp: each
+token waits for all of its threads, so oversubscribed or unpinned processes
+competing for the same cores generate more slowly.
+"""
+
+import hashlib
+import json
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TPS = float(os.environ.get("FAKE_LLAMA_TPS", "100"))
+PROMPT_TPS = float(os.environ.get("FAKE_LLAMA_PROMPT_TPS", "2000"))
+LOAD_MS = float(os.environ.get("FAKE_LLAMA_LOAD_MS", "200"))
+MAX_TOKENS = int(os.environ.get("FAKE_LLAMA_MAX_TOKENS", "128"))
+TOKEN_WORK = int(os.environ.get("FAKE_LLAMA_TOKEN_WORK", "0"))
+
+# Hashing releases the GIL for large buffers, so the threads really run in parallel
+WORK_BLOCK = bytes(65536)
+
+WORDS = [
+    " the", " model", " answer", " is", " simple", ",", " and", " it", " works",
+    " well", " for", " most", " cases", ".", " In", " practice", " we", " see",
+    " fast", " results", " when", " caching", " helps", " a", " lot", "\n",
+]
+
+
+def arg_value(args, *names, default=None):
+    """Return the value following any of the given flags."""
+    for name in names:
+        if name in args:
+            index = args.index(name)
+            if index + 1 < len(args):
+                return args[index + 1]
+    return default
+
+
+class Compute:
+    """Thread pool burning TOKEN_WORK hashes per token, like a ggml graph."""
+
+    def __init__(self, args):
+        default = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count()
+        self.threads = max(1, int(arg_value(args, "-t", "--threads", default=str(default or 1))))
+        self.share = max(1, -(-TOKEN_WORK // self.threads))
+        self.start = threading.Barrier(self.threads + 1)
+        self.done = threading.Barrier(self.threads + 1)
+        # Parallel slots of a server take turns on the threads
+        self.lock = threading.Lock()
+        for _ in range(self.threads):
+            threading.Thread(target=self._work, daemon=True).start()
+
+    def _work(self):
+        while True:
+            self.start.wait()
+            for _ in range(self.share):
+                hashlib.sha256(WORK_BLOCK).digest()
+            self.done.wait()
+
+    def step(self):
+        with self.lock:
+            self.start.wait()
+            self.done.wait()
+
+
+def prompt_tokens(prompt):
+    """Rough token count: about four characters per token."""
+    return max(1, len(prompt) // 4)
+
+
+def generate_tokens(prompt, n_predict, compute=None):
+    """Yield a deterministic token sequence for the prompt, paced at TPS or by compute."""
+    seed = int.from_bytes(hashlib.sha256(prompt.encode()).digest()[:8], "little")
+    rng = random.Random(seed)
+    count = n_predict if n_predict and n_predict > 0 else MAX_TOKENS
+    delay = 1.0 / TPS if TPS > 0 else 0.0
+    next_at = time.monotonic()
+    for _ in range(count):
+        if compute is not None:
+            compute.step()
+            yield rng.choice(WORDS)
+            continue
+        next_at += delay
+        pause = next_at - time.monotonic()
+        if pause > 0:
+            time.sleep(pause)
+        yield rng.choice(WORDS)
+
+
+def stop_at(tokens, stop):
+    """Pass tokens through until the text contains a stop string, which is left out."""
+    text = ""
+    for token in tokens:
+        text += token
+        if any(s in text for s in stop):
+            return
+        yield token
+
+
+def perf_lines(n_prompt, prompt_ms, n_eval, eval_ms, load_ms):
+    """llama.cpp-style perf summary."""
+    def rate(n, ms):
+        return (ms / n if n else 0.0), (1000.0 * n / ms if ms else 0.0)
+
+    prompt_per, prompt_rate = rate(n_prompt, prompt_ms)
+    eval_per, eval_rate = rate(n_eval, eval_ms)
+    return (
+        f"llama_perf_context_print:        load time = {load_ms:10.2f} ms\n"
+        f"llama_perf_context_print: prompt eval time = {prompt_ms:10.2f} ms / {n_prompt:5d} tokens "
+        f"({prompt_per:8.2f} ms per token, {prompt_rate:8.2f} tokens per second)\n"
+        f"llama_perf_context_print:        eval time = {eval_ms:10.2f} ms / {n_eval:5d} runs   "
+        f"({eval_per:8.2f} ms per token, {eval_rate:8.2f} tokens per second)\n"
+        f"llama_perf_context_print:       total time = {load_ms + prompt_ms + eval_ms:10.2f} ms / "
+        f"{n_prompt + n_eval:5d} tokens\n"
+    )
+
+
+def run_cli(args):
+    # Like llama.cpp, which only saves the whole session in non-interactive mode
+    if "--prompt-cache-all" in args and not {"-no-cnv", "--no-conversation"} & set(args):
+        sys.stderr.write("error: --prompt-cache-all not supported in interactive mode yet\n")
+        sys.exit(1)
+    prompt = sys.stdin.read()
+    n_predict = int(arg_value(args, "-n", "--n-predict", default="-1"))
+    compute = Compute(args) if TOKEN_WORK else None
+
+    time.sleep(LOAD_MS / 1000)
+    n_prompt = prompt_tokens(prompt)
+    prompt_ms = 1000.0 * n_prompt / PROMPT_TPS
+    time.sleep(prompt_ms / 1000)
+
+    # llama-cli echoes the prompt before generating
+    sys.stdout.write(prompt)
+    sys.stdout.flush()
+
+    started = time.monotonic()
+    n_eval = 0
+    for token in generate_tokens(prompt, n_predict, compute):
+        sys.stdout.write(token)
+        sys.stdout.flush()
+        n_eval += 1
+    eval_ms = (time.monotonic() - started) * 1000
+    sys.stdout.write("\n")
+    sys.stdout.flush()
+
+    sys.stderr.write(perf_lines(n_prompt, prompt_ms, n_eval, eval_ms, LOAD_MS))
+
+
+def run_server(args):
+    host = arg_value(args, "--host", default="127.0.0.1")
+    port = int(arg_value(args, "--port", default="8080"))
+    slots = threading.Semaphore(int(arg_value(args, "-np", "--parallel", default="1")))
+    loaded = threading.Event()
+    compute = Compute(args) if TOKEN_WORK else None
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def send_json(self, status, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path != "/health":
+                self.send_json(404, {"error": "not found"})
+            elif loaded.is_set():
+                self.send_json(200, {"status": "ok"})
+            else:
+                self.send_json(503, {"error": {"message": "Loading model"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", "0"))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if self.path != "/completion":
+                self.send_json(404, {"error": "not found"})
+                return
+            with slots:
+                self.complete(body)
+
+        def complete(self, body):
+            prompt = body.get("prompt", "")
+            n_prompt = prompt_tokens(prompt)
+            prompt_ms = 1000.0 * n_prompt / PROMPT_TPS
+            time.sleep(prompt_ms / 1000)
+
+            started = time.monotonic()
+            n_predict = int(body.get("n_predict", -1))
+            tokens = stop_at(generate_tokens(prompt, n_predict, compute), body.get("stop") or [])
+
+            def timings(n_eval):
+                return {
+                    "prompt_n": n_prompt,
+                    "prompt_ms": prompt_ms,
+                    "predicted_n": n_eval,
+                    "predicted_ms": (time.monotonic() - started) * 1000,
+                }
+
+            def stop_fields(n_eval):
+                limited = n_eval == (n_predict if n_predict > 0 else MAX_TOKENS)
+                return {"stop": True, "stopped_limit": limited, "stopped_word": not limited}
+
+            if not body.get("stream"):
+                generated = list(tokens)
+                self.send_json(200, {
+                    "content": "".join(generated),
+                    "timings": timings(len(generated)),
+                    **stop_fields(len(generated)),
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+
+            def event(payload):
+                data = f"data: {json.dumps(payload)}\n\n".encode()
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            n_eval = 0
+            try:
+                for token in tokens:
+                    n_eval += 1
+                    event({"content": token, "stop": False})
+                event({"content": "", "timings": timings(n_eval), **stop_fields(n_eval)})
+                self.wfile.write(b"0\r\n\r\n")
+            except (BrokenPipeError, ConnectionResetError):
+                # The client cancelled the completion
+                pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Timer(LOAD_MS / 1000, loaded.set).start()
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] not in ("cli", "server"):
+        sys.exit("usage: fake_llama.py cli|server [args...]")
+    if sys.argv[1] == "cli":
+        run_cli(sys.argv[2:])
+    else:
+        run_server(sys.argv[2:])
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Load generator for a running llama.cpp-web server.
+
+Drives /api/generate, /api/generate/stream and /api/chat at a fixed
+concurrency with a weighted request mix and prints a JSON report with
+RPS, latency and time-to-first-token percentiles and tokens/sec.
+
+Example:
+  python bench/loadgen.py --model bench --concurrency 8 --requests 200 \\
+      --mix generate=2,stream=1,chat=1 --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+import httpx
+
+KINDS = ("generate", "stream", "chat", "chat_stream")
+
+
+def parse_mix(text):
+    """Parse "generate=2,stream=1" into {"generate": 2.0, "stream": 1.0}."""
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in KINDS:
+            raise ValueError(f"Unknown request kind '{name}' (expected one of {', '.join(KINDS)})")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def percentile(values, p):
+    """Nearest-rank percentile of a list of numbers."""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))]
+
+
+def summarize(results, wall_time):
+    """Aggregate per-request results into report figures."""
+    ok = [r for r in results if r["ok"]]
+    latencies = [r["latency"] for r in ok]
+    ttfts = [r["ttft"] for r in ok if r["ttft"] is not None]
+    rates = [r["eval_count"] / r["eval_duration"] for r in ok if r["eval_count"] and r["eval_duration"]]
+    generated = sum(r["eval_count"] for r in ok)
+
+    def ms(value):
+        return round(value * 1000, 2) if value is not None else None
+
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "rps": round(len(ok) / wall_time, 3) if wall_time else 0.0,
+        "latency_ms": {f"p{p}": ms(percentile(latencies, p)) for p in (50, 95, 99)},
+        "ttft_ms": {f"p{p}": ms(percentile(ttfts, p)) for p in (50, 95, 99)},
+        "tokens_per_sec": round(sum(rates) / len(rates), 2) if rates else None,
+        "output_tokens_per_sec": round(generated / wall_time, 2) if wall_time else 0.0,
+    }
+
+
+class LoadGenerator:
+    """Issues requests from a fixed number of concurrent workers."""
+
+    def __init__(self, url, model, mix, max_tokens, prompt, seed=0):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.kinds = list(mix)
+        self.weights = [mix[k] for k in self.kinds]
+        self.options = {"max_tokens": max_tokens, "temperature": 0.7}
+        self.prompt = prompt
+        self.rng = random.Random(seed)
+
+    async def run(self, concurrency, total_requests):
+        counter = iter(range(total_requests))
+        results = []
+
+        async with httpx.AsyncClient(base_url=self.url, timeout=httpx.Timeout(600.0)) as client:
+            async def worker():
+                for index in counter:
+                    kind = self.rng.choices(self.kinds, self.weights)[0]
+                    results.append(await self.request(client, kind, index))
+
+            started = time.perf_counter()
+            await asyncio.gather(*(worker() for _ in range(concurrency)))
+            wall_time = time.perf_counter() - started
+
+        return results, wall_time
+
+    def _body(self, kind, index):
+        # A distinct prompt per request keeps the response cache out of the measurement
+        text = f"{self.prompt} (request {index})"
+        if kind.startswith("chat"):
+            return "/api/chat", {
+                "model": self.model,
+                "messages": [{"role": "user", "content": text}],
+                "stream": kind == "chat_stream",
+                "options": self.options,
+            }
+        if kind == "stream":
+            return "/api/generate/stream", {"model": self.model, "prompt": text, "options": self.options}
+        return "/api/generate", {"model": self.model, "prompt": text, "options": self.options}
+
+    async def request(self, client, kind, index):
+        path, body = self._body(kind, index)
+        result = {"kind": kind, "ok": False, "status": None, "latency": None,
+                  "ttft": None, "eval_count": 0, "eval_duration": 0.0}
+        started = time.perf_counter()
+        try:
+            if kind in ("stream", "chat_stream"):
+                final = await self._stream(client, path, body, started, result)
+            else:
+                response = await client.post(path, json=body)
+                result["status"] = response.status_code
+                final = response.json() if response.status_code == 200 else None
+        except (httpx.HTTPError, ValueError) as e:
+            result["error"] = str(e)
+            return result
+
+        result["latency"] = time.perf_counter() - started
+        if final is not None and "error" not in final:
+            result["ok"] = True
+            result["eval_count"] = final.get("eval_count", 0)
+            result["eval_duration"] = final.get("eval_duration", 0) / 1e9
+        return result
+
+    async def _stream(self, client, path, body, started, result):
+        """Read an SSE or NDJSON stream, timing the first content frame."""
+        final = None
+        async with client.stream("POST", path, json=body) as response:
+            result["status"] = response.status_code
+            if response.status_code != 200:
+                await response.aread()
+                return None
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    line = line[6:]
+                if not line.strip():
+                    continue
+                frame = json.loads(line)
+                content = frame.get("response") or frame.get("message", {}).get("content")
+                if content and not frame.get("done") and result["ttft"] is None:
+                    result["ttft"] = time.perf_counter() - started
+                if frame.get("done") or "error" in frame:
+                    final = frame
+        return final
+
+
+async def run_load(url, model, mix, concurrency, requests, max_tokens, prompt, seed=0):
+    """Run a load test and return the JSON-serializable report."""
+    generator = LoadGenerator(url, model, mix, max_tokens, prompt, seed)
+    results, wall_time = await generator.run(concurrency, requests)
+
+    by_kind = {}
+    for kind in mix:
+        kind_results = [r for r in results if r["kind"] == kind]
+        if kind_results:
+            by_kind[kind] = summarize(kind_results, wall_time)
+
+    return {
+        "config": {
+            "model": model,
+            "concurrency": concurrency,
+            "requests": requests,
+            "mix": mix,
+            "max_tokens": max_tokens,
+        },
+        "wall_time_s": round(wall_time, 3),
+        "overall": summarize(results, wall_time),
+        "by_kind": by_kind,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:11434")
+    parser.add_argument("--model", required=True)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--mix", default="generate=1,stream=1,chat=1")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--prompt", default="Explain why the sky is blue.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    args = parser.parse_args()
+
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    report = asyncio.run(run_load(
+        args.url, args.model, mix, args.concurrency, args.requests,
+        args.max_tokens, args.prompt, args.seed
+    ))
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+
+if __name__ == "__main__":
+    main()
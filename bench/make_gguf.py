@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Write a tiny but valid GGUF file for benchmarking.
+
+Only the header is meaningful (architecture, context length, chat template,
+vocabulary and tensor infos); the fake llama.cpp executables never read it.
+"""
+
+import argparse
+import struct
+
+GGUF_UINT32 = 4
+GGUF_INT32 = 5
+GGUF_FLOAT32 = 6
+GGUF_STRING = 8
+GGUF_ARRAY = 9
+
+CHATML_TEMPLATE = (
+    "{% for message in messages %}<|im_start|>{{ message['role'] }}\n"
+    "{{ message['content'] }}<|im_end|>\n{% endfor %}"
+    "{% if add_generation_prompt %}<|im_start|>assistant\n{% endif %}"
+)
+
+
+def _string(value):
+    data = value.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def _kv_string(key, value):
+    return _string(key) + struct.pack("<I", GGUF_STRING) + _string(value)
+
+
+def _kv_uint32(key, value):
+    return _string(key) + struct.pack("<II", GGUF_UINT32, value)
+
+
+def _kv_strings(key, values):
+    header = struct.pack("<IIQ", GGUF_ARRAY, GGUF_STRING, len(values))
+    return _string(key) + header + b"".join(_string(v) for v in values)
+
+
+def _kv_numbers(key, value_type, fmt, values):
+    header = struct.pack("<IIQ", GGUF_ARRAY, value_type, len(values))
+    return _string(key) + header + b"".join(struct.pack(fmt, v) for v in values)
+
+
+def spm_vocab(words):
+    """SentencePiece tokens, scores and token types able to spell ``words``.
+
+    Every prefix of each word is a piece, with and without the "▁" word
+    marker, scored by length so whole words win; other text falls back to
+    the 256 byte tokens.
+    """
+    tokens = ["<unk>", "<s>", "</s>", "<|im_start|>", "<|im_end|>"]
+    # unknown, control, control, user-defined, user-defined
+    token_types = [2, 3, 3, 4, 4]
+    tokens += [f"<0x{byte:02X}>" for byte in range(256)]
+    token_types += [6] * 256
+
+    pieces = set("▁")
+    for word in words:
+        for end in range(1, len(word) + 1):
+            pieces.add(word[:end])
+            pieces.add("▁" + word[:end])
+    pieces = sorted(pieces, key=lambda piece: (len(piece), piece))
+    scores = [0.0] * len(tokens) + [float(len(piece)) for piece in pieces]
+    tokens += pieces
+    token_types += [1] * len(pieces)
+    return tokens, scores, token_types
+
+
+def _tensor_info(name, dims):
+    dims_data = b"".join(struct.pack("<Q", d) for d in dims)
+    # ggml type 0 (F32) at data offset 0
+    return _string(name) + struct.pack("<I", len(dims)) + dims_data + struct.pack("<IQ", 0, 0)
+
+
+def write_gguf(path, architecture="llama", context_length=4096, vocab_size=256, words=None):
+    """Write a GGUF header describing a small llama-style model.
+
+    With ``words`` the vocabulary is a real, if tiny, SentencePiece one
+    (see spm_vocab) that the in-process tokenizer can encode any text with.
+    """
+    vocab = []
+    if words:
+        tokens, scores, token_types = spm_vocab(words)
+        vocab = [
+            _kv_numbers("tokenizer.ggml.scores", GGUF_FLOAT32, "<f", scores),
+            _kv_numbers("tokenizer.ggml.token_type", GGUF_INT32, "<i", token_types),
+            _kv_uint32("tokenizer.ggml.bos_token_id", 1),
+        ]
+    else:
+        tokens = ["<unk>", "<s>", "</s>", "<|im_start|>", "<|im_end|>"]
+        tokens += [f"tok{i}" for i in range(vocab_size - len(tokens))]
+    metadata = [
+        _kv_string("general.architecture", architecture),
+        _kv_string("general.name", "bench"),
+        _kv_uint32("general.file_type", 15),
+        _kv_uint32(f"{architecture}.context_length", context_length),
+        _kv_uint32(f"{architecture}.embedding_length", 256),
+        _kv_uint32(f"{architecture}.block_count", 4),
+        _kv_uint32(f"{architecture}.attention.head_count", 4),
+        _kv_string("tokenizer.ggml.model", "llama"),
+        _kv_strings("tokenizer.ggml.tokens", tokens),
+        *vocab,
+        _kv_uint32("tokenizer.ggml.eos_token_id", 2),
+        _kv_string("tokenizer.chat_template", CHATML_TEMPLATE),
+    ]
+    tensors = [
+        _tensor_info("token_embd.weight", [256, len(tokens)]),
+        _tensor_info("blk.0.attn_q.weight", [256, 256]),
+    ]
+    header = b"GGUF" + struct.pack("<IQQ", 3, len(tensors), len(metadata))
+    with open(path, "wb") as f:
+        f.write(header + b"".join(metadata) + b"".join(tensors))
+        # Stand-in for tensor data so the file has a realistic shape
+        f.write(b"\0" * 4096)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("path", help="Output .gguf path")
+    parser.add_argument("--architecture", default="llama")
+    parser.add_argument("--context-length", type=int, default=4096)
+    args = parser.parse_args()
+    write_gguf(args.path, args.architecture, args.context_length)
+
+
+if __name__ == "__main__":
+    main()
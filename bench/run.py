@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Run an offline benchmark against the fake llama.cpp backend.
+
+Starts the server on a free port with a generated config that points at a
+tiny GGUF file and puts bench/bin (fake llama-cli/llama-server) first on
+PATH, runs the load generator, and writes the JSON report.
+
+Example:
+  python bench/run.py --backend server --workers 2 --concurrency 8 \\
+      --requests 200 --output results/server.json --compare results/baseline.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import yaml
+
+from compare import compare
+from loadgen import parse_mix, run_load
+from make_gguf import write_gguf
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+MODEL_NAME = "bench"
+
+
+def free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def write_config(workdir, args, port):
+    """Write a models.yaml for the benchmark run."""
+    model_path = os.path.join(workdir, "bench.gguf")
+    write_gguf(model_path)
+
+    model = {
+        "path": model_path,
+        "name": MODEL_NAME,
+        "backend": args.backend,
+        "parameters": {"temperature": 0.7, "max_tokens": args.max_tokens},
+    }
+    if args.backend == "server":
+        model["workers"] = args.workers
+        model["parallel"] = args.parallel
+    model["scheduler"] = {
+        "max_concurrency": args.max_concurrency or (args.workers * args.parallel if args.backend == "server" else args.concurrency),
+        "max_queue": max(16, args.concurrency * 2),
+        "queue_timeout": 300,
+    }
+
+    config = {
+        "models": {MODEL_NAME: model},
+        "cpu": {"policy": args.cpu_policy},
+        "server": {"host": "127.0.0.1", "port": port},
+        "cache": {"enabled": False},
+        "sessions": {"cache_dir": os.path.join(workdir, "sessions")},
+        "model_index": {"path": os.path.join(workdir, "model_index.json")},
+    }
+    path = os.path.join(workdir, "models.yaml")
+    with open(path, "w") as f:
+        yaml.safe_dump(config, f)
+    return path
+
+
+def start_server(config_path, port, args, log):
+    env = dict(os.environ)
+    env["LLAMA_WEB_CONFIG"] = config_path
+    env["PATH"] = os.path.join(BENCH_DIR, "bin") + os.pathsep + env.get("PATH", "")
+    env["PYTHON"] = sys.executable
+    env["FAKE_LLAMA_TPS"] = str(args.tps)
+    env["FAKE_LLAMA_LOAD_MS"] = str(args.load_ms)
+    env["FAKE_LLAMA_TOKEN_WORK"] = str(args.token_work)
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "src.server:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=REPO_DIR,
+        env=env,
+        stdout=log,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_ready(url, process, timeout=60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            # Models are warm once /ready answers 200
+            if httpx.get(f"{url}/ready", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError("Server did not become ready in time")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("cli", "server"), default="cli")
+    parser.add_argument("--workers", type=int, default=1, help="llama-server workers (server backend)")
+    parser.add_argument("--parallel", type=int, default=1, help="slots per worker (server backend)")
+    parser.add_argument("--max-concurrency", type=int, help="scheduler concurrency limit")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--mix", default="generate=1,stream=1,chat=1")
+    parser.add_argument("--max-tokens", type=int, default=32)
+    parser.add_argument("--tps", type=float, default=100.0, help="fake tokens per second")
+    parser.add_argument("--load-ms", type=float, default=200.0, help="fake model load time")
+    parser.add_argument("--token-work", type=int, default=0,
+                        help="CPU work per fake token (64 KiB hashes); makes thread settings matter")
+    parser.add_argument("--cpu-policy", choices=("partition", "shared", "off"), default="partition",
+                        help="how llama.cpp workers share the cores")
+    parser.add_argument("--warmup", type=int, default=4, help="requests sent before measuring")
+    parser.add_argument("--output", help="Write the JSON report here")
+    parser.add_argument("--compare", help="Baseline report to compare against")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    mix = parse_mix(args.mix)
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+
+    with tempfile.TemporaryDirectory(prefix="llama-web-bench-") as workdir:
+        config_path = write_config(workdir, args, port)
+        with open(os.path.join(workdir, "server.log"), "w") as log:
+            process = start_server(config_path, port, args, log)
+            try:
+                wait_until_ready(url, process)
+                if args.warmup:
+                    asyncio.run(run_load(url, MODEL_NAME, mix, args.concurrency, args.warmup,
+                                         args.max_tokens, "warmup"))
+                report = asyncio.run(run_load(url, MODEL_NAME, mix, args.concurrency, args.requests,
+                                              args.max_tokens, "Explain why the sky is blue."))
+            finally:
+                process.terminate()
+                try:
+                    process.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    process.kill()
+
+    report["config"].update({
+        "backend": args.backend,
+        "workers": args.workers,
+        "parallel": args.parallel,
+        "fake_tps": args.tps,
+        "token_work": args.token_work,
+        "cpu_policy": args.cpu_policy,
+    })
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        _, regressions = compare(baseline, report, args.threshold)
+        if regressions:
+            print(f"Regressed by more than {args.threshold:g}%: {', '.join(regressions)}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
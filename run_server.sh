@@ -12,7 +12,7 @@ if ! command -v python3 &> /dev/null; then
 fi
 
 # Check if requirements are installed
-if ! python3 -c "import fastapi, uvicorn, pydantic, yaml" 2>/dev/null; then
+if ! python3 -c "import fastapi, uvicorn, pydantic, yaml, httpx" 2>/dev/null; then
     echo "📦 Installing dependencies..."
     pip3 install -r requirements.txt
 fi
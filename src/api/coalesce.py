@@ -0,0 +1,126 @@
+import asyncio
+from typing import Dict, Any, Optional, List, Callable, Awaitable
+
+from ..utils.logging import logger
+
+
+class Flight:
+    """One in-flight generation shared by identical requests.
+
+    The producer publishes chunks as they are generated; every caller follows
+    the flight from the first chunk, so late joiners get the prefix produced
+    so far replayed and then the live tail.
+    """
+
+    def __init__(self, key: Optional[str]):
+        self.key = key
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        # Completion fields (stats, done_reason) set by the producer
+        self.final: Dict[str, Any] = {}
+        self.followers = 0
+        self.task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def text(self) -> str:
+        return "".join(self.chunks)
+
+    def _wake(self):
+        # Each wait gets a fresh event, so followers never miss an update
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._wake()
+
+    def finish(self, **final: Any):
+        self.final = final
+        self.done = True
+        self._wake()
+
+    def fail(self, error: BaseException):
+        self.error = error
+        self.done = True
+        self._wake()
+
+    async def follow(self):
+        """Yield every chunk of the generation, waiting for new ones as needed."""
+        self.followers += 1
+        index = 0
+        try:
+            while True:
+                while index < len(self.chunks):
+                    yield self.chunks[index]
+                    index += 1
+                if self.error is not None:
+                    raise self.error
+                if self.done:
+                    return
+                await self._changed.wait()
+        finally:
+            self.followers -= 1
+            if self.followers == 0 and not self.done and self.task is not None:
+                # Every caller went away; nobody needs the rest of the output
+                logger.info("Every caller of a generation went away, cancelling it")
+                self.task.cancel()
+
+    async def result(self) -> str:
+        """Wait for the whole generation and return its text."""
+        async for _ in self.follow():
+            pass
+        return self.text
+
+
+class SingleFlight:
+    """Registry of in-flight generations keyed by request identity."""
+
+    def __init__(self):
+        self._flights: Dict[str, Flight] = {}
+        self.started = 0
+        self.joined = 0
+
+    def join(self, key: str) -> Optional[Flight]:
+        """The running flight for a key, if any."""
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.joined += 1
+        return flight
+
+    def begin(self, key: Optional[str]) -> Flight:
+        """Register a new flight that later identical requests can join.
+
+        A flight without a key is private to its caller (the request's
+        output is not reproducible, so nobody else may share it).
+        """
+        flight = Flight(key)
+        if key is not None:
+            self._flights[key] = flight
+            self.started += 1
+        return flight
+
+    def run(self, flight: Flight, producer: Callable[[Flight], Awaitable[None]]):
+        """Run the producer that fills a flight."""
+        flight.task = asyncio.create_task(self._run(flight, producer))
+
+    def abort(self, flight: Flight, error: BaseException):
+        """Fail a flight that never started, e.g. because admission was refused."""
+        flight.fail(error)
+        self._forget(flight)
+
+    def _forget(self, flight: Flight):
+        if flight.key is not None and self._flights.get(flight.key) is flight:
+            del self._flights[flight.key]
+
+    async def _run(self, flight: Flight, producer: Callable[[Flight], Awaitable[None]]):
+        try:
+            await producer(flight)
+        except (asyncio.CancelledError, Exception) as e:
+            flight.fail(e)
+        finally:
+            self._forget(flight)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"in_flight": len(self._flights), "started": self.started, "joined": self.joined}
@@ -1,25 +1,585 @@
+import asyncio
+import functools
+import json
+import math
 import time
+import yaml
 from datetime import datetime
-from typing import Dict, Any, Optional
-from fastapi import APIRouter, HTTPException, Response
+from typing import Dict, Any, Optional, List, Tuple, Callable, Awaitable
+from fastapi import APIRouter, HTTPException, Request, Response, Header
 from fastapi.responses import StreamingResponse
-import json
 
 from .schemas import (
     GenerateRequest, GenerateResponse, ChatRequest, ChatResponse,
-    TagsResponse, ShowRequest, ShowResponse, ModelInfo, ChatMessage
+    TagsResponse, ShowRequest, ShowResponse, ModelInfo, ChatMessage,
+    PsResponse, RunningModel, BatchRequest, BatchItem,
+    EmbeddingsRequest, EmbeddingsResponse, EmbedRequest, EmbedResponse,
+    TokenizeRequest, TokenizeResponse, DetokenizeRequest, DetokenizeResponse
 )
+from .streaming import StreamEncoder
+from .coalesce import Flight, SingleFlight
 from ..models.llama_wrapper import ModelRegistry
+from ..models.cache import ResponseCache
+from ..models.embeddings import EmbeddingCache, EmbeddingBatcher
+from ..models.backends.base import EMBED, BackendCapabilityError
+from ..models.sessions import Session, SessionStore, default_session_dir
+from ..models.scheduler import RequestScheduler, SchedulerRejected, Lease
+from ..models.lifecycle import ModelLifecycle, parse_keep_alive, default_memory_budget
+from ..models.timings import GenerationStats
+from ..models.cpu import cpu_planner
+from ..models.context_budget import ContextBudget
+from ..models.warmup import Warmup
+from ..utils import metrics
 from ..utils.config import config
-from ..utils.logging import logger
+from ..utils.logging import logger, configure_logging, REQUEST_LOG, CHUNK_LOG
 
 
 # Create router
 router = APIRouter(prefix="/api")
 
-# Initialize model registry
+# Options about delivery rather than content, left out of request identity
+TRANSPORT_OPTIONS = frozenset({"timeout", "keep_alive"})
+
+# Initialize model registry (models are built from the configuration on first use)
 model_registry = ModelRegistry(config)
 
+# Per-model admission control
+scheduler = RequestScheduler(config)
+
+
+def _create_model_lifecycle() -> ModelLifecycle:
+    """Build the model lifecycle manager from configuration."""
+    settings = config.get_lifecycle_config()
+    budget_mb = settings.get("memory_budget_mb")
+    return ModelLifecycle(
+        memory_budget=int(budget_mb * 1024 * 1024) if budget_mb is not None else default_memory_budget(),
+        default_keep_alive=parse_keep_alive(settings.get("keep_alive", "5m")),
+        check_interval=float(settings.get("check_interval", 5.0)),
+        wait_timeout=float(settings.get("wait_timeout", 60.0))
+    )
+
+
+# Loads models on first use and unloads idle ones
+model_lifecycle: Optional[ModelLifecycle] = None
+
+
+def _create_response_cache() -> Optional[ResponseCache]:
+    """Build the response cache from configuration, if enabled."""
+    settings = config.get_cache_config()
+    if not settings.get("enabled", True):
+        return None
+    return ResponseCache(
+        max_bytes=int(settings.get("max_memory_mb", 64) * 1024 * 1024),
+        ttl=float(settings.get("ttl", 3600)),
+        disk_path=settings.get("disk_path"),
+        disk_max_bytes=int(settings.get("disk_max_mb", 0) * 1024 * 1024)
+    )
+
+
+# Cache for deterministic generations
+response_cache: Optional[ResponseCache] = None
+
+
+def _create_session_store() -> Optional[SessionStore]:
+    """Build the conversation session store from configuration, if enabled."""
+    settings = config.get_sessions_config()
+    if not settings.get("enabled", True):
+        return None
+    return SessionStore(
+        cache_dir=settings.get("cache_dir") or default_session_dir(),
+        max_sessions=int(settings.get("max_sessions", 256)),
+        max_bytes=int(settings.get("max_disk_mb", 2048) * 1024 * 1024),
+        idle_ttl=float(settings.get("idle_ttl", 1800))
+    )
+
+
+# Per-conversation llama.cpp prompt/KV state
+session_store: Optional[SessionStore] = None
+
+# Identical deterministic requests in flight share one generation
+inflight = SingleFlight()
+
+# Seconds between checks for a vanished client on non-streaming requests
+DISCONNECT_POLL_INTERVAL = 0.5
+
+
+def _create_embedding_cache() -> Optional[EmbeddingCache]:
+    """Build the embedding vector cache from configuration, if enabled."""
+    max_mb = config.get_embeddings_config().get("cache_max_mb", 128)
+    if not max_mb:
+        return None
+    return EmbeddingCache(max_bytes=int(max_mb * 1024 * 1024))
+
+
+# Embedding vectors by content hash
+embedding_cache: Optional[EmbeddingCache] = None
+
+# Per-model embedding micro-batchers, created on first use
+embedding_batchers: Dict[str, EmbeddingBatcher] = {}
+
+
+def _create_context_budget() -> ContextBudget:
+    """Build the chat history trimmer from configuration."""
+    return ContextBudget(config.get_context_config())
+
+
+# Fits chat history into each model's context window
+context_budget: Optional[ContextBudget] = None
+
+
+def _create_warmup() -> Warmup:
+    """Build the startup warmup from configuration."""
+    return Warmup(config.get_warmup_config(), model_registry, model_lifecycle, scheduler)
+
+
+# Prefetches, loads and exercises models before the instance reports ready
+warmup: Optional[Warmup] = None
+
+
+def init_services():
+    """Read the configuration and build the services that depend on it.
+
+    Called on application startup rather than at import, so importing the
+    API does not require a configuration file. Models are built here too,
+    so a broken configuration fails startup instead of the first request.
+    """
+    global model_lifecycle, response_cache, session_store, embedding_cache, context_budget, warmup
+    configure_logging(config.get_logging_config())
+    cpu_planner.configure(config.get_cpu_config(), concurrency=scheduler.capacity)
+    model_lifecycle = _create_model_lifecycle()
+    response_cache = _create_response_cache()
+    session_store = _create_session_store()
+    embedding_cache = _create_embedding_cache()
+    context_budget = _create_context_budget()
+    model_registry.list_models()
+    warmup = _create_warmup()
+
+
+def start_warmup():
+    """Start warming models in the background (needs a running event loop)."""
+    if warmup is not None:
+        warmup.start()
+
+
+def readiness() -> Tuple[bool, Dict[str, Any]]:
+    """Whether the instance should receive traffic, with per-model warmup progress."""
+    if warmup is None:
+        return False, {"status": "starting", "models": {}}
+    return warmup.ready, warmup.stats()
+
+
+async def shutdown_services():
+    """Unload models, stop resident llama.cpp workers and drop conversation state."""
+    if warmup is not None:
+        # Fail readiness first so load balancers stop sending requests
+        await warmup.stop()
+    if model_lifecycle is not None:
+        await model_lifecycle.shutdown()
+    await model_registry.shutdown()
+    if session_store is not None:
+        session_store.clear()
+
+
+async def reload_models() -> Dict[str, Any]:
+    """Apply a changed configuration file to the model set without a restart.
+
+    Per-model state tied to a replaced or removed version (its scheduler
+    queue, embedding batcher and conversation sessions) is dropped so the
+    next request starts from the new definition. Changed scheduler defaults
+    rebuild the queues of every model.
+    """
+    summary = await model_registry.reload(model_lifecycle)
+    scheduler.reconfigure()
+    configure_logging(config.get_logging_config())
+    cpu_planner.configure(config.get_cpu_config())
+    if context_budget is not None:
+        context_budget.settings = config.get_context_config()
+    for model_name in summary["changed"] + summary["removed"]:
+        scheduler.forget(model_name)
+        embedding_batchers.pop(model_name, None)
+        if session_store is not None:
+            session_store.discard_model(model_name)
+    return summary
+
+
+async def _acquire_slot(model, priority: str, keep_alive=None) -> Lease:
+    """Acquire a scheduler slot and make sure the model is loaded.
+    
+    Overload is mapped to a fast 429/503; the model stays held until the
+    lease is released.
+    """
+    try:
+        keep_alive = model_lifecycle.resolve_keep_alive(model, keep_alive)
+        lease = await scheduler.acquire(model.model_name, priority)
+        try:
+            residency = await model_lifecycle.acquire(model, keep_alive)
+        except BaseException:
+            lease.release()
+            raise
+        lease.load_duration = residency.load_duration
+        lease.on_release(residency.release)
+        return lease
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except SchedulerRejected as e:
+        logger.warning(f"Rejected request for {model.model_name}: {e}")
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=str(e),
+            headers={"Retry-After": str(e.retry_after)}
+        )
+
+
+def _queue_wait_header(lease: Lease) -> Dict[str, str]:
+    """Response header reporting how long the request waited in queue."""
+    return {"X-Queue-Wait-Ms": f"{lease.wait_time * 1000:.1f}"}
+
+
+def _record_generation(endpoint: str, model_name: str, start_time: float, lease: Lease, stats: GenerationStats):
+    """Feed a finished generation's timings into the metrics."""
+    labels = {"model": model_name, "endpoint": endpoint}
+    metrics.request_latency.observe(time.time() - start_time, **labels)
+    metrics.queue_wait.observe(lease.wait_time, **labels)
+    if stats.first_token_at is not None:
+        metrics.time_to_first_token.observe(stats.first_token_at - start_time, **labels)
+    if stats.spawn_duration is not None:
+        metrics.spawn_time.observe(stats.spawn_duration, **labels)
+    if stats.tokens_per_second is not None:
+        metrics.tokens_per_second.observe(stats.tokens_per_second, **labels)
+    if stats.draft_acceptance_rate is not None:
+        metrics.draft_acceptance.observe(stats.draft_acceptance_rate, **labels)
+    metrics.prompt_tokens.inc(stats.prompt_eval_count, **labels)
+    metrics.generated_tokens.inc(stats.eval_count, **labels)
+
+
+def _request_key(model, prompt: str, options: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Identity of a request whose output is reproducible, or None."""
+    try:
+        if not model.is_deterministic(options):
+            return None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    model_info = model_registry.get_model_info(model.model_name)
+    if not model_info:
+        return None
+    
+    parameters = {
+        name: value for name, value in model.merged_parameters(options).items()
+        if name not in TRANSPORT_OPTIONS
+    }
+    return ResponseCache.make_key(
+        model.model_name,
+        model_info["path"],
+        model_info["size"],
+        model_info["modified_at"],
+        prompt,
+        parameters
+    )
+
+
+async def _lookup_cache(request_key: Optional[str]) -> Optional[Tuple[str, str]]:
+    """Cached (response, done_reason) for a reproducible request, if any."""
+    if request_key is None or response_cache is None:
+        return None
+    return await response_cache.get(request_key)
+
+
+def _generate_session(request: GenerateRequest) -> Tuple[Optional[Session], str]:
+    """Resolve the session a generate request continues, and its full prompt.
+    
+    Only requests that send ``context`` (``[]`` to start a conversation) get
+    a session; one-shot requests would otherwise fill the store and push out
+    real conversations.
+    """
+    if session_store is None or request.context is None:
+        return None, request.prompt
+    
+    session = session_store.get(request.model, request.context)
+    if session is None:
+        session = session_store.create(request.model)
+    
+    # The model needs the earlier conversation; its KV state makes that prefix cheap
+    return session, session.transcript + request.prompt
+
+
+def _chat_session(request: ChatRequest) -> Optional[Session]:
+    """Resolve the session holding the conversation before the latest message.
+    
+    A first turn (no earlier messages besides system prompts) is treated as
+    one-shot and gets no session; the second turn starts one.
+    """
+    if session_store is None:
+        return None
+    
+    history = [{"role": m.role, "content": m.content} for m in request.messages[:-1]]
+    if all(message["role"] == "system" for message in history):
+        return None
+    session = session_store.get_by_history(request.model, history)
+    return session or session_store.create(request.model)
+
+
+def _complete_generate_session(session: Optional[Session], prompt: str, response_text: str) -> Dict[str, Any]:
+    """Record a finished generate turn; returns the response context fields."""
+    if session is None:
+        return {"context": []}
+    
+    session.transcript = prompt + response_text
+    session.turns += 1
+    return {"context": session.context}
+
+
+def _complete_chat_session(session: Optional[Session], request: ChatRequest, response_text: str) -> Dict[str, Any]:
+    """Record a finished chat turn so the next turn finds this session."""
+    if session is not None:
+        session.turns += 1
+        messages = [{"role": m.role, "content": m.content} for m in request.messages]
+        messages.append({"role": "assistant", "content": response_text})
+        session_store.remember_history(session, messages)
+    return {}
+
+
+def _generation_producer(
+    model,
+    prompt: str,
+    options: Optional[Dict[str, Any]],
+    lease: Lease,
+    start_time: float,
+    endpoint: str,
+    stream: bool,
+    timeout: Optional[float] = None,
+    cache_key: Optional[str] = None,
+    session: Optional[Session] = None
+) -> Callable[[Flight], Awaitable[None]]:
+    """Generation run as a flight: publishes chunks, then the completion fields.
+    
+    With a timeout the generation is streamed even for non-streaming callers,
+    so that when the deadline passes it can be stopped and the output so far
+    returned with done_reason "timeout".
+    """
+    
+    async def produce(flight: Flight):
+        stats = GenerationStats()
+        done_reason = "stop"
+        try:
+            if timeout is not None:
+                deadline = start_time + timeout
+                chunks = model.generate_stream(prompt, options, session=session, stats=stats)
+                try:
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), deadline - time.time())
+                        except StopAsyncIteration:
+                            break
+                        except asyncio.TimeoutError:
+                            # wait_for cancelled the generation, which stops llama.cpp
+                            logger.warning(f"Generation for {model.model_name} stopped at its {timeout:g}s deadline")
+                            done_reason = "timeout"
+                            break
+                        flight.publish(chunk)
+                finally:
+                    await chunks.aclose()
+            elif stream:
+                async for chunk in model.generate_stream(prompt, options, session=session, stats=stats):
+                    flight.publish(chunk)
+            else:
+                flight.publish(await model.generate(prompt, options, session=session, stats=stats))
+        finally:
+            lease.release()
+        
+        if done_reason != "timeout":
+            # "length" when max_tokens ran out rather than at the end of the answer
+            done_reason = stats.done_reason or "stop"
+        # A timed-out answer is cut short by load, not by the request, so it is not kept
+        if cache_key and done_reason != "timeout":
+            await response_cache.put(cache_key, flight.text, done_reason)
+        _record_generation(endpoint, model.model_name, start_time, lease, stats)
+        flight.finish(done_reason=done_reason, **stats.response_fields(lease.load_duration))
+    
+    return produce
+
+
+def _generation_timeout(options: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Seconds a generation may run: the request's timeout option, capped server-wide."""
+    limits = []
+    cap = float(config.get_generation_config().get("timeout") or 0)
+    if cap > 0:
+        limits.append(cap)
+    
+    requested = (options or {}).get("timeout")
+    if requested is not None:
+        try:
+            requested = float(requested)
+        except (TypeError, ValueError):
+            raise HTTPException(status_code=400, detail=f"Invalid timeout: {requested!r}")
+        if requested > 0:
+            limits.append(requested)
+    
+    return min(limits) if limits else None
+
+
+async def _start_or_join(
+    model,
+    prompt: str,
+    options: Optional[Dict[str, Any]],
+    start_time: float,
+    endpoint: str,
+    priority: str,
+    keep_alive,
+    stream: bool,
+    request_key: Optional[str] = None,
+    session: Optional[Session] = None
+) -> Tuple[Flight, Dict[str, str]]:
+    """Join an identical generation already in flight, or admit and start one.
+    
+    Returns the flight and the response headers describing how it was served.
+    """
+    flight = inflight.join(request_key) if request_key else None
+    if flight is not None:
+        logger.info(f"Coalesced request for {model.model_name} with one in flight", extra=REQUEST_LOG)
+        return flight, {"X-Coalesced": "1"}
+    
+    timeout = _generation_timeout(options)
+    
+    # Registered before admission so identical requests arriving meanwhile join it
+    flight = inflight.begin(request_key)
+    try:
+        # Admit before the response starts so overload is reported as a status code
+        lease = await _acquire_slot(model, priority, keep_alive)
+    except BaseException as e:
+        inflight.abort(flight, e)
+        raise
+    
+    cache_key = request_key if response_cache is not None else None
+    inflight.run(flight, _generation_producer(
+        model, prompt, options, lease, start_time, endpoint, stream,
+        timeout=timeout, cache_key=cache_key, session=session
+    ))
+    return flight, _queue_wait_header(lease)
+
+
+async def _unless_disconnected(http_request: Request, awaitable: Awaitable):
+    """Await a result, cancelling it if the client disconnects first."""
+    task = asyncio.ensure_future(awaitable)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await http_request.is_disconnected():
+                logger.info("Client disconnected, cancelling its generation")
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            # Stops llama.cpp unless identical requests still share the generation
+            task.cancel()
+
+
+async def _generate_response(
+    model,
+    prompt: str,
+    options: Optional[Dict[str, Any]],
+    http_request: Request,
+    response: Response,
+    start_time: float,
+    endpoint: str,
+    priority: str,
+    keep_alive,
+    session: Optional[Session] = None
+) -> Tuple[str, Dict[str, Any]]:
+    """Generate a complete response from the cache, a shared flight or the model.
+    
+    Returns the text and the completion fields (done_reason and stats).
+    """
+    request_key = _request_key(model, prompt, options)
+    cached = await _lookup_cache(request_key)
+    if cached is not None:
+        response.headers["X-Cache"] = "hit"
+        response_text, done_reason = cached
+        return response_text, {"done_reason": done_reason}
+    
+    flight, headers = await _start_or_join(
+        model, prompt, options, start_time, endpoint, priority, keep_alive,
+        stream=False, request_key=request_key, session=session
+    )
+    response.headers.update(headers)
+    response_text = await _unless_disconnected(http_request, flight.result())
+    return response_text, flight.final
+
+
+async def _stream_generation(
+    model,
+    prompt: str,
+    options: Optional[Dict[str, Any]],
+    encoder: StreamEncoder,
+    start_time: float,
+    endpoint: str,
+    priority: str,
+    keep_alive,
+    include_full_response: bool = False,
+    request_key: Optional[str] = None,
+    session: Optional[Session] = None,
+    on_complete: Optional[Callable[[str], Dict[str, Any]]] = None
+) -> StreamingResponse:
+    """Stream a generation through the encoder.
+    
+    Requests identical to one in flight follow it instead of generating:
+    they get the chunks produced so far, then the live tail.
+    """
+    flight, headers = await _start_or_join(
+        model, prompt, options, start_time, endpoint, priority, keep_alive,
+        stream=True, request_key=request_key, session=session
+    )
+    
+    async def frames():
+        try:
+            async for chunk in flight.follow():
+                logger.debug("Streaming %d characters of %s", len(chunk), model.model_name, extra=CHUNK_LOG)
+                yield encoder.chunk(chunk)
+        except Exception as e:
+            # Headers are already sent, so report the failure in-stream
+            logger.error(f"Error during streaming generation: {e}")
+            yield encoder.error(str(e))
+            return
+        
+        response_text = flight.text
+        extra_fields = on_complete(response_text) if on_complete else {}
+        
+        # Legacy SSE clients expect the complete text in the final frame
+        duration = time.time() - start_time
+        yield encoder.final(
+            response_text if include_full_response else "",
+            total_duration=int(duration * 1_000_000_000),
+            **flight.final,
+            **extra_fields
+        )
+    
+    return StreamingResponse(frames(), media_type=encoder.media_type, headers=headers)
+
+
+def _replay_cached(
+    cached: Tuple[str, str],
+    encoder: StreamEncoder,
+    start_time: float,
+    include_full_response: bool = False,
+    on_complete: Optional[Callable[[str], Dict[str, Any]]] = None
+) -> StreamingResponse:
+    """Replay a cached (response, done_reason) on a streaming endpoint."""
+    response_text, done_reason = cached
+    
+    async def frames():
+        yield encoder.chunk(response_text)
+        extra_fields = on_complete(response_text) if on_complete else {}
+        duration = time.time() - start_time
+        yield encoder.final(
+            response_text if include_full_response else "",
+            done_reason=done_reason,
+            total_duration=int(duration * 1_000_000_000),
+            **extra_fields
+        )
+    
+    return StreamingResponse(frames(), media_type=encoder.media_type, headers={"X-Cache": "hit"})
+
 
 @router.get("/tags", response_model=TagsResponse)
 async def list_models():
@@ -33,7 +593,8 @@ async def list_models():
                     name=model_info["name"],
                     size=model_info["size"],
                     modified_at=model_info["modified_at"],
-                    digest=""
+                    digest=model_info["digest"],
+                    details=model_info["details"]
                 ))
         
         return TagsResponse(models=models)
@@ -42,8 +603,38 @@ async def list_models():
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/generate", response_model=GenerateResponse)
-async def generate_text(request: GenerateRequest):
+async def _load_or_unload(model, keep_alive, priority: str) -> GenerateResponse:
+    """Preload a model, or unload it when keep_alive is 0."""
+    try:
+        unload = keep_alive is not None and parse_keep_alive(keep_alive) == 0
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    load_duration = 0.0
+    if unload:
+        await model_lifecycle.unload(model.model_name)
+    else:
+        lease = await _acquire_slot(model, priority, keep_alive)
+        load_duration = lease.load_duration
+        lease.release()
+    
+    return GenerateResponse(
+        model=model.model_name,
+        created_at=datetime.now().isoformat(),
+        response="",
+        done=True,
+        done_reason="unload" if unload else "load",
+        load_duration=int(load_duration * 1_000_000_000)
+    )
+
+
+@router.post("/generate", response_model=GenerateResponse, response_model_exclude_none=True)
+async def generate_text(
+    request: GenerateRequest,
+    http_request: Request,
+    response: Response,
+    x_priority: str = Header("interactive")
+):
     """Generate text completion (Ollama /api/generate endpoint)."""
     try:
         # Get model
@@ -51,10 +642,33 @@ async def generate_text(request: GenerateRequest):
         if not model:
             raise HTTPException(status_code=404, detail=f"Model '{request.model}' not found")
         
-        # Generate response
+        if not request.prompt and not request.context:
+            # Ollama convention: an empty prompt only loads or unloads the model
+            return await _load_or_unload(model, request.keep_alive, x_priority)
+        
         start_time = time.time()
-        response_text = await model.generate(request.prompt, request.options)
+        session, prompt = _generate_session(request)
+        on_complete = functools.partial(_complete_generate_session, session, prompt)
+        
+        if request.stream:
+            encoder = StreamEncoder(request.model, kind="generate", fmt="ndjson")
+            request_key = _request_key(model, prompt, request.options)
+            cached = await _lookup_cache(request_key)
+            if cached is not None:
+                return _replay_cached(cached, encoder, start_time, on_complete=on_complete)
+            return await _stream_generation(
+                model, prompt, request.options, encoder, start_time, "generate",
+                x_priority, request.keep_alive,
+                request_key=request_key, session=session, on_complete=on_complete
+            )
+        
+        # Generate response
+        response_text, final = await _generate_response(
+            model, prompt, request.options, http_request, response, start_time, "generate",
+            x_priority, request.keep_alive, session=session
+        )
         duration = time.time() - start_time
+        context = on_complete(response_text)["context"]
         
         # Format response
         return GenerateResponse(
@@ -62,11 +676,9 @@ async def generate_text(request: GenerateRequest):
             created_at=datetime.now().isoformat(),
             response=response_text,
             done=True,
-            context=[],
+            context=context,
             total_duration=int(duration * 1_000_000_000),  # Convert to nanoseconds
-            load_duration=0,
-            prompt_eval_duration=0,
-            eval_duration=int(duration * 1_000_000_000)
+            **final
         )
         
     except HTTPException:
@@ -77,7 +689,10 @@ async def generate_text(request: GenerateRequest):
 
 
 @router.post("/generate/stream")
-async def generate_text_stream(request: GenerateRequest):
+async def generate_text_stream(
+    request: GenerateRequest,
+    x_priority: str = Header("interactive")
+):
     """Generate streaming text completion."""
     try:
         # Get model
@@ -85,35 +700,18 @@ async def generate_text_stream(request: GenerateRequest):
         if not model:
             raise HTTPException(status_code=404, detail=f"Model '{request.model}' not found")
         
-        async def generate_stream():
-            start_time = time.time()
-            complete_response = ""
-            
-            async for chunk in model.generate_stream(request.prompt, request.options):
-                # Format streaming response
-                complete_response += chunk
-                response_data = {
-                    "model": request.model,
-                    "created_at": datetime.now().isoformat(),
-                    "response": chunk,
-                    "done": False
-                }
-                yield f"data: {json.dumps(response_data)}\n\n"
-            
-            # Send final response with complete content
-            duration = time.time() - start_time
-            final_response = {
-                "model": request.model,
-                "created_at": datetime.now().isoformat(),
-                "response": complete_response,
-                "done": True,
-                "total_duration": int(duration * 1_000_000_000)
-            }
-            yield f"data: {json.dumps(final_response)}\n\n"
-        
-        return StreamingResponse(
-            generate_stream(),
-            media_type="text/plain"
+        start_time = time.time()
+        encoder = StreamEncoder(request.model, kind="generate", fmt="sse")
+        
+        request_key = _request_key(model, request.prompt, request.options)
+        cached = await _lookup_cache(request_key)
+        if cached is not None:
+            return _replay_cached(cached, encoder, start_time, include_full_response=True)
+        
+        return await _stream_generation(
+            model, request.prompt, request.options, encoder, start_time, "generate_stream",
+            x_priority, request.keep_alive,
+            include_full_response=True, request_key=request_key
         )
         
     except HTTPException:
@@ -123,8 +721,13 @@ async def generate_text_stream(request: GenerateRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.post("/chat", response_model=ChatResponse)
-async def chat_completion(request: ChatRequest):
+@router.post("/chat", response_model=ChatResponse, response_model_exclude_none=True)
+async def chat_completion(
+    request: ChatRequest,
+    http_request: Request,
+    response: Response,
+    x_priority: str = Header("interactive")
+):
     """Chat completion (Ollama /api/chat endpoint)."""
     try:
         # Get model
@@ -132,20 +735,38 @@ async def chat_completion(request: ChatRequest):
         if not model:
             raise HTTPException(status_code=404, detail=f"Model '{request.model}' not found")
         
-        # Format messages as prompt
-        prompt = ""
-        for message in request.messages:
-            if message.role == "user":
-                prompt += f"User: {message.content}\n"
-            elif message.role == "assistant":
-                prompt += f"Assistant: {message.content}\n"
+        # Format messages with the model's chat template, dropping what does not fit
+        messages = [{"role": m.role, "content": m.content} for m in request.messages]
+        if context_budget is not None:
+            messages = await context_budget.fit(model, messages, request.options)
+        try:
+            prompt = model.render_chat(messages)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid chat messages: {e}")
         
-        prompt += "Assistant: "
+        start_time = time.time()
+        session = _chat_session(request)
+        on_complete = functools.partial(_complete_chat_session, session, request)
+        
+        if request.stream:
+            encoder = StreamEncoder(request.model, kind="chat", fmt="ndjson")
+            request_key = _request_key(model, prompt, request.options)
+            cached = await _lookup_cache(request_key)
+            if cached is not None:
+                return _replay_cached(cached, encoder, start_time, on_complete=on_complete)
+            return await _stream_generation(
+                model, prompt, request.options, encoder, start_time, "chat",
+                x_priority, request.keep_alive,
+                request_key=request_key, session=session, on_complete=on_complete
+            )
         
         # Generate response
-        start_time = time.time()
-        response_text = await model.generate(prompt, request.options)
+        response_text, final = await _generate_response(
+            model, prompt, request.options, http_request, response, start_time, "chat",
+            x_priority, request.keep_alive, session=session
+        )
         duration = time.time() - start_time
+        on_complete(response_text)
         
         # Format response
         return ChatResponse(
@@ -154,9 +775,7 @@ async def chat_completion(request: ChatRequest):
             message=ChatMessage(role="assistant", content=response_text),
             done=True,
             total_duration=int(duration * 1_000_000_000),
-            load_duration=0,
-            prompt_eval_duration=0,
-            eval_duration=int(duration * 1_000_000_000)
+            **final
         )
         
     except HTTPException:
@@ -166,6 +785,241 @@ async def chat_completion(request: ChatRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _run_batch_item(
+    model,
+    index: int,
+    item: BatchItem,
+    options: Optional[Dict[str, Any]],
+    keep_alive
+) -> Dict[str, Any]:
+    """Run one batch item; failures are reported in the result instead of raised."""
+    start_time = time.time()
+    options = {**(options or {}), **(item.options or {})} or None
+    
+    try:
+        if item.messages is not None:
+            messages = [{"role": m.role, "content": m.content} for m in item.messages]
+            if context_budget is not None:
+                messages = await context_budget.fit(model, messages, options)
+            prompt = model.render_chat(messages)
+        elif item.prompt is not None:
+            prompt = item.prompt
+        else:
+            raise ValueError("item needs a prompt or messages")
+    except ValueError as e:
+        return {"index": index, "error": f"Invalid batch item: {e}"}
+    
+    try:
+        request_key = _request_key(model, prompt, options)
+        cached = await _lookup_cache(request_key)
+        if cached is not None:
+            response_text, done_reason = cached
+            final = {"done_reason": done_reason}
+        else:
+            # Same path as single requests: coalescing, deadlines, cancellation
+            flight, _ = await _start_or_join(
+                model, prompt, options, start_time, "batch", "batch", keep_alive,
+                stream=False, request_key=request_key
+            )
+            response_text = await flight.result()
+            final = flight.final
+    except HTTPException as e:
+        return {"index": index, "error": e.detail}
+    except Exception as e:
+        logger.error(f"Error in batch item {index}: {e}")
+        return {"index": index, "error": str(e)}
+    
+    result = {"index": index, "model": model.model_name, "created_at": datetime.now().isoformat()}
+    if item.messages is not None:
+        result["message"] = {"role": "assistant", "content": response_text}
+    else:
+        result["response"] = response_text
+    result.update(
+        done=True,
+        total_duration=int((time.time() - start_time) * 1_000_000_000),
+        **final
+    )
+    return result
+
+
+@router.post("/batch")
+async def batch_generate(request: BatchRequest):
+    """Run many generate/chat items, streaming NDJSON results as each finishes.
+    
+    Items run at batch priority on as many slots as the model's scheduler
+    allows (workers x parallel slots for the server backend), so interactive
+    requests still go first. Each result line carries its input ``index``;
+    a failed item yields an ``error`` line without stopping the batch, and
+    a final summary line ends the stream.
+    """
+    model = model_registry.get_model(request.model)
+    if not model:
+        raise HTTPException(status_code=404, detail=f"Model '{request.model}' not found")
+    
+    concurrency = scheduler.capacity(model.model_name)
+    if request.concurrency:
+        concurrency = min(concurrency, request.concurrency)
+    concurrency = min(concurrency, len(request.items))
+    start_time = time.time()
+    
+    async def lines():
+        pending = iter(enumerate(request.items))
+        results: asyncio.Queue = asyncio.Queue()
+        
+        async def worker():
+            # Workers share one iterator, so each item is taken exactly once
+            for index, item in pending:
+                await results.put(await _run_batch_item(
+                    model, index, item, request.options, request.keep_alive
+                ))
+        
+        workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+        errors = 0
+        try:
+            for _ in range(len(request.items)):
+                result = await results.get()
+                errors += "error" in result
+                yield json.dumps(result, ensure_ascii=False) + "\n"
+        finally:
+            # Stop scheduling items if the client went away
+            for task in workers:
+                task.cancel()
+        
+        yield json.dumps({
+            "model": model.model_name,
+            "created_at": datetime.now().isoformat(),
+            "done": True,
+            "completed": len(request.items) - errors,
+            "errors": errors,
+            "total_duration": int((time.time() - start_time) * 1_000_000_000),
+        }) + "\n"
+    
+    logger.info(f"Batch of {len(request.items)} items for {model.model_name} (concurrency {concurrency})")
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+async def _embed_batch(model, texts: List[str]) -> List[List[float]]:
+    """Embed one micro-batch while holding a scheduler slot."""
+    start_time = time.time()
+    lease = await _acquire_slot(model, "interactive")
+    try:
+        vectors = await model.embed(texts)
+    finally:
+        lease.release()
+    labels = {"model": model.model_name, "endpoint": "embed"}
+    metrics.queue_wait.observe(lease.wait_time, **labels)
+    metrics.request_latency.observe(time.time() - start_time, **labels)
+    return vectors
+
+
+def _embedding_batcher(model) -> EmbeddingBatcher:
+    """The micro-batcher for a model's embedding requests."""
+    batcher = embedding_batchers.get(model.model_name)
+    if batcher is None:
+        settings = config.get_embeddings_config()
+        batcher = EmbeddingBatcher(
+            functools.partial(_embed_batch, model),
+            window=float(settings.get("batch_window_ms", 5)) / 1000,
+            max_batch=int(settings.get("max_batch", 32))
+        )
+        embedding_batchers[model.model_name] = batcher
+    return batcher
+
+
+async def _embed_texts(model_name: str, texts: List[str]) -> List[List[float]]:
+    """Embeddings for texts, served from the cache where possible."""
+    model = model_registry.get_model(model_name)
+    if not model:
+        raise HTTPException(status_code=404, detail=f"Model '{model_name}' not found")
+    if EMBED not in model.capabilities:
+        raise HTTPException(status_code=400, detail=f"Model '{model_name}' does not support embeddings")
+    
+    vectors: List[Optional[List[float]]] = [None] * len(texts)
+    keys: List[Optional[str]] = [None] * len(texts)
+    if embedding_cache is not None:
+        model_info = model_registry.get_model_info(model_name) or {}
+        # Identifies the model file; a changed file gets fresh vectors
+        model_key = f"{model.model_path}:{model_info.get('size')}:{model_info.get('modified_at')}"
+        for i, text in enumerate(texts):
+            keys[i] = embedding_cache.make_key(model_key, text)
+            vectors[i] = embedding_cache.get(keys[i])
+    
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        computed = await _embedding_batcher(model).embed([texts[i] for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+            if embedding_cache is not None:
+                embedding_cache.put(keys[i], vector)
+    
+    return vectors
+
+
+def _normalize(vector: List[float]) -> List[float]:
+    """Scale a vector to unit length."""
+    norm = math.sqrt(sum(x * x for x in vector))
+    return [x / norm for x in vector] if norm else vector
+
+
+@router.post("/embeddings", response_model=EmbeddingsResponse)
+async def create_embedding(request: EmbeddingsRequest):
+    """Embed a single prompt (Ollama /api/embeddings endpoint)."""
+    try:
+        vectors = await _embed_texts(request.model, [request.prompt])
+        return EmbeddingsResponse(embedding=vectors[0])
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating embedding: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/embed", response_model=EmbedResponse)
+async def create_embeddings(request: EmbedRequest):
+    """Embed one or more inputs (Ollama /api/embed endpoint)."""
+    try:
+        start_time = time.time()
+        texts = [request.input] if isinstance(request.input, str) else request.input
+        vectors = await _embed_texts(request.model, texts)
+        return EmbedResponse(
+            model=request.model,
+            embeddings=[_normalize(vector) for vector in vectors],
+            total_duration=int((time.time() - start_time) * 1_000_000_000)
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error creating embeddings: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/tokenize", response_model=TokenizeResponse)
+async def tokenize_text(request: TokenizeRequest):
+    """Token ids for text, without BOS (llama-server /tokenize, scoped to a model)."""
+    model = model_registry.get_model(request.model)
+    if not model:
+        raise HTTPException(status_code=404, detail=f"Model '{request.model}' not found")
+    try:
+        return TokenizeResponse(model=request.model, tokens=await model.tokenize(request.content))
+    except BackendCapabilityError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error tokenizing: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/detokenize", response_model=DetokenizeResponse)
+async def detokenize_tokens(request: DetokenizeRequest):
+    """Text for token ids (llama-server /detokenize, scoped to a model)."""
+    model = model_registry.get_model(request.model)
+    if not model:
+        raise HTTPException(status_code=404, detail=f"Model '{request.model}' not found")
+    try:
+        return DetokenizeResponse(model=request.model, content=await model.detokenize(request.tokens))
+    except (BackendCapabilityError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.post("/show", response_model=ShowResponse)
 async def show_model(request: ShowRequest):
     """Show model information (Ollama /api/show endpoint)."""
@@ -175,20 +1029,34 @@ async def show_model(request: ShowRequest):
         if not model_info:
             raise HTTPException(status_code=404, detail=f"Model '{request.name}' not found")
         
+        model = model_registry.get_model(request.name)
+        metadata = model_info["metadata"]
+        architecture = metadata.get("architecture", "")
+        
         # Format response
         return ShowResponse(
             license="",
             modelfile=f"FROM {model_info['path']}",
-            parameters="",
-            template="",
+            parameters="\n".join(f"{key} {value}" for key, value in model.default_params.items()),
+            template=model.model_config.get("chat_template") or metadata.get("chat_template") or "",
             system="",
-            digest="",
-            details={
-                "format": "gguf",
-                "family": "phi3",
-                "parameter_size": "4k",
-                "quantization_level": "q4"
-            }
+            digest=model_info["digest"],
+            details=model_info["details"],
+            model_info={
+                "general.architecture": architecture,
+                "general.name": metadata.get("name", ""),
+                "general.parameter_count": metadata.get("parameter_count"),
+                "general.file_type": metadata.get("file_type"),
+                f"{architecture}.context_length": metadata.get("context_length"),
+                f"{architecture}.embedding_length": metadata.get("embedding_length"),
+                f"{architecture}.block_count": metadata.get("block_count"),
+                f"{architecture}.attention.head_count": metadata.get("head_count"),
+                f"{architecture}.attention.head_count_kv": metadata.get("head_count_kv"),
+                "tokenizer.ggml.model": metadata.get("tokenizer_model", ""),
+                "tokenizer.ggml.vocab_size": metadata.get("vocab_size"),
+                "llama_web.backend": model.backend_name,
+            },
+            capabilities=sorted(model.capabilities)
         )
         
     except HTTPException:
@@ -198,7 +1066,73 @@ async def show_model(request: ShowRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/ps", response_model=PsResponse)
+async def list_running_models():
+    """List loaded models (Ollama /api/ps endpoint)."""
+    models = []
+    for loaded in model_lifecycle.ps():
+        model_info = model_registry.get_model_info(loaded["name"]) or {}
+        models.append(RunningModel(
+            digest=model_info.get("digest", ""),
+            details=model_info.get("details", {}),
+            **loaded
+        ))
+    return PsResponse(models=models)
+
+
+@router.get("/queue")
+async def queue_status():
+    """Report per-model queue depth and wait times, the CPU plan and the nodes behind remote models."""
+    status = {"queues": scheduler.stats(), "cpu": cpu_planner.stats()}
+    upstreams = {}
+    for model_name in model_registry.list_models():
+        model = model_registry.get_model(model_name)
+        if model.backend_name == "remote":
+            upstreams[model_name] = model.backend.pool.stats()
+    if upstreams:
+        status["upstreams"] = upstreams
+    return status
+
+
+@router.get("/cache")
+async def cache_status():
+    """Report response cache hit/miss counters."""
+    if response_cache is None:
+        status = {"enabled": False}
+    else:
+        status = {"enabled": True, **response_cache.stats()}
+    if session_store is not None:
+        status["sessions"] = session_store.stats()
+    status["coalesced"] = inflight.stats()
+    if embedding_cache is not None:
+        status["embeddings"] = {
+            **embedding_cache.stats(),
+            "batches": sum(b.batches for b in embedding_batchers.values()),
+            "batched_texts": sum(b.texts for b in embedding_batchers.values()),
+        }
+    if context_budget is not None:
+        status["context_tokens"] = context_budget.stats()
+    return status
+
+
+@router.post("/reload")
+async def reload_config():
+    """Re-read the configuration file and swap in added, changed and removed models."""
+    try:
+        return await reload_models()
+    except (OSError, ValueError, yaml.YAMLError) as e:
+        logger.error(f"Configuration reload failed: {e}")
+        raise HTTPException(status_code=400, detail=f"Configuration reload failed: {e}")
+
+
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "models": model_registry.list_models()} 
\ No newline at end of file
+    status = {"status": "healthy", "models": model_registry.list_models()}
+    if model_registry.errors:
+        # Configured models that failed to load, e.g. because their file is missing
+        status["disabled"] = model_registry.errors
+    if warmup is not None:
+        # Liveness stays "healthy" while warming; /ready gates traffic
+        status["ready"] = warmup.ready
+    return status 
\ No newline at end of file
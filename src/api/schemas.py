@@ -1,5 +1,5 @@
-from typing import List, Optional, Dict, Any
-from pydantic import BaseModel, Field
+from typing import List, Optional, Dict, Any, Union
+from pydantic import BaseModel, ConfigDict, Field
 from datetime import datetime
 
 
@@ -9,6 +9,8 @@ class GenerateRequest(BaseModel):
     prompt: str = Field(..., description="Input prompt")
     stream: bool = Field(False, description="Stream response")
     options: Optional[Dict[str, Any]] = Field(None, description="Generation options")
+    context: Optional[List[int]] = Field(None, description="Context from a previous response")
+    keep_alive: Optional[Union[str, float]] = Field(None, description="How long to keep the model loaded (e.g. \"5m\", 0, -1)")
 
 
 class GenerateResponse(BaseModel):
@@ -17,16 +19,23 @@ class GenerateResponse(BaseModel):
     created_at: str = Field(..., description="Creation timestamp")
     response: str = Field(..., description="Generated response")
     done: bool = Field(..., description="Generation complete")
+    done_reason: Optional[str] = Field(None, description="Why the response ended")
     context: List[int] = Field(default_factory=list, description="Context tokens")
     total_duration: int = Field(0, description="Total duration in nanoseconds")
     load_duration: int = Field(0, description="Load duration in nanoseconds")
+    prompt_eval_count: int = Field(0, description="Number of prompt tokens evaluated")
     prompt_eval_duration: int = Field(0, description="Prompt evaluation duration")
+    eval_count: int = Field(0, description="Number of tokens generated")
     eval_duration: int = Field(0, description="Evaluation duration")
+    draft_count: Optional[int] = Field(None, description="Tokens proposed by the draft model")
+    draft_accepted_count: Optional[int] = Field(None, description="Drafted tokens accepted by the model")
+    draft_acceptance_rate: Optional[float] = Field(None, description="Share of drafted tokens accepted")
+    draft_speedup: Optional[float] = Field(None, description="Estimated tokens per model decode step")
 
 
 class ChatMessage(BaseModel):
     """Chat message schema."""
-    role: str = Field(..., description="Message role (user/assistant)")
+    role: str = Field(..., description="Message role (system/user/assistant)")
     content: str = Field(..., description="Message content")
 
 
@@ -36,6 +45,7 @@ class ChatRequest(BaseModel):
     messages: List[ChatMessage] = Field(..., description="Chat messages")
     stream: bool = Field(False, description="Stream response")
     options: Optional[Dict[str, Any]] = Field(None, description="Generation options")
+    keep_alive: Optional[Union[str, float]] = Field(None, description="How long to keep the model loaded (e.g. \"5m\", 0, -1)")
 
 
 class ChatResponse(BaseModel):
@@ -44,10 +54,81 @@ class ChatResponse(BaseModel):
     created_at: str = Field(..., description="Creation timestamp")
     message: ChatMessage = Field(..., description="Response message")
     done: bool = Field(..., description="Generation complete")
+    done_reason: Optional[str] = Field(None, description="Why the response ended")
     total_duration: int = Field(0, description="Total duration in nanoseconds")
     load_duration: int = Field(0, description="Load duration in nanoseconds")
+    prompt_eval_count: int = Field(0, description="Number of prompt tokens evaluated")
     prompt_eval_duration: int = Field(0, description="Prompt evaluation duration")
+    eval_count: int = Field(0, description="Number of tokens generated")
     eval_duration: int = Field(0, description="Evaluation duration")
+    draft_count: Optional[int] = Field(None, description="Tokens proposed by the draft model")
+    draft_accepted_count: Optional[int] = Field(None, description="Drafted tokens accepted by the model")
+    draft_acceptance_rate: Optional[float] = Field(None, description="Share of drafted tokens accepted")
+    draft_speedup: Optional[float] = Field(None, description="Estimated tokens per model decode step")
+
+
+class BatchItem(BaseModel):
+    """One prompt or conversation in a batch request."""
+    prompt: Optional[str] = Field(None, description="Input prompt (generate item)")
+    messages: Optional[List[ChatMessage]] = Field(None, description="Chat messages (chat item)")
+    options: Optional[Dict[str, Any]] = Field(None, description="Generation options for this item")
+
+
+class BatchRequest(BaseModel):
+    """Batch generation request; results stream back as NDJSON in completion order."""
+    model: str = Field(..., description="Model name")
+    items: List[BatchItem] = Field(..., min_length=1, description="Prompts and conversations to run")
+    options: Optional[Dict[str, Any]] = Field(None, description="Generation options shared by all items")
+    concurrency: Optional[int] = Field(None, ge=1, description="Upper bound on items run at once")
+    keep_alive: Optional[Union[str, float]] = Field(None, description="How long to keep the model loaded (e.g. \"5m\", 0, -1)")
+
+
+class EmbeddingsRequest(BaseModel):
+    """Ollama embeddings request schema (single prompt)."""
+    model: str = Field(..., description="Model name")
+    prompt: str = Field(..., description="Text to embed")
+
+
+class EmbeddingsResponse(BaseModel):
+    """Ollama embeddings response schema."""
+    embedding: List[float] = Field(..., description="Embedding vector")
+
+
+class EmbedRequest(BaseModel):
+    """Ollama embed request schema (one or more inputs)."""
+    model: str = Field(..., description="Model name")
+    input: Union[str, List[str]] = Field(..., description="Text or list of texts to embed")
+
+
+class EmbedResponse(BaseModel):
+    """Ollama embed response schema."""
+    model: str = Field(..., description="Model name")
+    embeddings: List[List[float]] = Field(..., description="L2-normalized embedding per input")
+    total_duration: int = Field(0, description="Total duration in nanoseconds")
+
+
+class TokenizeRequest(BaseModel):
+    """Tokenize request schema (llama-server style)."""
+    model: str = Field(..., description="Model name")
+    content: str = Field(..., description="Text to tokenize")
+
+
+class TokenizeResponse(BaseModel):
+    """Tokenize response schema."""
+    model: str = Field(..., description="Model name")
+    tokens: List[int] = Field(..., description="Token ids")
+
+
+class DetokenizeRequest(BaseModel):
+    """Detokenize request schema (llama-server style)."""
+    model: str = Field(..., description="Model name")
+    tokens: List[int] = Field(..., description="Token ids")
+
+
+class DetokenizeResponse(BaseModel):
+    """Detokenize response schema."""
+    model: str = Field(..., description="Model name")
+    content: str = Field(..., description="Decoded text")
 
 
 class ModelInfo(BaseModel):
@@ -56,6 +137,7 @@ class ModelInfo(BaseModel):
     size: int = Field(0, description="Model size in bytes")
     modified_at: str = Field(..., description="Last modified timestamp")
     digest: str = Field("", description="Model digest")
+    details: Dict[str, Any] = Field(default_factory=dict, description="Model details")
 
 
 class TagsResponse(BaseModel):
@@ -70,10 +152,33 @@ class ShowRequest(BaseModel):
 
 class ShowResponse(BaseModel):
     """Ollama show response schema."""
+    # model_info is Ollama's field name, not a pydantic internal
+    model_config = ConfigDict(protected_namespaces=())
     license: str = Field("", description="Model license")
     modelfile: str = Field("", description="Model file content")
     parameters: str = Field("", description="Model parameters")
     template: str = Field("", description="Model template")
     system: str = Field("", description="System prompt")
     digest: str = Field("", description="Model digest")
-    details: Dict[str, Any] = Field(default_factory=dict, description="Model details") 
\ No newline at end of file
+    details: Dict[str, Any] = Field(default_factory=dict, description="Model details")
+    model_info: Dict[str, Any] = Field(default_factory=dict, description="GGUF metadata summary")
+    capabilities: List[str] = Field(default_factory=list, description="Operations the model's backend supports")
+
+
+class RunningModel(BaseModel):
+    """A loaded model as reported by /api/ps."""
+    name: str = Field(..., description="Model name")
+    model: str = Field(..., description="Model name")
+    size: int = Field(0, description="Estimated memory footprint in bytes")
+    digest: str = Field("", description="Model digest")
+    details: Dict[str, Any] = Field(default_factory=dict, description="Model details")
+    expires_at: Optional[str] = Field(None, description="When the idle model will be unloaded")
+    loaded_at: str = Field(..., description="Load timestamp")
+    last_used: str = Field(..., description="Last use timestamp")
+    active_requests: int = Field(0, description="Requests currently using the model")
+    loading: bool = Field(False, description="Model is still loading")
+
+
+class PsResponse(BaseModel):
+    """Ollama ps response schema."""
+    models: List[RunningModel] = Field(..., description="Loaded models")
@@ -0,0 +1,77 @@
+import json
+import time
+from datetime import datetime
+from typing import Dict, Any
+
+
+class StreamEncoder:
+    """Encodes streamed generation chunks as NDJSON or SSE frames.
+
+    The JSON around each chunk is fixed for the whole stream, so it is built
+    once and only the chunk text is serialized per frame. The ``created_at``
+    timestamp is formatted at most once per ``TIMESTAMP_RESOLUTION`` seconds.
+    """
+
+    MEDIA_TYPES = {
+        "ndjson": "application/x-ndjson",
+        "sse": "text/event-stream",
+    }
+
+    TIMESTAMP_RESOLUTION = 0.01
+
+    def __init__(self, model: str, kind: str = "generate", fmt: str = "ndjson"):
+        if fmt not in self.MEDIA_TYPES:
+            raise ValueError(f"Unknown stream format '{fmt}'")
+        if kind not in ("generate", "chat"):
+            raise ValueError(f"Unknown stream kind '{kind}'")
+
+        self.model = model
+        self.kind = kind
+        self.fmt = fmt
+        self.media_type = self.MEDIA_TYPES[fmt]
+
+        self._frame_prefix = "data: " if fmt == "sse" else ""
+        self._frame_suffix = "\n\n" if fmt == "sse" else "\n"
+
+        self._head = '{"model":' + json.dumps(model) + ',"created_at":"'
+        if kind == "chat":
+            self._body = '","message":{"role":"assistant","content":'
+            self._tail = '},"done":false}'
+        else:
+            self._body = '","response":'
+            self._tail = ',"done":false}'
+
+        self._timestamp = ""
+        self._timestamp_expires = 0.0
+
+    def _created_at(self) -> str:
+        now = time.time()
+        if now >= self._timestamp_expires:
+            self._timestamp = datetime.fromtimestamp(now).isoformat()
+            self._timestamp_expires = now + self.TIMESTAMP_RESOLUTION
+        return self._timestamp
+
+    def _frame(self, payload: str) -> bytes:
+        return (self._frame_prefix + payload + self._frame_suffix).encode()
+
+    def chunk(self, text: str) -> bytes:
+        """Encode one partial-response frame."""
+        return self._frame(
+            self._head + self._created_at() + self._body
+            + json.dumps(text, ensure_ascii=False) + self._tail
+        )
+
+    def final(self, text: str = "", **fields: Any) -> bytes:
+        """Encode the closing frame carrying completion stats."""
+        data: Dict[str, Any] = {"model": self.model, "created_at": self._created_at()}
+        if self.kind == "chat":
+            data["message"] = {"role": "assistant", "content": text}
+        else:
+            data["response"] = text
+        data["done"] = True
+        data.update(fields)
+        return self._frame(json.dumps(data, ensure_ascii=False, separators=(",", ":")))
+
+    def error(self, message: str) -> bytes:
+        """Encode an in-stream error frame (Ollama style)."""
+        return self._frame(json.dumps({"error": message}, ensure_ascii=False))
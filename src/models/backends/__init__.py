@@ -0,0 +1 @@
+# Inference backends package
@@ -0,0 +1,91 @@
+from typing import Dict, Any, Optional, List, AsyncIterator, FrozenSet
+
+from ..output_filter import OutputFilter
+from ..sessions import Session
+from ..timings import GenerationStats
+
+
+# Operations a backend may support
+GENERATE = "generate"
+STREAM = "stream"
+TOKENIZE = "tokenize"
+EMBED = "embed"
+
+
+class BackendCapabilityError(NotImplementedError):
+    """Raised when a backend does not support an operation."""
+
+
+class Backend:
+    """Interface between a model and the engine that runs it.
+
+    A backend owns the engine's resources (processes, workers or an
+    in-process context) and turns a rendered prompt plus Ollama options into
+    text. Output is already free of prompt echo and special tokens; the model
+    wrapper only coalesces and forwards it.
+    """
+
+    name = ""
+
+    def __init__(self, model):
+        # The owning LlamaCppModel (path, parameters, stop tokens, filters)
+        self.model = model
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        """Operations this backend supports."""
+        return frozenset({GENERATE, STREAM})
+
+    @property
+    def instances(self) -> int:
+        """Number of model copies held in memory while loaded."""
+        return 1
+
+    async def load(self):
+        """Make the model resident; a no-op for engines that load per request."""
+
+    async def unload(self):
+        """Release resident resources."""
+
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ) -> str:
+        raise NotImplementedError
+
+    def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+    async def tokenize(self, text: str) -> List[int]:
+        raise BackendCapabilityError(f"The {self.name} backend cannot tokenize")
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        raise BackendCapabilityError(f"The {self.name} backend cannot compute embeddings")
+
+
+def clean_response(output_filter: OutputFilter, raw_response: str) -> str:
+    """Run a complete response through an output filter and trim it."""
+    return trim_response(output_filter.feed(raw_response) + output_filter.flush())
+
+
+def trim_response(response: str) -> str:
+    """Trim an already filtered non-streamed response."""
+    # Clean up extra whitespace and newlines
+    response = response.strip()
+
+    # Remove leading/trailing quotes if present
+    if response.startswith('"') and response.endswith('"'):
+        response = response[1:-1]
+    elif response.startswith("'") and response.endswith("'"):
+        response = response[1:-1]
+
+    return response.strip()
@@ -0,0 +1,342 @@
+import asyncio
+import codecs
+import json
+import time
+from typing import Dict, Any, Optional, List, FrozenSet
+
+from ...utils.logging import logger, REQUEST_LOG
+from ..cpu import cpu_planner, CpuSlot
+from ..sessions import Session
+from ..timings import GenerationStats
+from .base import Backend, GENERATE, STREAM, TOKENIZE, EMBED, trim_response
+
+
+# Bytes requested per stdout read; read() returns as soon as any output is available
+STREAM_READ_SIZE = 4096
+
+# Separator between texts passed to llama-embedding in one call
+EMBED_SEPARATOR = "<#llama-web#>"
+
+# Seconds llama-cli gets to exit after SIGTERM before it is killed
+TERMINATE_TIMEOUT = 2.0
+
+
+async def _terminate(process: asyncio.subprocess.Process):
+    """Stop a llama-cli process whose output is no longer wanted."""
+    if process.returncode is not None:
+        return
+    process.terminate()
+    try:
+        await asyncio.wait_for(process.wait(), timeout=TERMINATE_TIMEOUT)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+
+
+class CliBackend(Backend):
+    """Spawns llama-cli per request and scrapes its stdout."""
+
+    name = "cli"
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        return frozenset({GENERATE, STREAM, TOKENIZE, EMBED})
+
+    async def load(self):
+        # One share of the cores per llama-cli process the scheduler lets run at once
+        name = self.model.model_name
+        cpu_planner.register(self, name, cpu_planner.concurrency(name))
+
+    async def unload(self):
+        cpu_planner.unregister(self)
+
+    def _map_parameters(self, options: Optional[Dict[str, Any]] = None, slot: Optional[CpuSlot] = None) -> List[str]:
+        """Map Ollama parameters to llama.cpp CLI arguments."""
+        params = self.model.merged_parameters(options)
+
+        cmd_args = []
+
+        # Parameter mapping
+        if "temperature" in params:
+            cmd_args.extend(["--temp", str(params["temperature"])])
+
+        if "top_p" in params:
+            cmd_args.extend(["--top-p", str(params["top_p"])])
+
+        if "max_tokens" in params:
+            cmd_args.extend(["--n-predict", str(params["max_tokens"])])
+
+        if "top_k" in params:
+            cmd_args.extend(["--top-k", str(params["top_k"])])
+
+        if "repeat_penalty" in params:
+            cmd_args.extend(["--repeat-penalty", str(params["repeat_penalty"])])
+
+        if "repeat_last_n" in params:
+            cmd_args.extend(["--repeat-last-n", str(params["repeat_last_n"])])
+
+        if "presence_penalty" in params:
+            cmd_args.extend(["--presence-penalty", str(params["presence_penalty"])])
+
+        if "frequency_penalty" in params:
+            cmd_args.extend(["--frequency-penalty", str(params["frequency_penalty"])])
+
+        if "min_p" in params:
+            cmd_args.extend(["--min-p", str(params["min_p"])])
+
+        if "typical_p" in params:
+            cmd_args.extend(["--typical", str(params["typical_p"])])
+
+        if "seed" in params:
+            cmd_args.extend(["--seed", str(params["seed"])])
+
+        if "mirostat" in params:
+            # Mirostat replaces top-k/top-p sampling with a target surprise (tau)
+            # approached at learning rate eta
+            cmd_args.extend(["--mirostat", str(params["mirostat"])])
+            if "mirostat_tau" in params:
+                cmd_args.extend(["--mirostat-ent", str(params["mirostat_tau"])])
+            if "mirostat_eta" in params:
+                cmd_args.extend(["--mirostat-lr", str(params["mirostat_eta"])])
+
+        if "num_keep" in params:
+            cmd_args.extend(["--keep", str(params["num_keep"])])
+
+        if "num_ctx" in params:
+            cmd_args.extend(["--ctx-size", str(params["num_ctx"])])
+
+        if "num_batch" in params:
+            cmd_args.extend(["--batch-size", str(params["num_batch"])])
+
+        # Threads sized to the process's share of the cores unless set explicitly
+        threads = params.get("num_thread", slot.threads if slot is not None else None)
+        if threads:
+            cmd_args.extend(["--threads", str(threads)])
+
+        threads_batch = params.get("num_thread_batch", slot.threads_batch if slot is not None else None)
+        if threads_batch:
+            cmd_args.extend(["--threads-batch", str(threads_batch)])
+
+        if self.model.draft_model_path:
+            # Speculative decoding: tokens drafted per step and the minimum
+            # draft probability for a token to be proposed
+            if "draft_max" in params:
+                cmd_args.extend(["--draft-max", str(params["draft_max"])])
+
+            if "draft_min" in params:
+                cmd_args.extend(["--draft-min", str(params["draft_min"])])
+
+            if "draft_p_min" in params:
+                cmd_args.extend(["--draft-p-min", str(params["draft_p_min"])])
+
+        return cmd_args
+
+    def _build_command(
+        self,
+        options: Optional[Dict[str, Any]] = None,
+        session: Optional[Session] = None,
+        slot: Optional[CpuSlot] = None
+    ) -> List[str]:
+        """Build the llama-cli command line for a request."""
+        # Keep the weights locked in RAM so they can't be paged out between requests
+        mlock = ["--mlock"] if self.model.model_config.get("mlock") else []
+
+        if self.model.draft_model_path:
+            # llama-cli has no draft model support; llama-speculative reads
+            # the prompt from a file, so point it at our stdin pipe
+            cmd = [
+                "llama-speculative", "-m", self.model.model_path,
+                "-md", self.model.draft_model_path, "-f", "/dev/stdin",
+            ] + mlock
+            cmd.extend(self._map_parameters(options, slot))
+            # It has no prompt cache either, so sessions re-evaluate the transcript
+            return cmd
+
+        # The prompt arrives already rendered on stdin. Without -no-cnv, llama-cli
+        # would start an interactive chat: it would template the prompt again
+        # and reject --prompt-cache-all.
+        cmd = ["llama-cli", "-m", self.model.model_path, "-f", "/dev/stdin", "-no-cnv"] + mlock
+        cmd.extend(self._map_parameters(options, slot))
+
+        if session is not None and session.turns > 0:
+            # llama-cli reuses the longest matching prefix from the cache file
+            # and saves the new state (including the answer) back to it.
+            # One-shot requests skip this so they don't write cache files.
+            cmd.extend(["--prompt-cache", session.prompt_cache_path, "--prompt-cache-all"])
+
+        return cmd
+
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ) -> str:
+        start_time = time.time()
+
+        # Read the output as it arrives so a stop sequence ends llama-cli early
+        chunks = self._run(prompt, options, session, stats)
+        try:
+            response = trim_response("".join([chunk async for chunk in chunks]))
+        finally:
+            await chunks.aclose()
+
+        duration = time.time() - start_time
+        logger.info(f"Generated response in {duration:.2f}s", extra=REQUEST_LOG)
+        return response
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ):
+        start_time = time.time()
+
+        chunks = self._run(prompt, options, session, stats)
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            await chunks.aclose()
+
+        duration = time.time() - start_time
+        logger.info(f"Generated streaming response in {duration:.2f}s", extra=REQUEST_LOG)
+
+    async def _run(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ):
+        """Run llama-cli on a prompt, yielding filtered output as it is printed."""
+        start_time = time.time()
+
+        # Build command
+        slot = cpu_planner.claim(self)
+        cmd = self._build_command(options, session, slot)
+
+        logger.debug(f"Executing llama.cpp command: {' '.join(cmd)}", extra=REQUEST_LOG)
+
+        process = None
+        try:
+            # Create subprocess
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE
+            )
+            if slot is not None:
+                slot.attach(process.pid)
+            stats.spawn_duration = time.time() - start_time
+
+            try:
+                # Send prompt
+                process.stdin.write(prompt.encode())
+                await process.stdin.drain()
+                process.stdin.close()
+
+                # Drain stderr concurrently so llama.cpp's logging can't fill the pipe and stall
+                stderr_task = asyncio.create_task(process.stderr.read())
+
+                # Stream raw bytes as they arrive; the incremental decoder holds back
+                # incomplete multi-byte sequences until the rest of the character arrives
+                decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+                output_filter = self.model.make_filter(prompt, options)
+                while True:
+                    data = await process.stdout.read(STREAM_READ_SIZE)
+                    if data:
+                        cleaned_chunk = output_filter.feed(decoder.decode(data))
+                    else:
+                        cleaned_chunk = output_filter.feed(decoder.decode(b"", final=True)) + output_filter.flush()
+
+                    if cleaned_chunk:
+                        stats.mark_first_token()
+                        yield cleaned_chunk
+
+                    if output_filter.stopped:
+                        # A stop sequence was generated; don't let llama-cli keep going
+                        logger.info(f"Stop sequence {output_filter.stop_sequence!r} reached, terminating llama-cli")
+                        process.terminate()
+                        break
+
+                    if not data:
+                        break
+
+                # Wait for process to complete
+                await process.wait()
+                stderr = await stderr_task
+                stats.parse_llama_output(stderr.decode(errors="replace"))
+
+                if session is not None:
+                    session.refresh_size()
+
+                if process.returncode != 0 and not output_filter.stopped:
+                    error_msg = stderr.decode().strip()
+                    logger.error(f"llama.cpp error: {error_msg}")
+                    raise RuntimeError(f"llama.cpp failed: {error_msg}")
+
+                stats.done_reason = self._done_reason(options, output_filter, stats)
+
+            except (asyncio.CancelledError, GeneratorExit):
+                # Client went away or the deadline passed; don't let llama-cli run on
+                logger.info("Generation cancelled, stopping llama-cli")
+                await _terminate(process)
+                raise
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            raise
+
+        finally:
+            cpu_planner.release(slot, process.pid if process is not None else None)
+
+    def _done_reason(self, options: Optional[Dict[str, Any]], output_filter, stats: GenerationStats) -> str:
+        """"length" when llama-cli ran out of --n-predict, else "stop"."""
+        if output_filter.stopped:
+            return "stop"
+        max_tokens = int(self.model.merged_parameters(options).get("max_tokens", -1))
+        # llama-cli samples the last token without evaluating it, so it reports
+        # one eval run less than the tokens it printed
+        if max_tokens > 0 and stats.eval_count + 1 >= max_tokens:
+            return "length"
+        return "stop"
+
+    async def _run_tool(self, cmd: List[str]) -> str:
+        """Run a llama.cpp helper executable and return its stdout."""
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await process.communicate()
+        if process.returncode != 0:
+            raise RuntimeError(f"{cmd[0]} failed: {stderr.decode(errors='replace').strip()}")
+        return stdout.decode(errors="replace")
+
+    async def tokenize(self, text: str) -> List[int]:
+        output = await self._run_tool([
+            "llama-tokenize", "-m", self.model.model_path, "-p", text, "--ids", "--log-disable"
+        ])
+        # --ids prints the token ids as a single list on the last line
+        for line in reversed(output.splitlines()):
+            if line.startswith("["):
+                return json.loads(line)
+        raise RuntimeError("llama-tokenize printed no token ids")
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        output = await self._run_tool([
+            "llama-embedding", "-m", self.model.model_path,
+            "-p", EMBED_SEPARATOR.join(texts),
+            "--embd-separator", EMBED_SEPARATOR,
+            "--embd-output-format", "json",
+            "--log-disable",
+        ])
+        result = json.loads(output[output.index("{"):])
+        data = sorted(result["data"], key=lambda item: item["index"])
+        return [item["embedding"] for item in data]
@@ -0,0 +1,261 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Optional, List, FrozenSet, Callable
+
+from ...utils.logging import logger, REQUEST_LOG
+from ..cpu import cpu_planner
+from ..sessions import Session
+from ..timings import GenerationStats
+from .base import Backend, GENERATE, STREAM, TOKENIZE, EMBED, clean_response
+
+try:
+    from llama_cpp import Llama
+except ImportError:
+    Llama = None
+
+
+# Marks the end of a stream handed from the engine thread to the event loop
+_END = object()
+
+
+class LlamaPythonBackend(Backend):
+    """Runs the model in-process through the llama-cpp-python bindings.
+
+    The llama context is not thread-safe, so it lives on a dedicated thread
+    and every call is funnelled through a single-thread executor; the event
+    loop only waits on futures and a queue of generated chunks. llama-cpp-python
+    keeps the KV cache of the previous prompt and reuses the longest matching
+    prefix, which is what makes multi-turn sessions cheap here.
+    """
+
+    name = "python"
+
+    def __init__(self, model):
+        if Llama is None:
+            raise RuntimeError("The python backend requires llama-cpp-python (pip install llama-cpp-python)")
+        super().__init__(model)
+        config = model.model_config
+        self.embeddings = bool(config.get("embeddings", False))
+        self.llama_kwargs = {
+            "model_path": model.model_path,
+            "n_ctx": model.context_size,
+            "n_gpu_layers": int(config.get("n_gpu_layers", 0)),
+            "embedding": self.embeddings,
+            "use_mlock": bool(config.get("mlock", False)),
+            "verbose": False,
+        }
+        params = model.default_params
+        if "n_threads" in config or "num_thread" in params:
+            self.llama_kwargs["n_threads"] = int(config.get("n_threads", params.get("num_thread")))
+        if "num_thread_batch" in params:
+            self.llama_kwargs["n_threads_batch"] = int(params["num_thread_batch"])
+        if "num_batch" in params:
+            self.llama_kwargs["n_batch"] = int(params["num_batch"])
+        if model.draft_model_path:
+            # llama-cpp-python only offers prompt-lookup drafting, not a draft model
+            logger.warning(f"Model {model.model_name}: the python backend ignores draft_model")
+
+        self.llm = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        capabilities = {GENERATE, STREAM, TOKENIZE}
+        if self.embeddings:
+            capabilities.add(EMBED)
+        return frozenset(capabilities)
+
+    async def _call(self, fn: Callable, *args):
+        """Run a function on the engine thread."""
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def load(self):
+        async with self._load_lock:
+            if self.llm is not None:
+                return
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"llama-{self.model.model_name}"
+                )
+            # The engine shares this process, so it gets a thread count but is not pinned
+            slot = cpu_planner.register(self, self.model.model_name, 1)[0]
+            kwargs = dict(self.llama_kwargs)
+            if slot.threads:
+                kwargs.setdefault("n_threads", slot.threads)
+                kwargs.setdefault("n_threads_batch", slot.threads_batch)
+            logger.info(f"Loading {self.model.model_name} in-process")
+            self.llm = await self._call(lambda: Llama(**kwargs))
+
+    async def unload(self):
+        async with self._load_lock:
+            if self._executor is None:
+                return
+            if self.llm is not None:
+                llm, self.llm = self.llm, None
+                # Free the context on the thread that owns it
+                await self._call(lambda: llm.close() if hasattr(llm, "close") else None)
+            self._executor.shutdown(wait=False)
+            self._executor = None
+            cpu_planner.unregister(self)
+
+    def _completion_kwargs(self, options: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """Map Ollama parameters to create_completion arguments."""
+        params = self.model.merged_parameters(options)
+
+        # llama-cpp-python stops after 16 tokens by default; llama-cli runs until EOS
+        kwargs = {"max_tokens": params.get("max_tokens", -1)}
+        for name in (
+            "temperature", "top_p", "top_k", "repeat_penalty", "seed", "min_p", "typical_p",
+            "presence_penalty", "frequency_penalty", "mirostat_tau", "mirostat_eta",
+        ):
+            if name in params:
+                kwargs[name] = params[name]
+        if "mirostat" in params:
+            kwargs["mirostat_mode"] = params["mirostat"]
+
+        stop = self.model.stop_sequences(options)
+        if stop:
+            kwargs["stop"] = stop
+
+        return kwargs
+
+    def _run_completion(
+        self,
+        prompt: str,
+        kwargs: Dict[str, Any],
+        stats: GenerationStats,
+        on_text: Callable[[str], None],
+        cancelled: threading.Event
+    ):
+        """Generate on the engine thread, passing each piece of text to on_text."""
+        started = time.time()
+        stats.prompt_eval_count = len(self.llm.tokenize(prompt.encode("utf-8"), special=True))
+        first_at = None
+        count = 0
+
+        chunks = self.llm.create_completion(prompt, stream=True, **kwargs)
+        try:
+            for chunk in chunks:
+                # One chunk per sampled token (multi-byte characters may span several)
+                count += 1
+                if first_at is None:
+                    first_at = time.time()
+                    stats.prompt_eval_duration = first_at - started
+                    stats.first_token_at = first_at
+                choice = chunk["choices"][0]
+                if choice["text"]:
+                    on_text(choice["text"])
+                if choice.get("finish_reason"):
+                    # "length" when max_tokens ran out, "stop" for EOS or a stop sequence
+                    stats.done_reason = choice["finish_reason"]
+                if cancelled.is_set():
+                    break
+        finally:
+            chunks.close()
+
+        stats.eval_count = count
+        stats.eval_duration = time.time() - (first_at or started)
+
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ) -> str:
+        start_time = time.time()
+        await self.load()
+
+        try:
+            pieces = []
+            cancelled = threading.Event()
+            try:
+                await self._call(
+                    self._run_completion, prompt, self._completion_kwargs(options),
+                    stats, pieces.append, cancelled
+                )
+            except asyncio.CancelledError:
+                # The engine thread can't be interrupted, but stops at the next token
+                cancelled.set()
+                raise
+
+            output_filter = self.model.make_filter(options=options)
+            cleaned_response = clean_response(output_filter, "".join(pieces))
+            if output_filter.stopped:
+                stats.done_reason = "stop"
+            duration = time.time() - start_time
+            logger.info(f"Generated response in {duration:.2f}s", extra=REQUEST_LOG)
+            return cleaned_response
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            raise
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ):
+        start_time = time.time()
+        await self.load()
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+
+        def produce():
+            try:
+                self._run_completion(
+                    prompt, self._completion_kwargs(options), stats,
+                    lambda text: loop.call_soon_threadsafe(queue.put_nowait, text), cancelled
+                )
+                loop.call_soon_threadsafe(queue.put_nowait, _END)
+            except Exception as e:
+                loop.call_soon_threadsafe(queue.put_nowait, e)
+
+        future = loop.run_in_executor(self._executor, produce)
+        output_filter = self.model.make_filter(options=options)
+        try:
+            while True:
+                item = await queue.get()
+                if isinstance(item, Exception):
+                    raise item
+                if item is _END:
+                    cleaned_chunk = output_filter.flush()
+                else:
+                    cleaned_chunk = output_filter.feed(item)
+
+                if cleaned_chunk:
+                    yield cleaned_chunk
+
+                if output_filter.stopped:
+                    stats.done_reason = "stop"
+                if item is _END or output_filter.stopped:
+                    break
+
+            duration = time.time() - start_time
+            logger.info(f"Generated streaming response in {duration:.2f}s", extra=REQUEST_LOG)
+
+        except Exception as e:
+            logger.error(f"Error generating streaming response: {e}")
+            raise
+
+        finally:
+            # Stop sampling if the consumer went away early, and free the engine thread
+            cancelled.set()
+            await asyncio.shield(future)
+
+    async def tokenize(self, text: str) -> List[int]:
+        await self.load()
+        return await self._call(lambda: self.llm.tokenize(text.encode("utf-8"), add_bos=False, special=True))
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not self.embeddings:
+            return await super().embed(texts)
+        await self.load()
+        return await self._call(self.llm.embed, texts)
@@ -0,0 +1,211 @@
+import time
+from typing import Dict, Any, Optional, FrozenSet, Set
+
+import httpx
+
+from ...utils.logging import logger, REQUEST_LOG
+from ..sessions import Session
+from ..timings import GenerationStats
+from ..upstreams import UpstreamPool, Upstream, LLAMA_WEB
+from .base import Backend, GENERATE, STREAM, clean_response
+from .server import completion_parameters
+
+
+# Errors meaning the request never reached the node, so another one may take it
+_UNREACHABLE = (httpx.ConnectError, httpx.ConnectTimeout)
+
+
+class RemoteBackend(Backend):
+    """Routes requests to upstream llama.cpp-web or llama-server nodes.
+
+    Nothing runs in this process: the rendered prompt is sent to the node
+    the pool picks and its output is proxied back as it arrives.
+    """
+
+    name = "remote"
+
+    def __init__(self, model):
+        super().__init__(model)
+        config = model.model_config
+        self.pool = UpstreamPool(model.model_name, config)
+        # Characters of the prompt that decide which node a request prefers;
+        # conversations share their start, so every turn lands on the same node
+        self.affinity_prefix = int(config.get("affinity_prefix", 512))
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        return frozenset({GENERATE, STREAM})
+
+    @property
+    def instances(self) -> int:
+        return 0
+
+    async def load(self):
+        await self.pool.start()
+
+    async def unload(self):
+        await self.pool.stop()
+
+    def _affinity_key(self, prompt: str) -> Optional[str]:
+        if not self.affinity_prefix:
+            return None
+        return prompt[:self.affinity_prefix]
+
+    def _request(self, upstream: Upstream, prompt: str, options: Optional[Dict[str, Any]], stream: bool):
+        """Endpoint path and payload for a completion on a node."""
+        if upstream.kind == LLAMA_WEB:
+            # The prompt is already rendered, and llama-web's /api/generate sends it as-is
+            remote_options = self.model.merged_parameters(options)
+            if "max_tokens" in remote_options:
+                # Ollama only knows the limit as num_predict
+                remote_options["num_predict"] = remote_options.pop("max_tokens")
+            return "/api/generate", {
+                "model": upstream.model,
+                "prompt": prompt,
+                "options": remote_options,
+                "stream": stream,
+            }
+
+        payload = {"prompt": prompt, "cache_prompt": True, "stream": stream, **completion_parameters(self.model, options)}
+        return "/completion", payload
+
+    def _unreachable(self, upstream: Upstream, error: BaseException, tried: Set[int]):
+        logger.warning(f"Upstream {upstream.url} unreachable, trying another: {error}")
+        self.pool.mark_failed(upstream, error)
+        tried.add(upstream.index)
+
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ) -> str:
+        start_time = time.time()
+        preferred = session.worker_index if session is not None else None
+        tried: Set[int] = set()
+
+        try:
+            while True:
+                async with self.pool.acquire(self._affinity_key(prompt), preferred, tried) as upstream:
+                    path, payload = self._request(upstream, prompt, options, stream=False)
+                    logger.info(f"Sending completion to upstream {upstream.url}", extra=REQUEST_LOG)
+                    sent_at = time.time()
+                    try:
+                        result = await upstream.post(path, payload)
+                    except _UNREACHABLE as e:
+                        self._unreachable(upstream, e, tried)
+                        continue
+                break
+
+            if session is not None:
+                session.worker_index = upstream.index
+            if upstream.kind == LLAMA_WEB:
+                stats.update_from_ollama(result)
+                text = result.get("response", "")
+            else:
+                stats.update_from_server(result.get("timings"))
+                stats.update_stop_from_server(result)
+                text = result.get("content", "")
+            stats.estimate_first_token(sent_at)
+            output_filter = self.model.make_filter(options=options)
+            cleaned_response = clean_response(output_filter, text)
+            if output_filter.stopped:
+                stats.done_reason = "stop"
+
+            duration = time.time() - start_time
+            logger.info(f"Generated response in {duration:.2f}s", extra=REQUEST_LOG)
+            return cleaned_response
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            raise
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ):
+        start_time = time.time()
+        preferred = session.worker_index if session is not None else None
+        tried: Set[int] = set()
+
+        try:
+            while True:
+                async with self.pool.acquire(self._affinity_key(prompt), preferred, tried) as upstream:
+                    path, payload = self._request(upstream, prompt, options, stream=True)
+                    logger.info(f"Streaming completion from upstream {upstream.url}", extra=REQUEST_LOG)
+                    events = upstream.stream(path, payload)
+                    try:
+                        # The connection is made on the first read; nothing was generated yet
+                        first = await events.__anext__()
+                    except StopAsyncIteration:
+                        first = None
+                    except _UNREACHABLE as e:
+                        self._unreachable(upstream, e, tried)
+                        continue
+
+                    if session is not None:
+                        session.worker_index = upstream.index
+                    try:
+                        async for cleaned_chunk in self._proxy(upstream, first, events, options, stats):
+                            yield cleaned_chunk
+                    finally:
+                        # Closing the upstream response cancels the remote generation
+                        await events.aclose()
+                break
+
+            duration = time.time() - start_time
+            logger.info(f"Generated streaming response in {duration:.2f}s", extra=REQUEST_LOG)
+
+        except Exception as e:
+            logger.error(f"Error generating streaming response: {e}")
+            raise
+
+    async def _proxy(
+        self,
+        upstream: Upstream,
+        first: Optional[Dict[str, Any]],
+        events,
+        options: Optional[Dict[str, Any]],
+        stats: GenerationStats
+    ):
+        """Turn a node's stream events into filtered text chunks, without buffering."""
+        output_filter = self.model.make_filter(options=options)
+        event = first
+        while event is not None:
+            if "error" in event:
+                raise RuntimeError(f"Upstream {upstream.url} error: {event['error']}")
+
+            if upstream.kind == LLAMA_WEB:
+                text, done = event.get("response", ""), event.get("done", False)
+            else:
+                text, done = event.get("content", ""), event.get("stop", False)
+
+            cleaned_chunk = output_filter.feed(text)
+            if done:
+                cleaned_chunk += output_filter.flush()
+                if upstream.kind == LLAMA_WEB:
+                    stats.update_from_ollama(event)
+                else:
+                    stats.update_from_server(event.get("timings"))
+                    stats.update_stop_from_server(event)
+            if cleaned_chunk:
+                stats.mark_first_token()
+                yield cleaned_chunk
+            if output_filter.stopped:
+                stats.done_reason = "stop"
+            if done or output_filter.stopped:
+                return
+
+            try:
+                event = await events.__anext__()
+            except StopAsyncIteration:
+                event = None
+
+        # The stream ended without a final event
+        cleaned_chunk = output_filter.flush()
+        if cleaned_chunk:
+            yield cleaned_chunk
@@ -0,0 +1,248 @@
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, List, FrozenSet
+
+from ...utils.logging import logger, REQUEST_LOG
+from ..sessions import Session
+from ..cpu import cpu_planner
+from ..timings import GenerationStats
+from ..workers import WorkerPool, has_flag
+from .base import Backend, GENERATE, STREAM, TOKENIZE, EMBED, clean_response
+
+
+# Ollama options passed to /completion, and the field llama-server reads them from
+SAMPLING_FIELDS = (
+    ("seed", "seed"),
+    ("min_p", "min_p"),
+    ("typical_p", "typical_p"),
+    ("repeat_last_n", "repeat_last_n"),
+    ("presence_penalty", "presence_penalty"),
+    ("frequency_penalty", "frequency_penalty"),
+    ("mirostat", "mirostat"),
+    ("mirostat_tau", "mirostat_tau"),
+    ("mirostat_eta", "mirostat_eta"),
+    ("num_keep", "n_keep"),
+)
+
+
+def completion_parameters(model, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Map Ollama parameters to a llama-server /completion payload."""
+    params = model.merged_parameters(options)
+
+    payload = {}
+    if "temperature" in params:
+        payload["temperature"] = params["temperature"]
+
+    if "top_p" in params:
+        payload["top_p"] = params["top_p"]
+
+    if "max_tokens" in params:
+        payload["n_predict"] = params["max_tokens"]
+
+    if "top_k" in params:
+        payload["top_k"] = params["top_k"]
+
+    if "repeat_penalty" in params:
+        payload["repeat_penalty"] = params["repeat_penalty"]
+
+    # The remaining sampling options, some under a different name
+    for option, field in SAMPLING_FIELDS:
+        if option in params:
+            payload[field] = params[option]
+
+    stop = model.stop_sequences(options)
+    if stop:
+        # llama-server stops as soon as one is generated and leaves it out
+        payload["stop"] = stop
+
+    if model.draft_model_path:
+        # Per-request speculative decoding settings for the worker's draft model
+        for option, field in (("draft_max", "n_max"), ("draft_min", "n_min"), ("draft_p_min", "p_min")):
+            if option in params:
+                payload[f"speculative.{field}"] = params[option]
+
+    return payload
+
+
+class ServerBackend(Backend):
+    """Sends requests to a pool of resident llama-server workers."""
+
+    name = "server"
+
+    def __init__(self, model):
+        super().__init__(model)
+        pool_config = model.model_config
+        server_args = [str(arg) for arg in pool_config.get("server_args", [])]
+        if model.draft_model_path:
+            # Each worker loads the draft model next to the target model
+            server_args.extend(["--model-draft", model.draft_model_path])
+        if model.model_config.get("mlock") and not has_flag(server_args, "--mlock"):
+            # Keep the weights locked in RAM so they can't be paged out
+            server_args.append("--mlock")
+        server_args.extend(self._context_args(server_args))
+        pool_config = {**pool_config, "server_args": server_args}
+        # Resident llama-server workers, started lazily on first request
+        self.worker_pool = WorkerPool(model.model_path, model.model_name, pool_config, cpu_owner=self)
+        self.embeddings = bool(model.model_config.get("embeddings", False))
+
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        capabilities = {GENERATE, STREAM, TOKENIZE}
+        if self.embeddings:
+            capabilities.add(EMBED)
+        return frozenset(capabilities)
+
+    @property
+    def instances(self) -> int:
+        return len(self.worker_pool.workers)
+
+    def _context_args(self, server_args: List[str]) -> List[str]:
+        """Worker options for the model's context, batch and thread settings.
+
+        These are fixed when a worker starts, so only the model's default
+        parameters apply; explicit server_args win.
+        """
+        params = self.model.default_params
+        parallel = int(self.model.model_config.get("parallel", 1))
+        args = []
+        if "num_ctx" in params and not has_flag(server_args, "-c", "--ctx-size"):
+            # llama-server divides its context between the parallel slots
+            args.extend(["--ctx-size", str(int(params["num_ctx"]) * parallel)])
+        if "num_batch" in params and not has_flag(server_args, "-b", "--batch-size"):
+            args.extend(["--batch-size", str(params["num_batch"])])
+        if "num_thread" in params and not has_flag(server_args, "-t", "--threads"):
+            args.extend(["--threads", str(params["num_thread"])])
+        if "num_thread_batch" in params and not has_flag(server_args, "-tb", "--threads-batch"):
+            args.extend(["--threads-batch", str(params["num_thread_batch"])])
+        return args
+
+    async def load(self):
+        cpu_planner.register(self, self.model.model_name, len(self.worker_pool.workers))
+        await self.worker_pool.start()
+
+    async def unload(self):
+        await self.worker_pool.stop()
+        cpu_planner.unregister(self)
+
+    def _map_parameters(self, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Map Ollama parameters to a llama-server /completion payload."""
+        return completion_parameters(self.model, options)
+
+    def _build_payload(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        session: Optional[Session] = None
+    ) -> Dict[str, Any]:
+        """Build the llama-server /completion payload for a request."""
+        # cache_prompt lets the slot skip re-evaluating a shared prompt prefix
+        payload = {"prompt": prompt, "cache_prompt": True, **self._map_parameters(options)}
+
+        if session is not None:
+            if session.slot is None:
+                session.slot = self.worker_pool.next_slot()
+            payload["id_slot"] = session.slot
+
+        return payload
+
+    @asynccontextmanager
+    async def _acquire_worker(self, session: Optional[Session] = None):
+        """Lease a worker, pinning sessions to the worker that holds their KV cache."""
+        preferred = session.worker_index if session is not None else None
+        async with self.worker_pool.acquire(preferred) as worker:
+            if session is not None:
+                session.worker_index = worker.index
+            yield worker
+
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ) -> str:
+        start_time = time.time()
+        payload = self._build_payload(prompt, options, session)
+
+        try:
+            async with self._acquire_worker(session) as worker:
+                logger.info(f"Sending completion to worker {worker.name}", extra=REQUEST_LOG)
+                sent_at = time.time()
+                result = await worker.complete(payload)
+
+            duration = time.time() - start_time
+            stats.update_from_server(result.get("timings"))
+            stats.update_stop_from_server(result)
+            stats.estimate_first_token(sent_at)
+            output_filter = self.model.make_filter(options=options)
+            cleaned_response = clean_response(output_filter, result.get("content", ""))
+            if output_filter.stopped:
+                stats.done_reason = "stop"
+
+            logger.info(f"Generated response in {duration:.2f}s", extra=REQUEST_LOG)
+            return cleaned_response
+
+        except Exception as e:
+            logger.error(f"Error generating response: {e}")
+            raise
+
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]],
+        session: Optional[Session],
+        stats: GenerationStats
+    ):
+        start_time = time.time()
+        payload = self._build_payload(prompt, options, session)
+
+        try:
+            async with self._acquire_worker(session) as worker:
+                logger.info(f"Streaming completion from worker {worker.name}", extra=REQUEST_LOG)
+                # llama-server streams bare token text without the prompt echo
+                output_filter = self.model.make_filter(options=options)
+                async for event in worker.complete_stream(payload):
+                    cleaned_chunk = output_filter.feed(event.get("content", ""))
+                    if event.get("stop"):
+                        cleaned_chunk += output_filter.flush()
+                        stats.update_from_server(event.get("timings"))
+                        stats.update_stop_from_server(event)
+                    if cleaned_chunk:
+                        stats.mark_first_token()
+                        yield cleaned_chunk
+                    if output_filter.stopped:
+                        # Closing the stream makes llama-server cancel the task
+                        stats.done_reason = "stop"
+                        break
+
+            duration = time.time() - start_time
+            logger.info(f"Generated streaming response in {duration:.2f}s", extra=REQUEST_LOG)
+
+        except Exception as e:
+            logger.error(f"Error generating streaming response: {e}")
+            raise
+
+    async def tokenize(self, text: str) -> List[int]:
+        async with self._acquire_worker() as worker:
+            result = await worker.request("/tokenize", {"content": text})
+        return result["tokens"]
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        if not self.embeddings:
+            return await super().embed(texts)
+
+        async with self._acquire_worker() as worker:
+            result = await worker.request("/embedding", {"content": texts})
+
+        # Older llama-server builds answer a single object, newer ones a list
+        if isinstance(result, dict):
+            result = [result]
+        result = sorted(result, key=lambda item: item.get("index", 0))
+        embeddings = []
+        for item in result:
+            embedding = item["embedding"]
+            # Pooling "none" returns one vector per token; keep the pooled form only
+            if embedding and isinstance(embedding[0], list):
+                embedding = embedding[-1]
+            embeddings.append(embedding)
+        return embeddings
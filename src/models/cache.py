@@ -0,0 +1,166 @@
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+from ..utils.logging import logger
+
+
+class ResponseCache:
+    """LRU/TTL cache of generated responses with an optional disk tier.
+
+    Each entry is the response text and the done_reason it ended with, so a
+    replay reports the same reason (e.g. "length") as the original.
+
+    The memory tier is bounded by the total size of cached responses. When a
+    disk directory is configured, entries are also written there as small
+    JSON files so they survive restarts; disk I/O runs in the default
+    executor to keep it off the event loop.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int,
+        ttl: float,
+        disk_path: Optional[str] = None,
+        disk_max_bytes: int = 0
+    ):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+
+        # key -> (text, done_reason, expires_at, size)
+        self._entries: "OrderedDict[str, Tuple[str, str, float, int]]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._disk_writes = 0
+
+        if disk_path:
+            os.makedirs(disk_path, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: Any) -> str:
+        """Build a stable cache key from JSON-serializable parts."""
+        encoded = json.dumps(parts, sort_keys=True, separators=(",", ":"), default=str)
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def _disk_file(self, key: str) -> str:
+        return os.path.join(self.disk_path, f"{key}.json")
+
+    async def get(self, key: str) -> Optional[Tuple[str, str]]:
+        """Return a cached (response, done_reason), or None on miss or expiry."""
+        entry = self._entries.get(key)
+        now = time.time()
+
+        if entry is not None:
+            value, done_reason, expires_at, _ = entry
+            if expires_at > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value, done_reason
+            self._remove(key)
+
+        if self.disk_path:
+            loop = asyncio.get_running_loop()
+            stored = await loop.run_in_executor(None, self._read_disk, key)
+            if stored is not None and stored["expires_at"] > now:
+                # Entries written before done_reason was stored all ended with "stop"
+                done_reason = stored.get("done_reason", "stop")
+                self._store(key, stored["value"], done_reason, stored["expires_at"])
+                self.disk_hits += 1
+                self.hits += 1
+                return stored["value"], done_reason
+
+        self.misses += 1
+        return None
+
+    async def put(self, key: str, value: str, done_reason: str = "stop"):
+        """Cache a response in memory and, if configured, on disk."""
+        expires_at = time.time() + self.ttl
+        self._store(key, value, done_reason, expires_at)
+
+        if self.disk_path:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._write_disk, key, value, done_reason, expires_at)
+
+    def _store(self, key: str, value: str, done_reason: str, expires_at: float):
+        size = len(value.encode())
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (value, done_reason, expires_at, size)
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        _, _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def _read_disk(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._disk_file(key), "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable cache entry {key}: {e}")
+            return None
+
+    def _write_disk(self, key: str, value: str, done_reason: str, expires_at: float):
+        path = self._disk_file(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"value": value, "done_reason": done_reason, "expires_at": expires_at}, f)
+            os.replace(tmp_path, path)
+            self._disk_writes += 1
+            # Scanning the directory is comparatively slow, so only do it periodically
+            if self.disk_max_bytes and self._disk_writes % 64 == 1:
+                self._prune_disk()
+        except OSError as e:
+            logger.warning(f"Failed to write cache entry {key}: {e}")
+
+    def _prune_disk(self):
+        """Delete the least recently written files until under the disk budget."""
+        files = []
+        total = 0
+        for entry in os.scandir(self.disk_path):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+
+        files.sort()
+        for _, size, path in files:
+            if total <= self.disk_max_bytes:
+                break
+            os.unlink(path)
+            total -= size
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and memory usage."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
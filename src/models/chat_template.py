@@ -0,0 +1,206 @@
+import functools
+from typing import Dict, List, Optional
+
+from ..utils.logging import logger
+
+try:
+    from jinja2.sandbox import ImmutableSandboxedEnvironment
+except ImportError:
+    ImmutableSandboxedEnvironment = None
+
+
+class ChatTemplate:
+    """Renders chat messages in a model's native prompt format.
+
+    Built-in formats are described by per-role format strings that are
+    resolved once; rendering is a single pass over the messages.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        roles: Dict[str, str],
+        generation_prompt: str,
+        stop: List[str],
+        merge_system: bool = False
+    ):
+        self.name = name
+        self.roles = roles
+        self.generation_prompt = generation_prompt
+        self.stop = stop
+        # Formats without a system role fold it into the first user message
+        self.merge_system = merge_system
+
+    def render(self, messages: List[Dict[str, str]]) -> str:
+        """Render messages followed by the assistant generation prompt."""
+        if self.merge_system:
+            messages = _merge_system_messages(messages)
+
+        parts = []
+        for message in messages:
+            role_format = self.roles.get(message["role"]) or self.roles["user"]
+            parts.append(role_format.format(content=message["content"]))
+        parts.append(self.generation_prompt)
+        return "".join(parts)
+
+
+class JinjaChatTemplate(ChatTemplate):
+    """A GGUF/Hugging Face Jinja chat template, compiled once."""
+
+    def __init__(self, source: str, eos_token: str = "", stop: Optional[List[str]] = None):
+        super().__init__("jinja", {}, "", stop or [])
+        self.source = source
+        self.eos_token = eos_token
+        self._template = _compile_jinja(source)
+
+    def render(self, messages: List[Dict[str, str]]) -> str:
+        # llama.cpp adds BOS itself, so the template must not add another
+        return self._template.render(
+            messages=messages,
+            add_generation_prompt=True,
+            bos_token="",
+            eos_token=self.eos_token,
+        )
+
+
+def _merge_system_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    """Fold system messages into the following user message."""
+    merged = []
+    system = []
+    for message in messages:
+        if message["role"] == "system":
+            system.append(message["content"])
+        elif system and message["role"] == "user":
+            merged.append({"role": "user", "content": "\n\n".join(system + [message["content"]])})
+            system = []
+        else:
+            merged.append(message)
+    if system:
+        merged.append({"role": "user", "content": "\n\n".join(system)})
+    return merged
+
+
+BUILTIN_TEMPLATES = {
+    "chatml": ChatTemplate(
+        "chatml",
+        {role: f"<|im_start|>{role}\n{{content}}<|im_end|>\n" for role in ("system", "user", "assistant")},
+        "<|im_start|>assistant\n",
+        ["<|im_end|>"],
+    ),
+    "phi3": ChatTemplate(
+        "phi3",
+        {role: f"<|{role}|>\n{{content}}<|end|>\n" for role in ("system", "user", "assistant")},
+        "<|assistant|>\n",
+        ["<|end|>", "<|endoftext|>"],
+    ),
+    "llama3": ChatTemplate(
+        "llama3",
+        {
+            role: f"<|start_header_id|>{role}<|end_header_id|>\n\n{{content}}<|eot_id|>"
+            for role in ("system", "user", "assistant")
+        },
+        "<|start_header_id|>assistant<|end_header_id|>\n\n",
+        ["<|eot_id|>"],
+    ),
+    "mistral": ChatTemplate(
+        "mistral",
+        {"user": "[INST] {content} [/INST]", "assistant": " {content}</s>"},
+        "",
+        ["</s>"],
+        merge_system=True,
+    ),
+    "gemma": ChatTemplate(
+        "gemma",
+        {
+            "user": "<start_of_turn>user\n{content}<end_of_turn>\n",
+            "assistant": "<start_of_turn>model\n{content}<end_of_turn>\n",
+        },
+        "<start_of_turn>model\n",
+        ["<end_of_turn>"],
+        merge_system=True,
+    ),
+    "zephyr": ChatTemplate(
+        "zephyr",
+        {role: f"<|{role}|>\n{{content}}</s>\n" for role in ("system", "user", "assistant")},
+        "<|assistant|>\n",
+        ["</s>"],
+    ),
+    # Plain transcript used when a model has no template at all
+    "plain": ChatTemplate(
+        "plain",
+        {"system": "System: {content}\n", "user": "User: {content}\n", "assistant": "Assistant: {content}\n"},
+        "Assistant: ",
+        ["\nUser:"],
+    ),
+}
+
+# End-of-turn markers worth stopping on when they appear in a Jinja template
+_KNOWN_END_MARKERS = ["<|im_end|>", "<|eot_id|>", "<|end|>", "<end_of_turn>", "<|endoftext|>", "</s>"]
+
+
+def detect_template_family(source: str) -> Optional[str]:
+    """Recognize common Jinja chat templates by their marker tokens."""
+    if "<|im_start|>" in source:
+        return "chatml"
+    if "<|start_header_id|>" in source:
+        return "llama3"
+    if "<start_of_turn>" in source:
+        return "gemma"
+    if "<|assistant|>" in source and "<|end|>" in source:
+        return "phi3"
+    if "<|assistant|>" in source and "</s>" in source:
+        return "zephyr"
+    if "[INST]" in source:
+        return "mistral"
+    return None
+
+
+@functools.lru_cache(maxsize=None)
+def _compile_jinja(source: str):
+    """Compile a Jinja template once per distinct source."""
+    if ImmutableSandboxedEnvironment is None:
+        raise RuntimeError("jinja2 is required to render custom chat templates")
+
+    def raise_exception(message):
+        raise ValueError(message)
+
+    environment = ImmutableSandboxedEnvironment(trim_blocks=True, lstrip_blocks=True)
+    environment.globals["raise_exception"] = raise_exception
+    return environment.from_string(source)
+
+
+def load_chat_template(
+    model_name: str,
+    configured: Optional[str],
+    gguf_template: Optional[str],
+    eos_token: str = ""
+) -> ChatTemplate:
+    """Pick a model's chat template.
+
+    ``configured`` (from models.yaml) wins over the GGUF
+    ``tokenizer.chat_template`` metadata. Either may be a built-in name or
+    Jinja source; recognized Jinja templates use the equivalent built-in.
+    """
+    for source in (configured, gguf_template):
+        if not source:
+            continue
+        if source in BUILTIN_TEMPLATES:
+            return BUILTIN_TEMPLATES[source]
+
+        family = detect_template_family(source)
+        if family is not None:
+            return BUILTIN_TEMPLATES[family]
+
+        stop = [marker for marker in _KNOWN_END_MARKERS if marker in source]
+        if eos_token and eos_token not in stop:
+            stop.append(eos_token)
+        try:
+            return JinjaChatTemplate(source, eos_token, stop)
+        except Exception as e:
+            origin = "models.yaml" if source is configured else "GGUF"
+            logger.warning(
+                f"Cannot render the {origin} chat template of {model_name}, "
+                f"falling back to plain prompts: {e}"
+            )
+
+    return BUILTIN_TEMPLATES["plain"]
@@ -0,0 +1,192 @@
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+
+from ..utils.logging import logger, REQUEST_LOG
+from .tokenizer import GGUFTokenizer
+
+
+# How chat history is fitted into the context window, set with context.policy
+OFF = "off"            # send every message; llama.cpp shifts or fails on overflow
+WINDOW = "window"      # drop the oldest turns, keeping system messages
+TRUNCATE = "truncate"  # like window, then keep the tail of the oldest dropped turn
+POLICIES = {OFF, WINDOW, TRUNCATE}
+
+# Tokens kept free for the answer when a request does not set max_tokens
+DEFAULT_RESERVE_TOKENS = 512
+
+# Template tokens assumed per message when rendering a probe fails
+DEFAULT_MESSAGE_OVERHEAD = 8
+
+
+class ContextBudget:
+    """Fits chat history into a model's context window.
+
+    The window is ``num_ctx`` minus room for ``max_tokens``. System messages
+    and the latest message are always kept; older turns are dropped from
+    the front by policy, optionally capped at ``keep_tokens`` of history.
+    The cut only moves in steps of ``window_step`` of the window, so
+    consecutive turns keep the same prompt prefix and llama.cpp can reuse
+    its cached evaluation of it.
+
+    Token counts are memoized per conversation prefix (a hash chain over the
+    messages), so each turn only tokenizes the messages added since the last.
+    """
+
+    def __init__(self, settings: Dict[str, Any]):
+        self.settings = settings
+        self.max_entries = int(settings.get("cache_entries", 4096))
+        # Prefix hash -> tokens in that prefix, least recently used first
+        self._prefix_tokens: "OrderedDict[bytes, int]" = OrderedDict()
+        # (vocabulary, template, role) -> template tokens around a message
+        self._overheads: Dict[Tuple[str, str, str], int] = {}
+        # Counting runs on worker threads
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _model_settings(self, model) -> Dict[str, Any]:
+        # The policy names are checked when the configuration is loaded
+        return {**self.settings, **(model.model_config.get("context") or {})}
+
+    def _overhead(self, model, tokenizer: GGUFTokenizer, role: str) -> int:
+        """Tokens the chat template adds around one message of a role."""
+        key = (tokenizer.fingerprint, model.chat_template.name, role)
+        overhead = self._overheads.get(key)
+        if overhead is None:
+            try:
+                rendered = model.render_chat([{"role": role, "content": "x"}])
+                overhead = max(0, tokenizer.count(rendered) - tokenizer.count("x"))
+            except Exception:
+                overhead = DEFAULT_MESSAGE_OVERHEAD
+            self._overheads[key] = overhead
+        return overhead
+
+    def count_messages(self, model, tokenizer: GGUFTokenizer, messages: List[Dict[str, str]]) -> List[int]:
+        """Tokens per message, template included; only unseen prefixes are tokenized."""
+        counts = []
+        digest = hashlib.sha256(tokenizer.fingerprint.encode()).digest()
+        total = 0
+        for message in messages:
+            digest = hashlib.sha256(
+                digest + message["role"].encode() + b"\0" + message["content"].encode()
+            ).digest()
+            with self._lock:
+                cumulative = self._prefix_tokens.get(digest)
+                if cumulative is not None:
+                    self._prefix_tokens.move_to_end(digest)
+                    self.hits += 1
+            if cumulative is None:
+                cumulative = total + tokenizer.count(message["content"]) + self._overhead(model, tokenizer, message["role"])
+                with self._lock:
+                    self.misses += 1
+                    self._prefix_tokens[digest] = cumulative
+                    if len(self._prefix_tokens) > self.max_entries:
+                        self._prefix_tokens.popitem(last=False)
+            counts.append(cumulative - total)
+            total = cumulative
+        return counts
+
+    async def fit(
+        self,
+        model,
+        messages: List[Dict[str, str]],
+        options: Optional[Dict[str, Any]] = None
+    ) -> List[Dict[str, str]]:
+        """Messages to render for a request, trimmed to the model's context budget."""
+        settings = self._model_settings(model)
+        policy = settings.get("policy", WINDOW)
+        if policy == OFF or len(messages) < 2:
+            return messages
+        tokenizer = await model.get_tokenizer()
+        if tokenizer is None:
+            # No vocabulary to count with (e.g. a remote model); the engine decides
+            return messages
+
+        params = model.merged_parameters(options)
+        n_ctx = int(params.get("num_ctx", model.context_size))
+        max_tokens = int(params.get("max_tokens", -1))
+        reserve = max_tokens if max_tokens > 0 else int(settings.get("reserve_tokens", DEFAULT_RESERVE_TOKENS))
+        budget = n_ctx - reserve
+
+        counts = await asyncio.to_thread(self.count_messages, model, tokenizer, messages)
+        kept = self._select(messages, counts, budget, settings, policy, tokenizer)
+        if kept is not messages:
+            logger.info(
+                f"Context for {model.model_name}: kept {len(kept)} of {len(messages)} messages "
+                f"({sum(counts)} tokens) to fit {budget} of {n_ctx}",
+                extra=REQUEST_LOG,
+            )
+        return kept
+
+    def _select(
+        self,
+        messages: List[Dict[str, str]],
+        counts: List[int],
+        budget: int,
+        settings: Dict[str, Any],
+        policy: str,
+        tokenizer: GGUFTokenizer
+    ) -> List[Dict[str, str]]:
+        system = {i for i, message in enumerate(messages[:-1]) if message["role"] == "system"}
+        history = [i for i in range(len(messages)) if i not in system]
+        available = budget - sum(counts[i] for i in system)
+        keep_tokens = int(settings.get("keep_tokens", 0))
+        if keep_tokens > 0:
+            available = min(available, keep_tokens)
+
+        # before[j]: history tokens ahead of history[j]
+        before = [0]
+        for i in history:
+            before.append(before[-1] + counts[i])
+        total = before[-1]
+        if total <= available:
+            return messages
+
+        # Smallest cut that fits; the latest message stays even if it alone does not
+        first = next((j for j in range(len(history)) if total - before[j] <= available), len(history) - 1)
+        if total - before[first] > available:
+            logger.warning(f"The latest message alone exceeds the context budget ({total - before[first]} > {available})")
+
+        cut = first
+        step = max(1, int(available * float(settings.get("window_step", 0.25))))
+        if policy == WINDOW:
+            # Only cut where the dropped history crosses a step boundary, so the
+            # cut (and the prompt prefix) stays put for several turns
+            for j in range(first, len(history)):
+                if j == 0 or before[j] // step != before[j - 1] // step:
+                    cut = j
+                    break
+
+        kept_indices = system | set(history[cut:])
+        kept = [message for i, message in enumerate(messages) if i in kept_indices]
+
+        if policy == TRUNCATE and cut > 0:
+            # Fill the remaining room with the end of the newest dropped message
+            room = available - (total - before[cut])
+            partial = messages[history[cut - 1]]
+            overhead = counts[history[cut - 1]] - tokenizer.count(partial["content"])
+            limit = room - overhead
+            ids = tokenizer.encode(partial["content"])
+            content = ""
+            while limit > 0:
+                # A decoded tail can re-tokenize longer (e.g. a new space prefix)
+                content = tokenizer.decode(ids[-limit:])
+                if tokenizer.count(content) <= room - overhead:
+                    break
+                limit -= 1
+            if limit > 0:
+                truncated = {**partial, "content": content}
+                position = sum(1 for i in kept_indices if i < history[cut - 1])
+                kept.insert(position, truncated)
+
+        return kept
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "prefixes": len(self._prefix_tokens),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
@@ -0,0 +1,334 @@
+import glob
+import os
+from typing import Dict, Any, Optional, List, Tuple, Callable, FrozenSet, Set
+
+from ..utils.logging import logger
+
+
+# How llama.cpp processes share the host's cores, set with cpu.policy in models.yaml
+PARTITION = "partition"  # disjoint core sets per worker, pinned with CPU affinity
+SHARED = "shared"        # thread counts sized per worker, no pinning
+OFF = "off"              # leave threads to llama.cpp (every process uses all cores)
+POLICIES = {PARTITION, SHARED, OFF}
+
+# Whether this platform lets us pin processes (Linux only)
+CAN_PIN = hasattr(os, "sched_setaffinity")
+
+
+def _read(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def parse_cpu_list(text: str) -> List[int]:
+    """Parse a kernel CPU list such as ``0-3,8-11``."""
+    cpus = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            first, last = part.split("-", 1)
+            cpus.extend(range(int(first), int(last) + 1))
+        else:
+            cpus.append(int(part))
+    return cpus
+
+
+def format_cpu_list(cpus) -> str:
+    """Format CPUs as a compact kernel-style list (``0-3,8``)."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(str(a) if a == b else f"{a}-{b}" for a, b in ranges)
+
+
+class CpuTopology:
+    """The CPUs this process may use, grouped by NUMA node and physical core.
+
+    ``cores`` lists one ``(node, cpus)`` pair per physical core, ordered by
+    node, where ``cpus`` are the core's hyperthreads.
+    """
+
+    def __init__(self, cores: List[Tuple[int, List[int]]]):
+        self.cores = cores
+
+    @classmethod
+    def detect(cls, sysfs: str = "/sys/devices/system") -> "CpuTopology":
+        """Read the topology from sysfs, restricted to the CPUs we may run on."""
+        if hasattr(os, "sched_getaffinity"):
+            usable = sorted(os.sched_getaffinity(0))
+        else:
+            usable = list(range(os.cpu_count() or 1))
+
+        node_of = {}
+        for path in glob.glob(os.path.join(sysfs, "node", "node[0-9]*")):
+            cpulist = _read(os.path.join(path, "cpulist"))
+            if cpulist:
+                node = int(os.path.basename(path)[4:])
+                for cpu in parse_cpu_list(cpulist):
+                    node_of[cpu] = node
+
+        # Hyperthreads of a core share its package and core id
+        siblings: Dict[Tuple[int, int, str], List[int]] = {}
+        for cpu in usable:
+            topology = os.path.join(sysfs, "cpu", f"cpu{cpu}", "topology")
+            package = _read(os.path.join(topology, "physical_package_id"))
+            core = _read(os.path.join(topology, "core_id"))
+            key = (node_of.get(cpu, 0), package or "0", core) if core is not None else (node_of.get(cpu, 0), str(cpu), "")
+            siblings.setdefault(key, []).append(cpu)
+
+        cores = sorted(((key[0], cpus) for key, cpus in siblings.items()), key=lambda item: (item[0], item[1][0]))
+        return cls(cores)
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted({node for node, _ in self.cores})
+
+    @property
+    def logical_cpus(self) -> int:
+        return sum(len(cpus) for _, cpus in self.cores)
+
+    def partition(self, count: int, reserve: int = 0) -> List[List[Tuple[int, List[int]]]]:
+        """Split the cores into ``count`` disjoint groups of near-equal size.
+
+        The first ``reserve`` cores are left out for the web server itself.
+        Groups do not straddle NUMA nodes while there are at least as many
+        groups as nodes; with more groups than cores, cores are shared.
+        """
+        if count <= 0:
+            return []
+        cores = self.cores[min(reserve, len(self.cores) - 1):]
+        if count >= len(cores):
+            return [[cores[i % len(cores)]] for i in range(count)]
+
+        by_node: Dict[int, List[Tuple[int, List[int]]]] = {}
+        for core in cores:
+            by_node.setdefault(core[0], []).append(core)
+        nodes = list(by_node.values())
+        if len(nodes) == 1 or count < len(nodes):
+            return _split(cores, count)
+
+        # Give each node a share of the groups in proportion to its cores
+        shares = [1] * len(nodes)
+        for _ in range(count - len(nodes)):
+            candidates = [i for i in range(len(nodes)) if shares[i] < len(nodes[i])]
+            best = max(candidates, key=lambda i: len(nodes[i]) / (shares[i] + 1))
+            shares[best] += 1
+        groups = []
+        for node_cores, share in zip(nodes, shares):
+            groups.extend(_split(node_cores, share))
+        return groups
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "nodes": len(self.nodes),
+            "physical_cores": len(self.cores),
+            "logical_cpus": self.logical_cpus,
+        }
+
+
+def _split(items: List, count: int) -> List[List]:
+    """Cut a list into ``count`` contiguous chunks whose sizes differ by at most one."""
+    size, extra = divmod(len(items), count)
+    chunks, start = [], 0
+    for i in range(count):
+        end = start + size + (1 if i < extra else 0)
+        chunks.append(items[start:end])
+        start = end
+    return chunks
+
+
+def pin(pid: int, cpus: FrozenSet[int]):
+    """Set the CPU affinity of every thread of a running process."""
+    try:
+        tids = [int(tid) for tid in os.listdir(f"/proc/{pid}/task")]
+    except OSError:
+        tids = [pid]
+    for tid in tids:
+        try:
+            os.sched_setaffinity(tid, cpus)
+        except OSError:
+            # The thread or process has already exited
+            pass
+
+
+class CpuSlot:
+    """The share of the host given to one worker of a model.
+
+    A resident llama-server worker keeps its slot for life; llama-cli
+    processes claim the least busy slot of their model per request.
+    """
+
+    def __init__(self, model_name: str, index: int):
+        self.model_name = model_name
+        self.index = index
+        # None when the process is not pinned
+        self.cpus: Optional[FrozenSet[int]] = None
+        # None leaves the choice to llama.cpp
+        self.threads: Optional[int] = None
+        self.threads_batch: Optional[int] = None
+        self.pids: Set[int] = set()
+        self.busy = 0
+
+    def attach(self, pid: int):
+        """Pin a freshly started process to this slot's CPUs."""
+        self.pids.add(pid)
+        if self.cpus is not None:
+            pin(pid, self.cpus)
+
+    def detach(self, pid: Optional[int]):
+        self.pids.discard(pid)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model_name,
+            "index": self.index,
+            "cpus": format_cpu_list(self.cpus) if self.cpus is not None else None,
+            "threads": self.threads,
+            "threads_batch": self.threads_batch,
+            "pids": sorted(self.pids),
+        }
+
+
+class CpuPlanner:
+    """Splits the host's cores between the llama.cpp workers of loaded models.
+
+    Each loaded model registers one slot per worker it may run at once
+    (llama-server workers, or concurrent llama-cli processes). The cores are
+    divided evenly between all registered slots, each model's slots kept
+    next to each other and within a NUMA node where possible, and every
+    slot gets a thread count matching its cores. Whenever a model is loaded
+    or unloaded the cores are divided again and running processes are
+    re-pinned; they keep the thread count they were started with.
+    """
+
+    def __init__(self, settings: Optional[Dict[str, Any]] = None, topology: Optional[CpuTopology] = None):
+        self._topology = topology
+        self._owners: Dict[int, List[CpuSlot]] = {}
+        self._concurrency: Callable[[str], int] = lambda model_name: 1
+        self.configure(settings or {})
+
+    @property
+    def topology(self) -> CpuTopology:
+        # Detected on first use rather than at import
+        if self._topology is None:
+            self._topology = CpuTopology.detect()
+            stats = self._topology.stats()
+            logger.info(
+                f"CPU topology: {stats['nodes']} NUMA node(s), {stats['physical_cores']} cores, "
+                f"{stats['logical_cpus']} logical CPUs"
+            )
+        return self._topology
+
+    def configure(self, settings: Dict[str, Any], concurrency: Optional[Callable[[str], int]] = None):
+        """Apply the ``cpu`` section of the configuration and divide the cores again.
+
+        ``concurrency`` tells how many requests a model may run at once,
+        which is how many llama-cli processes it can have alive.
+        """
+        policy = settings.get("policy", PARTITION)
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown cpu policy '{policy}', expected one of {sorted(POLICIES)}")
+        if policy == PARTITION and not CAN_PIN:
+            logger.warning("CPU affinity is not supported on this platform, sizing threads without pinning")
+            policy = SHARED
+        self.policy = policy
+        self.reserve = max(0, int(settings.get("reserve", 0)))
+        # Hyperthreads help prompt processing but not token generation
+        self.batch_hyperthreads = bool(settings.get("batch_hyperthreads", True))
+        if concurrency is not None:
+            self._concurrency = concurrency
+        self._rebalance()
+
+    def concurrency(self, model_name: str) -> int:
+        return max(1, int(self._concurrency(model_name)))
+
+    def register(self, owner, model_name: str, workers: int) -> List[CpuSlot]:
+        """Reserve cores for ``workers`` processes of a model being loaded."""
+        slots = [CpuSlot(model_name, i) for i in range(max(1, workers))]
+        self._owners[id(owner)] = slots
+        self._rebalance()
+        return slots
+
+    def unregister(self, owner):
+        """Give a model's cores back once it is unloaded (idempotent)."""
+        if self._owners.pop(id(owner), None) is not None:
+            self._rebalance()
+
+    def slots(self, owner) -> List[CpuSlot]:
+        return self._owners.get(id(owner), [])
+
+    def slot(self, owner, index: int) -> Optional[CpuSlot]:
+        """The slot of a model's ``index``-th worker, or None if it is not registered."""
+        slots = self.slots(owner)
+        return slots[index % len(slots)] if slots else None
+
+    def claim(self, owner) -> Optional[CpuSlot]:
+        """Take the least busy slot of a model for one process; pair with release()."""
+        slots = self.slots(owner)
+        if not slots:
+            return None
+        slot = min(slots, key=lambda s: s.busy)
+        slot.busy += 1
+        return slot
+
+    def release(self, slot: Optional[CpuSlot], pid: Optional[int] = None):
+        if slot is not None:
+            slot.busy -= 1
+            slot.detach(pid)
+
+    def _rebalance(self):
+        slots = [slot for owner_slots in self._owners.values() for slot in owner_slots]
+        if not slots:
+            return
+
+        if self.policy == OFF:
+            groups = [None] * len(slots)
+        else:
+            groups = self.topology.partition(len(slots), self.reserve)
+
+        for slot, group in zip(slots, groups):
+            if group is None:
+                cpus, threads, threads_batch = None, None, None
+            else:
+                cpus = frozenset(cpu for _, core_cpus in group for cpu in core_cpus)
+                # Generation is memory bound and scales with physical cores
+                threads = len(group)
+                threads_batch = len(cpus) if self.batch_hyperthreads else threads
+                if self.policy == SHARED:
+                    cpus = None
+
+            changed = cpus != slot.cpus
+            slot.cpus, slot.threads, slot.threads_batch = cpus, threads, threads_batch
+            if changed and cpus is not None:
+                for pid in list(slot.pids):
+                    pin(pid, cpus)
+
+        logger.info(
+            f"CPU plan ({self.policy}): "
+            + ", ".join(
+                f"{slot.model_name}#{slot.index}="
+                + (format_cpu_list(slot.cpus) if slot.cpus is not None else "unpinned")
+                + (f"/{slot.threads}t" if slot.threads else "")
+                for slot in slots
+            )
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "policy": self.policy,
+            "reserve": self.reserve,
+            **self.topology.stats(),
+            "slots": [slot.stats() for slots in self._owners.values() for slot in slots],
+        }
+
+
+# Shared by every model in the process; configured from models.yaml at startup
+cpu_planner = CpuPlanner()
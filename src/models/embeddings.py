@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+from array import array
+from collections import OrderedDict
+from typing import Dict, Any, List, Callable, Awaitable, Tuple
+
+from ..utils.logging import logger
+
+
+class EmbeddingCache:
+    """LRU cache of embedding vectors keyed by a hash of model and text.
+
+    Vectors are stored as packed float32 arrays (4 bytes per dimension rather
+    than a Python float object each), and the cache is bounded by their total
+    size.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, array]" = OrderedDict()
+        self._bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(model_key: str, text: str) -> str:
+        """Content hash of a text for a particular model file."""
+        digest = hashlib.sha256(model_key.encode())
+        digest.update(b"\0")
+        digest.update(text.encode())
+        return digest.hexdigest()
+
+    def get(self, key: str):
+        """Return a cached vector, or None on miss."""
+        vector = self._entries.get(key)
+        if vector is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector.tolist()
+
+    def put(self, key: str, vector: List[float]):
+        packed = array("f", vector)
+        size = len(packed) * packed.itemsize
+        if size > self.max_bytes:
+            return
+
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = packed
+        self._bytes += size
+
+        while self._bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        packed = self._entries.pop(key)
+        self._bytes -= len(packed) * packed.itemsize
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and memory usage."""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class EmbeddingBatcher:
+    """Groups concurrent embedding requests into one engine call.
+
+    The first request opens a short window; everything submitted before it
+    closes (or until ``max_batch`` texts are pending) is embedded together,
+    with duplicate texts computed once, and each caller gets its own slice.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[List[str]], Awaitable[List[List[float]]]],
+        window: float = 0.005,
+        max_batch: int = 32
+    ):
+        self.run = run
+        self.window = window
+        self.max_batch = max(1, max_batch)
+
+        self._pending: List[Tuple[List[str], asyncio.Future]] = []
+        self._pending_count = 0
+        self._timer = None
+        self._tasks = set()
+
+        self.batches = 0
+        self.texts = 0
+
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """Embed texts, sharing an engine call with concurrent requests."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((texts, future))
+        self._pending_count += len(texts)
+
+        if self._pending_count >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending, self._pending_count = self._pending, [], 0
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            # Keep a reference so the task isn't garbage collected mid-flight
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run_batch(self, batch: List[Tuple[List[str], asyncio.Future]]):
+        unique = list(dict.fromkeys(text for texts, _ in batch for text in texts))
+        try:
+            vectors = {}
+            for start in range(0, len(unique), self.max_batch):
+                chunk = unique[start:start + self.max_batch]
+                vectors.update(zip(chunk, await self.run(chunk)))
+                self.batches += 1
+            self.texts += len(unique)
+        except Exception as e:
+            logger.error(f"Embedding batch of {len(unique)} texts failed: {e}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for texts, future in batch:
+            if not future.done():
+                future.set_result([vectors[text] for text in texts])
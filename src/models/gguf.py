@@ -0,0 +1,270 @@
+import mmap
+import struct
+from typing import Dict, Any, List, Optional
+
+
+GGUF_MAGIC = b"GGUF"
+
+# GGUF metadata value types
+GGUF_UINT8 = 0
+GGUF_INT8 = 1
+GGUF_UINT16 = 2
+GGUF_INT16 = 3
+GGUF_UINT32 = 4
+GGUF_INT32 = 5
+GGUF_FLOAT32 = 6
+GGUF_BOOL = 7
+GGUF_STRING = 8
+GGUF_ARRAY = 9
+GGUF_UINT64 = 10
+GGUF_INT64 = 11
+GGUF_FLOAT64 = 12
+
+_SCALAR_FORMATS = {
+    GGUF_UINT8: "<B",
+    GGUF_INT8: "<b",
+    GGUF_UINT16: "<H",
+    GGUF_INT16: "<h",
+    GGUF_UINT32: "<I",
+    GGUF_INT32: "<i",
+    GGUF_FLOAT32: "<f",
+    GGUF_BOOL: "<?",
+    GGUF_UINT64: "<Q",
+    GGUF_INT64: "<q",
+    GGUF_FLOAT64: "<d",
+}
+
+# llama_ftype values stored in general.file_type
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16",
+}
+
+# Arrays longer than this (token lists, merges, scores) are not decoded eagerly
+LAZY_ARRAY_THRESHOLD = 64
+
+
+class GGUFFormatError(ValueError):
+    """Raised when a file is not a readable GGUF file."""
+
+
+class GGUFArray:
+    """A metadata array left in the mapped file until it is needed."""
+
+    def __init__(self, reader: "GGUFReader", item_type: int, count: int, offset: int):
+        self.reader = reader
+        self.item_type = item_type
+        self.count = count
+        self.offset = offset
+
+    def __len__(self) -> int:
+        return self.count
+
+    def read(self) -> List[Any]:
+        """Decode every element of the array."""
+        values, _ = self.reader._read_array_items(self.item_type, self.count, self.offset)
+        return values
+
+    def __repr__(self) -> str:
+        return f"GGUFArray(type={self.item_type}, count={self.count})"
+
+
+class GGUFReader:
+    """Reads GGUF header metadata through mmap without touching tensor data.
+
+    Only the key/value section is decoded; large arrays are recorded by
+    offset and decoded on demand via ``GGUFArray.read``.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            self._file.close()
+            raise GGUFFormatError(f"Not a GGUF file: {path}")
+
+        self.metadata: Dict[str, Any] = {}
+        self.version = 0
+        self.tensor_count = 0
+        self.tensor_info_offset = 0
+
+        try:
+            self._read_header()
+        except (struct.error, UnicodeDecodeError, IndexError) as e:
+            self.close()
+            raise GGUFFormatError(f"Corrupt GGUF header in {path}: {e}")
+        except GGUFFormatError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _unpack(self, fmt: str, offset: int):
+        return struct.unpack_from(fmt, self._map, offset)[0], offset + struct.calcsize(fmt)
+
+    def _read_string(self, offset: int):
+        length, offset = self._unpack("<Q", offset)
+        return bytes(self._map[offset:offset + length]).decode("utf-8"), offset + length
+
+    def _skip_string(self, offset: int) -> int:
+        length, offset = self._unpack("<Q", offset)
+        return offset + length
+
+    def _read_header(self):
+        if self._map[:4] != GGUF_MAGIC:
+            raise GGUFFormatError(f"Not a GGUF file: {self.path}")
+
+        self.version, offset = self._unpack("<I", 4)
+        if self.version == 1:
+            # Version 1 used 32-bit counts
+            self.tensor_count, offset = self._unpack("<I", offset)
+            kv_count, offset = self._unpack("<I", offset)
+        else:
+            self.tensor_count, offset = self._unpack("<Q", offset)
+            kv_count, offset = self._unpack("<Q", offset)
+
+        for _ in range(kv_count):
+            key, offset = self._read_string(offset)
+            value_type, offset = self._unpack("<I", offset)
+            self.metadata[key], offset = self._read_value(value_type, offset)
+
+        self.tensor_info_offset = offset
+
+    def _read_value(self, value_type: int, offset: int):
+        if value_type == GGUF_STRING:
+            return self._read_string(offset)
+        if value_type == GGUF_ARRAY:
+            item_type, offset = self._unpack("<I", offset)
+            count, offset = self._unpack("<Q", offset)
+            if count > LAZY_ARRAY_THRESHOLD:
+                array = GGUFArray(self, item_type, count, offset)
+                return array, self._skip_array_items(item_type, count, offset)
+            return self._read_array_items(item_type, count, offset)
+        if value_type in _SCALAR_FORMATS:
+            return self._unpack(_SCALAR_FORMATS[value_type], offset)
+        raise GGUFFormatError(f"Unknown GGUF value type {value_type}")
+
+    def _read_array_items(self, item_type: int, count: int, offset: int):
+        if item_type in _SCALAR_FORMATS:
+            fmt = _SCALAR_FORMATS[item_type]
+            values = list(struct.unpack_from(f"<{count}{fmt[1]}", self._map, offset))
+            return values, offset + struct.calcsize(fmt) * count
+
+        values = []
+        for _ in range(count):
+            value, offset = self._read_value(item_type, offset)
+            values.append(value)
+        return values, offset
+
+    def _skip_array_items(self, item_type: int, count: int, offset: int) -> int:
+        if item_type in _SCALAR_FORMATS:
+            return offset + struct.calcsize(_SCALAR_FORMATS[item_type]) * count
+        if item_type == GGUF_STRING:
+            for _ in range(count):
+                offset = self._skip_string(offset)
+            return offset
+        _, offset = self._read_array_items(item_type, count, offset)
+        return offset
+
+    def parameter_count(self) -> int:
+        """Sum the element counts of all tensors from the tensor info table."""
+        offset = self.tensor_info_offset
+        total = 0
+        for _ in range(self.tensor_count):
+            offset = self._skip_string(offset)
+            n_dims, offset = self._unpack("<I", offset)
+            dims = struct.unpack_from(f"<{n_dims}Q", self._map, offset)
+            offset += 8 * n_dims + 4 + 8  # dims, ggml type, data offset
+            count = 1
+            for dim in dims:
+                count *= dim
+            total += count
+        return total
+
+    def token_string(self, token_id: Optional[int]) -> str:
+        """Return the vocabulary entry for a token id, or "" if unavailable."""
+        tokens = self.metadata.get("tokenizer.ggml.tokens")
+        if token_id is None or tokens is None or not 0 <= token_id < len(tokens):
+            return ""
+        if isinstance(tokens, list):
+            return tokens[token_id]
+
+        # Walk to the entry without decoding the rest of the vocabulary
+        offset = tokens.offset
+        for _ in range(token_id):
+            offset = self._skip_string(offset)
+        value, _ = self._read_string(offset)
+        return value
+
+
+def read_gguf_metadata(path: str) -> Dict[str, Any]:
+    """Read the scalar and small-array metadata of a GGUF file."""
+    with GGUFReader(path) as reader:
+        return {
+            key: value for key, value in reader.metadata.items()
+            if not isinstance(value, GGUFArray)
+        }
+
+
+def format_parameter_size(count: int) -> str:
+    """Format a parameter count the way Ollama does (e.g. "3.8B")."""
+    for threshold, suffix in ((1e12, "T"), (1e9, "B"), (1e6, "M"), (1e3, "K")):
+        if count >= threshold:
+            return f"{count / threshold:.1f}{suffix}"
+    return str(count)
+
+
+def describe_gguf(path: str) -> Dict[str, Any]:
+    """Summarize the model-level facts stored in a GGUF header.
+
+    Returns architecture, context length, quantization, parameter count,
+    vocabulary size, chat template and the EOS token text.
+    """
+    with GGUFReader(path) as reader:
+        metadata = reader.metadata
+        architecture = metadata.get("general.architecture", "")
+
+        parameter_count = metadata.get("general.parameter_count")
+        if not parameter_count:
+            parameter_count = reader.parameter_count()
+
+        tokens = metadata.get("tokenizer.ggml.tokens")
+        file_type = metadata.get("general.file_type")
+
+        def arch_value(name: str):
+            return metadata.get(f"{architecture}.{name}")
+
+        return {
+            "name": metadata.get("general.name", ""),
+            "architecture": architecture,
+            "context_length": arch_value("context_length"),
+            "embedding_length": arch_value("embedding_length"),
+            "block_count": arch_value("block_count"),
+            "head_count": arch_value("attention.head_count"),
+            "head_count_kv": arch_value("attention.head_count_kv"),
+            "file_type": file_type,
+            "quantization_level": FILE_TYPES.get(file_type, "unknown") if file_type is not None else "unknown",
+            "parameter_count": parameter_count,
+            "parameter_size": format_parameter_size(parameter_count),
+            "vocab_size": len(tokens) if tokens is not None else None,
+            "tokenizer_model": metadata.get("tokenizer.ggml.model", ""),
+            "chat_template": metadata.get("tokenizer.chat_template"),
+            "eos_token": reader.token_string(metadata.get("tokenizer.ggml.eos_token_id")),
+            "gguf_version": reader.version,
+        }
@@ -0,0 +1,383 @@
+import asyncio
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Optional, List, Union
+
+from ..utils.logging import logger
+from .scheduler import SchedulerRejected
+
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_DURATION_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_keep_alive(value: Union[str, int, float]) -> Optional[float]:
+    """Parse an Ollama-style keep_alive into seconds.
+
+    Accepts numbers (seconds) and Go-style durations such as "5m" or
+    "1h30m". Negative values mean "keep loaded forever" and return None;
+    0 unloads the model as soon as it is idle.
+    """
+    if isinstance(value, (int, float)):
+        seconds = float(value)
+    else:
+        text = str(value).strip()
+        negative = text.startswith("-")
+        text = text.lstrip("+-")
+        try:
+            seconds = float(text)
+        except ValueError:
+            parts = _DURATION_PART.findall(text)
+            if not parts or "".join(n + u for n, u in parts) != text:
+                raise ValueError(f"Invalid keep_alive duration: {value!r}")
+            seconds = sum(float(n) * _DURATION_UNITS[u] for n, u in parts)
+        if negative:
+            seconds = -seconds
+
+    return None if seconds < 0 else seconds
+
+
+def default_memory_budget() -> int:
+    """80% of physical memory, or 0 (unlimited) if it cannot be determined."""
+    try:
+        return int(os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") * 0.8)
+    except (ValueError, OSError, AttributeError):
+        return 0
+
+
+class ModelCapacityError(SchedulerRejected):
+    """No memory could be freed for a model because the others are busy."""
+
+    status_code = 503
+
+
+class LoadedModel:
+    """Bookkeeping for one resident model."""
+
+    def __init__(self, model, footprint: int):
+        self.model = model
+        self.footprint = footprint
+        self.active = 0
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+        # Wall-clock expiry; None keeps the model loaded indefinitely
+        self.expires_at: Optional[float] = None
+        self.load_task: Optional[asyncio.Future] = None
+        self.load_duration = 0.0
+        self.unload_when_idle = False
+
+
+class Residency:
+    """A request's hold on a loaded model; release is idempotent."""
+
+    def __init__(self, lifecycle: "ModelLifecycle", entry: LoadedModel, keep_alive: Optional[float], load_duration: float):
+        self.lifecycle = lifecycle
+        self.entry = entry
+        self.keep_alive = keep_alive
+        # Time this request spent waiting for the model to load
+        self.load_duration = load_duration
+        self._released = False
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.lifecycle._release(self.entry, self.keep_alive)
+
+
+class ModelLifecycle:
+    """Loads models on first use and unloads them when idle or out of memory.
+
+    Each loaded model is charged its estimated footprint (weights plus KV
+    cache) against ``memory_budget``. Loading a model that does not fit
+    evicts idle models least-recently-used first; models with requests in
+    flight are never evicted, so a load may instead wait for one to finish.
+    Idle models are unloaded once their ``keep_alive`` expires.
+
+    When a configuration reload replaces or removes a model, its old version
+    is retired: it stops taking new requests, keeps serving the ones in
+    flight and is unloaded once they finish.
+    """
+
+    def __init__(
+        self,
+        memory_budget: int,
+        default_keep_alive: Optional[float] = 300.0,
+        check_interval: float = 5.0,
+        wait_timeout: float = 60.0
+    ):
+        self.memory_budget = memory_budget
+        self.default_keep_alive = default_keep_alive
+        self.check_interval = check_interval
+        self.wait_timeout = wait_timeout
+
+        self._loaded: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        # Retired model versions still serving requests, unloaded when idle
+        self._draining: List[LoadedModel] = []
+        self._freed = asyncio.Event()
+        self._reaper: Optional[asyncio.Task] = None
+
+        self.loads = 0
+        self.unloads = 0
+
+    def resolve_keep_alive(self, model, requested: Optional[Union[str, int, float]] = None) -> Optional[float]:
+        """Request keep_alive, else the model's configured one, else the default."""
+        if requested is not None:
+            return parse_keep_alive(requested)
+        configured = model.model_config.get("keep_alive")
+        if configured is not None:
+            return parse_keep_alive(configured)
+        return self.default_keep_alive
+
+    @property
+    def used_memory(self) -> int:
+        entries = list(self._loaded.values()) + self._draining
+        return sum(entry.footprint for entry in entries)
+
+    def is_loaded(self, model_name: str) -> bool:
+        return model_name in self._loaded
+
+    async def acquire(self, model, keep_alive: Optional[float]) -> Residency:
+        """Make sure a model is loaded and hold it for one request.
+
+        ``keep_alive`` is in seconds (see ``resolve_keep_alive``). Raises
+        ModelCapacityError if no room can be made within ``wait_timeout``.
+        """
+        self._ensure_reaper()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.wait_timeout
+        name = model.model_name
+
+        while True:
+            entry = self._loaded.get(name)
+            if entry is not None and entry.model is not model:
+                # The request resolved the model before a reload replaced it
+                entry = self._draining_entry(model)
+            if entry is not None:
+                break
+
+            footprint = model.memory_footprint()
+            unloading = self._make_room(footprint)
+            if unloading is not None:
+                entry = LoadedModel(model, footprint)
+                entry.load_task = asyncio.ensure_future(self._load(entry, unloading))
+                self._loaded[name] = entry
+                break
+
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise ModelCapacityError(
+                    f"Not enough memory to load model '{name}' while other models are busy",
+                    retry_after=max(1, int(self.check_interval)),
+                )
+            self._freed.clear()
+            try:
+                await asyncio.wait_for(self._freed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+
+        entry.active += 1
+        entry.last_used = time.time()
+        entry.expires_at = None
+        if self._loaded.get(name) is entry:
+            entry.unload_when_idle = False
+            self._loaded.move_to_end(name)
+
+        started = loop.time()
+        try:
+            await asyncio.shield(entry.load_task)
+        except BaseException:
+            entry.active -= 1
+            failed = entry.load_task.done() and (
+                entry.load_task.cancelled() or entry.load_task.exception() is not None
+            )
+            if failed and self._loaded.get(name) is entry:
+                del self._loaded[name]
+                self._freed.set()
+            elif failed and entry in self._draining:
+                self._draining.remove(entry)
+                self._freed.set()
+            raise
+
+        return Residency(self, entry, keep_alive, loop.time() - started)
+
+    async def _load(self, entry: LoadedModel, unloading: List[asyncio.Future]):
+        """Load a model once the models evicted for it have finished unloading."""
+        if unloading:
+            await asyncio.gather(*unloading, return_exceptions=True)
+
+        name = entry.model.model_name
+        started = time.monotonic()
+        logger.info(f"Loading model {name} (~{entry.footprint / 2**20:.0f} MiB)")
+        try:
+            await entry.model.load()
+        except BaseException:
+            # Stop whatever part of the model did start
+            await entry.model.unload()
+            raise
+        entry.load_duration = time.monotonic() - started
+        entry.loaded_at = time.time()
+        self.loads += 1
+        logger.info(f"Model {name} loaded in {entry.load_duration:.2f}s")
+
+    def _make_room(self, footprint: int) -> Optional[List[asyncio.Future]]:
+        """Evict idle models until ``footprint`` fits the budget.
+
+        Returns the unload tasks started, or None if the model cannot fit
+        until a busy model becomes idle. A model larger than the whole
+        budget is still loaded once everything else is gone.
+        """
+        used = self.used_memory
+        if not self.memory_budget or used + footprint <= self.memory_budget:
+            return []
+
+        idle = [
+            entry for entry in self._loaded.values()
+            if entry.active == 0 and entry.load_task.done()
+        ]
+        idle_bytes = sum(entry.footprint for entry in idle)
+        if used - idle_bytes + footprint > self.memory_budget and len(idle) < len(self._loaded):
+            return None
+
+        unloading = []
+        for entry in idle:
+            if used + footprint <= self.memory_budget:
+                break
+            used -= entry.footprint
+            unloading.append(self._unload(entry, "memory budget"))
+        return unloading
+
+    def _unload(self, entry: LoadedModel, reason: str) -> asyncio.Future:
+        """Forget a loaded model and stop it in the background."""
+        name = entry.model.model_name
+        if self._loaded.get(name) is entry:
+            del self._loaded[name]
+        elif entry in self._draining:
+            self._draining.remove(entry)
+        self.unloads += 1
+        logger.info(f"Unloading model {name} ({reason})")
+
+        async def stop():
+            try:
+                await entry.model.unload()
+            except Exception as e:
+                logger.error(f"Error unloading model {name}: {e}")
+            finally:
+                self._freed.set()
+
+        return asyncio.ensure_future(stop())
+
+    def _release(self, entry: LoadedModel, keep_alive: Optional[float]):
+        entry.active -= 1
+        entry.last_used = time.time()
+        if entry.active == 0:
+            entry.expires_at = None if keep_alive is None else entry.last_used + keep_alive
+            if entry in self._draining:
+                self._unload(entry, "retired")
+            elif keep_alive == 0 or entry.unload_when_idle:
+                self._unload(entry, "keep_alive 0" if keep_alive == 0 else "requested")
+        self._freed.set()
+
+    def _draining_entry(self, model) -> LoadedModel:
+        """The entry of a retired model version, loading it again if it is gone."""
+        for entry in self._draining:
+            if entry.model is model:
+                return entry
+        entry = LoadedModel(model, model.memory_footprint())
+        entry.load_task = asyncio.ensure_future(self._load(entry, []))
+        self._draining.append(entry)
+        return entry
+
+    def retire(self, model, replacement=None):
+        """Stop routing requests to a model version that a reload replaced or removed.
+
+        Requests already holding it finish first; it is unloaded once idle.
+        ``replacement`` is the new version when it was loaded ahead of the
+        swap, and takes over the old version's place and keep_alive.
+        """
+        name = model.model_name
+        entry = self._loaded.get(name)
+        if entry is None or entry.model is not model:
+            return
+        del self._loaded[name]
+
+        if replacement is not None:
+            loaded = LoadedModel(replacement, replacement.memory_footprint())
+            loaded.load_task = asyncio.get_running_loop().create_future()
+            loaded.load_task.set_result(None)
+            loaded.expires_at = entry.expires_at
+            self._loaded[name] = loaded
+            self.loads += 1
+
+        if entry.active:
+            logger.info(f"Draining {entry.active} request(s) on the previous version of {name}")
+            self._draining.append(entry)
+        else:
+            self._unload(entry, "retired")
+
+    async def unload(self, model_name: str) -> bool:
+        """Unload a model now if it is loaded and idle; returns whether it was."""
+        entry = self._loaded.get(model_name)
+        if entry is None:
+            return False
+        if entry.active:
+            # Unload as soon as the in-flight requests finish
+            entry.unload_when_idle = True
+            return False
+        await self._unload(entry, "requested")
+        return True
+
+    def _ensure_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.ensure_future(self._reap())
+
+    async def _reap(self):
+        """Periodically unload models whose keep_alive has expired."""
+        while True:
+            await asyncio.sleep(self.check_interval)
+            now = time.time()
+            for entry in list(self._loaded.values()):
+                if entry.active == 0 and entry.expires_at is not None and entry.expires_at <= now:
+                    self._unload(entry, "keep_alive expired")
+
+    async def shutdown(self):
+        """Stop the reaper and unload every model."""
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        entries = list(self._loaded.values()) + self._draining
+        unloading = [self._unload(entry, "shutdown") for entry in entries]
+        if unloading:
+            await asyncio.gather(*unloading)
+
+    def ps(self) -> List[Dict[str, Any]]:
+        """Describe the loaded models, most recently used first."""
+        models = []
+        for name, entry in reversed(self._loaded.items()):
+            models.append({
+                "name": name,
+                "model": name,
+                "size": entry.footprint,
+                "expires_at": (
+                    datetime.fromtimestamp(entry.expires_at).isoformat()
+                    if entry.expires_at is not None else None
+                ),
+                "loaded_at": datetime.fromtimestamp(entry.loaded_at).isoformat(),
+                "last_used": datetime.fromtimestamp(entry.last_used).isoformat(),
+                "active_requests": entry.active,
+                "loading": not entry.load_task.done(),
+            })
+        return models
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "loaded": len(self._loaded),
+            "draining": len(self._draining),
+            "used_bytes": self.used_memory,
+            "budget_bytes": self.memory_budget,
+            "loads": self.loads,
+            "unloads": self.unloads,
+        }
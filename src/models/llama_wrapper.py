@@ -1,229 +1,434 @@
 import asyncio
+import hashlib
+import json
 import os
-import time
-from typing import Dict, Any, Optional, List
-from ..utils.logging import logger
 from datetime import datetime
+from typing import Dict, Any, Optional, List, FrozenSet, Tuple
+from ..utils.logging import logger
+from .backends.base import BackendCapabilityError
+from .backends.cli import CliBackend
+from .backends.server import ServerBackend
+from .backends.llama_python import LlamaPythonBackend
+from .backends.remote import RemoteBackend
+from .streaming import coalesce_chunks
+from .sessions import Session
+from .output_filter import OutputFilter, DEFAULT_ARTIFACTS
+from .chat_template import load_chat_template
+from .gguf import describe_gguf, GGUFFormatError
+from .tokenizer import GGUFTokenizer, UnsupportedTokenizerError, load_tokenizer
+from .model_index import ModelIndex, default_index_path
+from .timings import GenerationStats
+
+
+# llama.cpp's default context size, used when a model does not set num_ctx
+DEFAULT_CONTEXT_SIZE = 4096
+
+# Ollama option names and the parameter names used internally for them
+OPTION_ALIASES = {
+    "num_predict": "max_tokens",
+}
+
+# Engines a model can run on, selected with the "backend" key in models.yaml
+BACKENDS = {
+    "cli": CliBackend,
+    "server": ServerBackend,
+    "python": LlamaPythonBackend,
+    "remote": RemoteBackend,
+}
 
 
 class LlamaCppModel:
-    """Wrapper for llama.cpp CLI integration."""
+    """Wrapper for a llama.cpp model running on a pluggable backend."""
     
-    def __init__(self, model_config: Dict[str, Any]):
+    def __init__(
+        self,
+        model_config: Dict[str, Any],
+        metadata: Optional[Dict[str, Any]] = None,
+        model_name: Optional[str] = None
+    ):
         self.model_config = model_config
-        self.model_path = model_config["path"]
-        self.model_name = model_config["name"]
+        # Remote models run elsewhere and need no local file
+        self.model_path = model_config.get("path", "")
+        # The key under "models" in the configuration: what clients request, and
+        # what the registry, scheduler, lifecycle and per-model settings go by
+        self.model_name = model_name or model_config["name"]
         self.default_params = model_config.get("parameters", {})
+        self.backend_name = model_config.get("backend", "cli")
+        self.context_size = int(self.default_params.get("num_ctx", DEFAULT_CONTEXT_SIZE))
+        self.created_at = datetime.now().isoformat()
         
         # Validate model path
-        if not os.path.exists(self.model_path):
+        if (self.model_path or self.backend_name != "remote") and not os.path.exists(self.model_path):
             raise FileNotFoundError(f"Model file not found: {self.model_path}")
-    
-    def _map_parameters(self, options: Optional[Dict[str, Any]] = None) -> List[str]:
-        """Map Ollama parameters to llama.cpp CLI arguments."""
-        if options is None:
-            options = {}
         
-        # Merge with default parameters
-        params = {**self.default_params, **options}
+        # Small model of the same family that drafts tokens for speculative decoding
+        self.draft_model_path = model_config.get("draft_model")
+        if self.draft_model_path and not os.path.exists(self.draft_model_path):
+            raise FileNotFoundError(f"Draft model file not found: {self.draft_model_path}")
         
-        cmd_args = []
+        # GGUF header summary (architecture, context length, template, ...)
+        if metadata is None:
+            metadata = self._read_metadata() if self.model_path else {}
+        self.metadata = metadata
         
-        # Parameter mapping
-        if "temperature" in params:
-            cmd_args.extend(["--temp", str(params["temperature"])])
+        # Chat template, resolved and compiled once per model
+        self.chat_template = load_chat_template(
+            self.model_name,
+            model_config.get("chat_template"),
+            self.metadata.get("chat_template"),
+            self.metadata.get("eos_token", ""),
+        )
         
-        if "top_p" in params:
-            cmd_args.extend(["--top-p", str(params["top_p"])])
+        # Special tokens stripped from the output, and tokens that end it
+        self.special_tokens = DEFAULT_ARTIFACTS + model_config.get("special_tokens", [])
+        self.stop_tokens = list(model_config.get("stop", []))
+        for token in self.chat_template.stop:
+            if token not in self.stop_tokens:
+                self.stop_tokens.append(token)
         
-        if "max_tokens" in params:
-            cmd_args.extend(["--n-predict", str(params["max_tokens"])])
+        # Optional coalescing of streamed chunks (0 disables, sending each chunk as it arrives)
+        self.stream_flush_ms = float(model_config.get("stream_flush_ms", 0))
+        self.stream_flush_bytes = int(model_config.get("stream_flush_bytes", 0))
         
-        if "top_k" in params:
-            cmd_args.extend(["--top-k", str(params["top_k"])])
+        if self.backend_name not in BACKENDS:
+            raise ValueError(f"Unknown backend '{self.backend_name}' for model {self.model_name}")
+        self.backend = BACKENDS[self.backend_name](self)
         
-        if "repeat_penalty" in params:
-            cmd_args.extend(["--repeat-penalty", str(params["repeat_penalty"])])
-        
-        return cmd_args
+        # In-process tokenizer from the GGUF vocabulary, read on first use (False if unusable)
+        self._tokenizer = None
     
-    async def generate(self, prompt: str, options: Optional[Dict[str, Any]] = None) -> str:
-        """Generate response using llama.cpp CLI."""
-        start_time = time.time()
-        
-        # Build command
-        cmd = ["llama-cli", "-m", self.model_path]
-        cmd.extend(self._map_parameters(options))
+    def _read_metadata(self) -> Dict[str, Any]:
+        """Summarize the GGUF header of the model file."""
+        try:
+            return describe_gguf(self.model_path)
+        except (OSError, GGUFFormatError) as e:
+            logger.warning(f"Cannot read GGUF metadata for {self.model_name}: {e}")
+            return {}
+    
+    def memory_footprint(self) -> int:
+        """Estimated resident memory: weights plus a KV cache per instance."""
+        if "memory_mb" in self.model_config:
+            return int(float(self.model_config["memory_mb"]) * 1024 * 1024)
         
-        logger.info(f"Executing llama.cpp command: {' '.join(cmd)}")
+        if not self.backend.instances:
+            # Nothing is held in this process, e.g. the model runs on remote nodes
+            return 0
         
         try:
-            # Create subprocess
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Send prompt and get response
-            stdout, stderr = await process.communicate(input=prompt.encode())
-            
-            if process.returncode != 0:
-                error_msg = stderr.decode().strip()
-                logger.error(f"llama.cpp error: {error_msg}")
-                raise RuntimeError(f"llama.cpp failed: {error_msg}")
-            
-            raw_response = stdout.decode().strip()
-            duration = time.time() - start_time
-            
-            # Clean up the response by removing the prompt and artifacts
-            cleaned_response = self._clean_response(raw_response, prompt)
-            
-            logger.info(f"Generated response in {duration:.2f}s")
-            return cleaned_response
-            
-        except Exception as e:
-            logger.error(f"Error generating response: {e}")
-            raise
-    
-    def _clean_response(self, raw_response: str, prompt: str) -> str:
-        """Clean up the response by removing prompt and artifacts."""
-        # Remove the original prompt from the response
-        if prompt in raw_response:
-            response = raw_response.replace(prompt, "").strip()
-        else:
-            response = raw_response
-        
-        # Remove common artifacts
-        artifacts_to_remove = [
-            "EOF by user",
-            "User:",
-            "Assistant:",
-            ">",
-            "<|endoftext|>",
-            "<|im_end|>",
-            "<|im_start|>"
-        ]
-        
-        for artifact in artifacts_to_remove:
-            response = response.replace(artifact, "")
-        
-        # Clean up extra whitespace and newlines
-        response = response.strip()
-        
-        # Remove leading/trailing quotes if present
-        if response.startswith('"') and response.endswith('"'):
-            response = response[1:-1]
-        elif response.startswith("'") and response.endswith("'"):
-            response = response[1:-1]
-        
-        return response.strip()
-    
-    async def generate_stream(self, prompt: str, options: Optional[Dict[str, Any]] = None):
-        """Generate streaming response using llama.cpp CLI."""
-        start_time = time.time()
-        
-        # Build command
-        cmd = ["llama-cli", "-m", self.model_path]
-        cmd.extend(self._map_parameters(options))
-        
-        logger.info(f"Executing streaming llama.cpp command: {' '.join(cmd)}")
+            weights = os.path.getsize(self.model_path)
+            if self.draft_model_path:
+                weights += os.path.getsize(self.draft_model_path)
+        except OSError:
+            weights = 0
+        return weights + self._kv_cache_bytes() * self.backend.instances
+    
+    def _kv_cache_bytes(self) -> int:
+        """Size of an f16 KV cache for the configured context length."""
+        layers = self.metadata.get("block_count")
+        width = self.metadata.get("embedding_length")
+        heads = self.metadata.get("head_count")
+        if not (layers and width and heads):
+            return 0
+        kv_heads = self.metadata.get("head_count_kv") or heads
+        # K and V, 2 bytes each, per layer and context position; GQA shrinks the width
+        return 2 * 2 * layers * self.context_size * width * kv_heads // heads
+    
+    @property
+    def capabilities(self) -> FrozenSet[str]:
+        """Operations the model's backend supports (generate, stream, tokenize, embed)."""
+        return self.backend.capabilities
+    
+    async def load(self):
+        """Make the model resident (starts workers or loads the in-process engine)."""
+        await self.backend.load()
+    
+    async def unload(self):
+        """Release the model's resident resources."""
+        await self.backend.unload()
+    
+    def render_chat(self, messages: List[Dict[str, str]]) -> str:
+        """Render chat messages with the model's chat template."""
+        return self.chat_template.render(messages)
+    
+    def merged_parameters(self, options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Return model defaults overridden by request options.
         
+        Ollama names (``num_predict``) are translated to the internal ones
+        (``max_tokens``), so either spelling works in both places.
+        """
+        merged = {}
+        for layer in (self.default_params, options or {}):
+            for name, value in layer.items():
+                merged[OPTION_ALIASES.get(name, name)] = value
+        return merged
+    
+    def stop_sequences(self, options: Optional[Dict[str, Any]] = None) -> List[str]:
+        """The model's stop tokens plus the request's ``stop`` option (a string or list)."""
+        requested = self.merged_parameters(options).get("stop") or []
+        if isinstance(requested, str):
+            requested = [requested]
+        elif not isinstance(requested, list):
+            raise ValueError("The stop option must be a string or a list of strings")
+        stop = list(self.stop_tokens)
+        for sequence in requested:
+            if sequence and sequence not in stop:
+                stop.append(str(sequence))
+        return stop
+    
+    def is_deterministic(self, options: Optional[Dict[str, Any]] = None) -> bool:
+        """Whether sampling is reproducible (greedy or a fixed seed).
+        
+        Raises ValueError if temperature or seed is not a number.
+        """
+        params = self.merged_parameters(options)
+        temperature = params.get("temperature")
+        if temperature is not None:
+            try:
+                if float(temperature) == 0:
+                    return True
+            except (TypeError, ValueError):
+                raise ValueError(f"Option 'temperature' must be a number, got {temperature!r}")
+        seed = params.get("seed")
+        if seed is None:
+            return False
         try:
-            # Create subprocess
-            process = await asyncio.create_subprocess_exec(
-                *cmd,
-                stdin=asyncio.subprocess.PIPE,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
-            )
-            
-            # Send prompt
-            process.stdin.write(prompt.encode())
-            await process.stdin.drain()
-            process.stdin.close()
-            
-            # Stream response
-            response_chunks = []
-            full_response = ""
-            while True:
-                chunk = await process.stdout.readline()
-                if not chunk:
-                    break
-                
-                chunk_text = chunk.decode().strip()
-                if chunk_text:
-                    # Clean up the chunk
-                    cleaned_chunk = self._clean_streaming_chunk(chunk_text, prompt, full_response)
-                    if cleaned_chunk:
-                        response_chunks.append(cleaned_chunk)
-                        full_response += cleaned_chunk
-                        yield cleaned_chunk
-            
-            # Wait for process to complete
-            await process.wait()
-            
-            if process.returncode != 0:
-                stderr = await process.stderr.read()
-                error_msg = stderr.decode().strip()
-                logger.error(f"llama.cpp streaming error: {error_msg}")
-                raise RuntimeError(f"llama.cpp streaming failed: {error_msg}")
-            
-            duration = time.time() - start_time
-            logger.info(f"Generated streaming response in {duration:.2f}s")
-            
-        except Exception as e:
-            logger.error(f"Error generating streaming response: {e}")
-            raise
-    
-    def _clean_streaming_chunk(self, chunk: str, prompt: str, full_response: str) -> str:
-        """Clean up a streaming chunk."""
-        # Remove artifacts from the chunk
-        artifacts_to_remove = [
-            "EOF by user",
-            "User:",
-            "Assistant:",
-            ">",
-            "<|endoftext|>",
-            "<|im_end|>",
-            "<|im_start|>"
-        ]
-        
-        cleaned_chunk = chunk
-        for artifact in artifacts_to_remove:
-            cleaned_chunk = cleaned_chunk.replace(artifact, "")
-        
-        # If this is the first chunk and it contains the prompt, remove it
-        if not full_response and prompt in cleaned_chunk:
-            cleaned_chunk = cleaned_chunk.replace(prompt, "")
-        
-        return cleaned_chunk.strip()
+            return int(seed) >= 0
+        except (TypeError, ValueError):
+            raise ValueError(f"Option 'seed' must be an integer, got {seed!r}")
+    
+    async def generate(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        session: Optional[Session] = None,
+        stats: Optional[GenerationStats] = None
+    ) -> str:
+        """Generate response using the model's backend.
+        
+        When ``stats`` is given it is filled with llama.cpp's timing breakdown.
+        """
+        if stats is None:
+            stats = GenerationStats()
+        return await self.backend.generate(prompt, options, session, stats)
+    
+    def make_filter(
+        self,
+        prompt: Optional[str] = None,
+        options: Optional[Dict[str, Any]] = None
+    ) -> OutputFilter:
+        """Create an output filter for this model's artifacts and a request's stop sequences."""
+        return OutputFilter(self.special_tokens, self.stop_sequences(options), prompt)
+    
+    async def generate_stream(
+        self,
+        prompt: str,
+        options: Optional[Dict[str, Any]] = None,
+        session: Optional[Session] = None,
+        stats: Optional[GenerationStats] = None
+    ):
+        """Generate streaming response using the model's backend.
+        
+        When ``stats`` is given it is filled with llama.cpp's timing breakdown
+        once the stream ends.
+        """
+        if stats is None:
+            stats = GenerationStats()
+        chunks = self.backend.generate_stream(prompt, options, session, stats)
+        async for chunk in coalesce_chunks(chunks, self.stream_flush_ms / 1000, self.stream_flush_bytes):
+            yield chunk
+    
+    async def get_tokenizer(self) -> Optional[GGUFTokenizer]:
+        """The model's vocabulary tokenizer, or None if the GGUF file has no usable one."""
+        if self._tokenizer is None:
+            if not self.model_path:
+                self._tokenizer = False
+            else:
+                try:
+                    # Reading a 100k+ entry vocabulary takes a moment; keep it off the event loop
+                    self._tokenizer = await asyncio.to_thread(load_tokenizer, self.model_path)
+                except (OSError, GGUFFormatError, UnsupportedTokenizerError) as e:
+                    logger.warning(f"No in-process tokenizer for {self.model_name}: {e}")
+                    self._tokenizer = False
+        return self._tokenizer or None
+    
+    async def tokenize(self, text: str) -> List[int]:
+        """Token ids for text, without BOS.
+        
+        Uses the in-process tokenizer when the vocabulary allows, otherwise
+        asks the backend (llama-tokenize, a worker or the bindings).
+        """
+        tokenizer = await self.get_tokenizer()
+        if tokenizer is not None:
+            return await asyncio.to_thread(tokenizer.encode, text)
+        return await self.backend.tokenize(text)
+    
+    async def detokenize(self, tokens: List[int]) -> str:
+        """Text for token ids."""
+        tokenizer = await self.get_tokenizer()
+        if tokenizer is None:
+            raise BackendCapabilityError(f"Model {self.model_name} has no GGUF vocabulary to detokenize with")
+        return tokenizer.decode(tokens)
+    
+    async def embed(self, texts: List[str]) -> List[List[float]]:
+        """One embedding vector per input text."""
+        return await self.backend.embed(texts)
 
 
 class ModelRegistry:
-    """Registry for managing available models."""
+    """Registry for managing available models.
+    
+    Models are built from the configuration on first use. ``reload`` applies
+    a changed configuration by swapping in the new model set in one step, so
+    a request always finds either the old or the new version of a model.
+    """
     
     def __init__(self, config):
         self.config = config
-        self.models = {}
-        self._load_models()
+        self.models: Dict[str, LlamaCppModel] = {}
+        # Resolved configuration of every configured model, including failed ones
+        self.model_configs: Dict[str, Dict[str, Any]] = {}
+        # Why a configured model is unavailable
+        self.errors: Dict[str, str] = {}
+        self._index: Optional[ModelIndex] = None
+        self._initialized = False
+        self._reload_lock = asyncio.Lock()
+    
+    @property
+    def index(self) -> ModelIndex:
+        if self._index is None:
+            index_config = self.config.get_model_index_config()
+            self._index = ModelIndex(
+                os.path.expanduser(index_config.get("path") or default_index_path()),
+                stat_ttl=float(index_config.get("stat_ttl", 5.0)),
+                digest_workers=int(index_config.get("digest_workers", 2)),
+            )
+        return self._index
+    
+    def _ensure_models(self):
+        """Build the configured models on first use."""
+        if self._initialized:
+            return
+        configs = self._resolve_configs()
+        self.models, self.errors = self._build_models(configs)
+        self.model_configs = configs
+        self._initialized = True
     
-    def _load_models(self):
-        """Load models from configuration."""
-        for model_name, model_config in self.config.get_models().items():
+    def _resolve_configs(self) -> Dict[str, Dict[str, Any]]:
+        """Model configurations, with draft models given by name resolved to paths."""
+        models = self.config.get_models()
+        resolved = {}
+        for model_name, model_config in models.items():
+            draft = model_config.get("draft_model")
+            if draft in models:
+                # A draft may name another configured model instead of a path
+                model_config = {**model_config, "draft_model": models[draft]["path"]}
+            resolved[model_name] = model_config
+        return resolved
+    
+    def _build_models(self, configs: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, LlamaCppModel], Dict[str, str]]:
+        """Create models from their configurations; one that fails is left out."""
+        models = {}
+        errors = {}
+        for model_name, model_config in configs.items():
             try:
-                self.models[model_name] = LlamaCppModel(model_config)
-                logger.info(f"Loaded model: {model_name}")
+                models[model_name] = LlamaCppModel(
+                    model_config, self._index_metadata(model_config.get("path", "")), model_name
+                )
+                logger.info(
+                    f"Loaded model: {model_name} "
+                    f"(chat template: {models[model_name].chat_template.name})"
+                )
             except Exception as e:
+                errors[model_name] = str(e)
                 logger.error(f"Failed to load model {model_name}: {e}")
+        return models, errors
+    
+    def _index_metadata(self, path: str) -> Optional[Dict[str, Any]]:
+        """GGUF summary from the model index, or None to let the model read it."""
+        try:
+            return self.index.lookup(path)["metadata"]
+        except OSError:
+            return None
+    
+    async def reload(self, lifecycle) -> Dict[str, Any]:
+        """Re-read the configuration and apply the changes to the model set.
+        
+        Added and changed models are built off the event loop. A changed
+        model that is resident gets its new version loaded before the swap,
+        so it never goes cold; if that fails the previous version stays. The
+        versions that were replaced or removed are retired through
+        ``lifecycle`` and drain their in-flight requests. A model that fails
+        to build is disabled without affecting the others.
+        """
+        async with self._reload_lock:
+            self._ensure_models()
+            await asyncio.to_thread(self.config.reload)
+            configs = self._resolve_configs()
+            
+            # Disabled models are retried, e.g. once their file has been downloaded
+            pending = {
+                name: model_config for name, model_config in configs.items()
+                if name not in self.models or model_config != self.model_configs.get(name)
+            }
+            built, errors = await asyncio.to_thread(self._build_models, pending)
+            
+            preload = [name for name in built if name in self.models and lifecycle.is_loaded(name)]
+            results = await asyncio.gather(*(built[name].load() for name in preload), return_exceptions=True)
+            preloaded = {}
+            kept = {}
+            for name, result in zip(preload, results):
+                if isinstance(result, BaseException):
+                    logger.error(f"New version of model {name} failed to load, keeping the previous one: {result}")
+                    await built.pop(name).unload()
+                    # Retried on the next reload
+                    configs[name] = self.model_configs[name]
+                    kept[name] = str(result)
+                else:
+                    preloaded[name] = built[name]
+            
+            # Swap in the new model set; nothing below awaits
+            old_models = self.models
+            models = {}
+            for name in configs:
+                if name in built:
+                    models[name] = built[name]
+                elif name in old_models and name not in errors:
+                    models[name] = old_models[name]
+            self.models = models
+            self.model_configs = configs
+            self.errors = errors
+            
+            for name, model in old_models.items():
+                if models.get(name) is not model:
+                    lifecycle.retire(model, preloaded.get(name))
+            
+            summary = {
+                "added": [name for name in models if name not in old_models],
+                "changed": [name for name in models if name in old_models and models[name] is not old_models[name]],
+                "removed": [name for name in old_models if name not in models],
+                "errors": {**errors, **kept},
+            }
+            logger.info(
+                f"Configuration reloaded: added {summary['added']}, changed {summary['changed']}, "
+                f"removed {summary['removed']}, errors {sorted(summary['errors'])}"
+            )
+            return summary
+    
+    async def shutdown(self):
+        """Unload resident models and stop background hashing."""
+        if self._index is not None:
+            self._index.shutdown()
+        for model in self.models.values():
+            await model.unload()
     
     def get_model(self, model_name: str) -> Optional[LlamaCppModel]:
         """Get model by name."""
+        self._ensure_models()
         return self.models.get(model_name)
     
     def list_models(self) -> List[str]:
         """List available model names."""
+        self._ensure_models()
         return list(self.models.keys())
     
     def get_model_info(self, model_name: str) -> Optional[Dict[str, Any]]:
@@ -232,14 +437,41 @@ class ModelRegistry:
         if not model:
             return None
         
+        if not model.model_path:
+            return self._remote_model_info(model)
+        
         try:
-            stat = os.stat(model.model_path)
+            entry = self.index.lookup(model.model_path)
+            metadata = entry["metadata"]
             return {
                 "name": model.model_name,
-                "size": stat.st_size,
-                "modified_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
-                "path": model.model_path
+                "size": entry["size"],
+                "modified_at": entry["modified_at"],
+                "path": model.model_path,
+                "digest": entry["digest"],
+                "details": {
+                    "format": "gguf",
+                    "family": metadata.get("architecture", ""),
+                    "families": [metadata["architecture"]] if metadata.get("architecture") else [],
+                    "parameter_size": metadata.get("parameter_size", ""),
+                    "quantization_level": metadata.get("quantization_level", ""),
+                },
+                "metadata": metadata,
             }
         except Exception as e:
             logger.error(f"Error getting model info for {model_name}: {e}")
-            return None 
\ No newline at end of file
+            return None 
+    
+    def _remote_model_info(self, model: LlamaCppModel) -> Dict[str, Any]:
+        """Model information for a remote model without a local GGUF file."""
+        urls = [upstream["url"] for upstream in model.backend.pool.stats()]
+        return {
+            "name": model.model_name,
+            "size": 0,
+            # Changes whenever the model is redefined, like a file's mtime
+            "modified_at": model.created_at,
+            "path": "",
+            "digest": hashlib.sha256(json.dumps([model.model_name, urls]).encode()).hexdigest(),
+            "details": {"format": "remote", "family": "", "families": [], "parameter_size": "", "quantization_level": ""},
+            "metadata": {},
+        }
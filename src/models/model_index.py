@@ -0,0 +1,153 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, Any
+
+from ..utils.logging import logger
+from .gguf import describe_gguf, GGUFFormatError
+
+
+# Read size used while hashing; large sequential reads keep the disk streaming
+DIGEST_CHUNK_SIZE = 8 * 1024 * 1024
+
+
+def _sha256_file(path: str) -> str:
+    """Hash a file with large sequential reads into a reusable buffer."""
+    digest = hashlib.sha256()
+    buffer = bytearray(DIGEST_CHUNK_SIZE)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            read = f.readinto(buffer)
+            if not read:
+                break
+            digest.update(view[:read])
+    return digest.hexdigest()
+
+
+class ModelIndex:
+    """Cached GGUF metadata and SHA-256 digests for model files.
+
+    Entries are keyed on (path, size, mtime) and persisted to a small JSON
+    index, so neither the header nor the file contents are read again unless
+    the file changes. Digests are computed in a background thread pool;
+    until one finishes the entry reports an empty digest. ``os.stat`` results
+    are reused for ``stat_ttl`` seconds so listing models does no I/O.
+    """
+
+    def __init__(self, index_path: str, stat_ttl: float = 5.0, digest_workers: int = 2):
+        self.index_path = index_path
+        self.stat_ttl = stat_ttl
+
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        self._stats: Dict[str, Any] = {}
+        self._pending = set()
+        self._executor = ThreadPoolExecutor(max_workers=digest_workers, thread_name_prefix="digest")
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f)
+            return entries if isinstance(entries, dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable model index {self.index_path}: {e}")
+            return {}
+
+    def _save(self):
+        """Write the index atomically."""
+        with self._lock:
+            data = json.dumps(self._entries)
+        directory = os.path.dirname(self.index_path) or "."
+        try:
+            os.makedirs(directory, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(data)
+            os.replace(tmp_path, self.index_path)
+        except OSError as e:
+            logger.warning(f"Failed to write model index {self.index_path}: {e}")
+
+    def _stat(self, path: str) -> os.stat_result:
+        now = time.monotonic()
+        cached = self._stats.get(path)
+        if cached is not None and now - cached[0] < self.stat_ttl:
+            return cached[1]
+        stat = os.stat(path)
+        self._stats[path] = (now, stat)
+        return stat
+
+    def lookup(self, path: str) -> Dict[str, Any]:
+        """Return the index entry for a model file, refreshing it if the file changed.
+
+        Raises OSError if the file cannot be stat'ed.
+        """
+        stat = self._stat(path)
+        with self._lock:
+            entry = self._entries.get(path)
+        if entry is None or entry["size"] != stat.st_size or entry["mtime"] != stat.st_mtime:
+            entry = self._refresh(path, stat)
+
+        if not entry["digest"]:
+            self._schedule_digest(path, entry)
+        return entry
+
+    def _refresh(self, path: str, stat: os.stat_result) -> Dict[str, Any]:
+        try:
+            metadata = describe_gguf(path)
+        except GGUFFormatError as e:
+            logger.warning(f"Cannot read GGUF metadata from {path}: {e}")
+            metadata = {}
+
+        entry = {
+            "size": stat.st_size,
+            "mtime": stat.st_mtime,
+            "modified_at": datetime.fromtimestamp(stat.st_mtime).isoformat(),
+            "digest": "",
+            "metadata": metadata,
+        }
+        with self._lock:
+            self._entries[path] = entry
+        self._save()
+        return entry
+
+    def _schedule_digest(self, path: str, entry: Dict[str, Any]):
+        with self._lock:
+            if path in self._pending:
+                return
+            self._pending.add(path)
+        self._executor.submit(self._compute_digest, path, entry)
+
+    def _compute_digest(self, path: str, entry: Dict[str, Any]):
+        try:
+            started = time.monotonic()
+            digest = _sha256_file(path)
+            stat = os.stat(path)
+            if stat.st_size != entry["size"] or stat.st_mtime != entry["mtime"]:
+                # Changed while hashing; the next lookup starts over
+                return
+            with self._lock:
+                entry["digest"] = digest
+            logger.info(f"Computed digest for {path} in {time.monotonic() - started:.1f}s")
+            self._save()
+        except OSError as e:
+            logger.warning(f"Failed to hash {path}: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    def shutdown(self):
+        """Stop hashing; in-progress digests are abandoned."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+def default_index_path() -> str:
+    """Default location of the model index file."""
+    return os.path.join(os.path.expanduser("~"), ".cache", "llama-cpp-web", "model_index.json")
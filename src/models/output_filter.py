@@ -0,0 +1,119 @@
+import re
+from typing import Iterable, Optional
+
+
+# Console noise llama-cli mixes into generated text
+DEFAULT_ARTIFACTS = [
+    "EOF by user",
+    "<|endoftext|>",
+    "<|im_end|>",
+    "<|im_start|>",
+]
+
+
+class OutputFilter:
+    """Single-pass, chunk-boundary-safe filter for generated text.
+
+    All artifacts (removed) and stop sequences (end the output) are matched
+    by one compiled alternation. Only the longest tail that could still grow
+    into a match is held back between chunks, so an artifact split across two
+    chunks is still caught and the cost per chunk is proportional to the
+    chunk, not to the response so far.
+
+    When ``prompt`` is given, a leading echo of it is suppressed as well.
+    """
+
+    def __init__(
+        self,
+        artifacts: Iterable[str] = DEFAULT_ARTIFACTS,
+        stop: Iterable[str] = (),
+        prompt: Optional[str] = None
+    ):
+        self._stop = {s for s in stop if s}
+        patterns = {p for p in artifacts if p} | self._stop
+        # Longest first so overlapping patterns match greedily
+        ordered = sorted(patterns, key=len, reverse=True)
+        self._regex = re.compile("|".join(re.escape(p) for p in ordered)) if ordered else None
+        self._prefixes = {p[:i] for p in patterns for i in range(1, len(p))}
+        self._max_prefix = max((len(p) for p in self._prefixes), default=0)
+
+        self._echo = prompt or ""
+        self._echo_buffer = ""
+        self._echo_done = not self._echo
+        self._started = False
+        self._pending = ""
+
+        self.stopped = False
+        self.stop_sequence: Optional[str] = None
+
+    def feed(self, text: str) -> str:
+        """Filter the next chunk, returning the text that is safe to emit."""
+        if self.stopped or not text:
+            return ""
+
+        if not self._echo_done:
+            text = self._skip_echo(text)
+            if not text:
+                return ""
+
+        return self._process(self._pending + text, final=False)
+
+    def flush(self) -> str:
+        """Release any held-back text once the output has ended."""
+        if self.stopped:
+            return ""
+        if not self._echo_done:
+            # Output ended while it still matched the start of the prompt, so it was all echo
+            self._echo_done = True
+            self._echo_buffer = ""
+            return ""
+        text = self._pending
+        self._pending = ""
+        return self._process(text, final=True)
+
+    def _skip_echo(self, text: str) -> str:
+        """Consume a leading copy of the prompt, holding text until it is decided."""
+        self._echo_buffer += text
+        if len(self._echo_buffer) < len(self._echo) and self._echo.startswith(self._echo_buffer):
+            return ""
+
+        self._echo_done = True
+        if self._echo_buffer.startswith(self._echo):
+            return self._echo_buffer[len(self._echo):]
+        return self._echo_buffer
+
+    def _process(self, buffer: str, final: bool) -> str:
+        output = []
+        position = 0
+
+        if self._regex is not None:
+            for match in self._regex.finditer(buffer):
+                output.append(buffer[position:match.start()])
+                position = match.end()
+                if match.group() in self._stop:
+                    self.stopped = True
+                    self.stop_sequence = match.group()
+                    self._pending = ""
+                    return self._emit("".join(output), final=True)
+
+        tail = buffer[position:]
+        held = 0 if final else self._held_length(tail)
+        output.append(tail[:len(tail) - held])
+        self._pending = tail[len(tail) - held:]
+        return self._emit("".join(output), final)
+
+    def _held_length(self, tail: str) -> int:
+        """Length of the longest suffix of tail that may start a pattern."""
+        for length in range(min(self._max_prefix, len(tail)), 0, -1):
+            if tail[-length:] in self._prefixes:
+                return length
+        return 0
+
+    def _emit(self, text: str, final: bool) -> str:
+        if not self._started:
+            # Trim whitespace before the answer
+            text = text.lstrip()
+            if not text:
+                return ""
+            self._started = True
+        return text
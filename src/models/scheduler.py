@@ -0,0 +1,259 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, List, Callable
+
+from ..utils.logging import logger
+from .upstreams import parse_upstreams
+
+
+# Lower value is served first
+PRIORITIES = {"interactive": 0, "batch": 1}
+
+
+class SchedulerRejected(Exception):
+    """Raised when a request cannot be admitted to a model queue."""
+
+    status_code = 503
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QueueFullError(SchedulerRejected):
+    """The model's wait queue is at capacity."""
+
+    status_code = 429
+
+
+class QueueTimeoutError(SchedulerRejected):
+    """The request waited longer than the queue deadline."""
+
+    status_code = 503
+
+
+class Lease:
+    """A granted execution slot; release is idempotent."""
+
+    def __init__(self, queue: "ModelQueue", wait_time: float):
+        self.queue = queue
+        self.wait_time = wait_time
+        self.started_at = time.monotonic()
+        # Time spent loading the model after admission, if any
+        self.load_duration = 0.0
+        self._callbacks: List[Callable[[], None]] = []
+        self._released = False
+
+    def on_release(self, callback: Callable[[], None]):
+        """Run callback when the lease is released."""
+        self._callbacks.append(callback)
+
+    def release(self):
+        if self._released:
+            return
+        self._released = True
+        self.queue.release(time.monotonic() - self.started_at)
+        for callback in self._callbacks:
+            callback()
+
+
+class ModelQueue:
+    """Concurrency limit plus a bounded priority wait queue for one model."""
+
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, queue_timeout: float):
+        self.name = name
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.max_queue = max(0, int(max_queue))
+        self.queue_timeout = float(queue_timeout)
+
+        self.running = 0
+        self.waiting = 0
+        self._waiters: List[list] = []
+        self._sequence = itertools.count()
+
+        # Stats
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self._service_time = 0.0
+        self._wait_times: deque = deque(maxlen=1024)
+
+    def _retry_after(self) -> int:
+        """Estimate how long until a slot frees up, in whole seconds."""
+        service_time = self._service_time or 1.0
+        backlog = (self.waiting + 1) / self.max_concurrency
+        return max(1, math.ceil(service_time * backlog))
+
+    async def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> Lease:
+        """Wait for an execution slot, or raise SchedulerRejected."""
+        start = time.monotonic()
+
+        if self.running < self.max_concurrency and self.waiting == 0:
+            self.running += 1
+            return self._admit(start)
+
+        if self.waiting >= self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(
+                f"Queue for model '{self.name}' is full ({self.waiting} waiting)",
+                self._retry_after(),
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, [priority, next(self._sequence), future])
+        self.waiting += 1
+
+        timeout = self.queue_timeout if timeout is None else timeout
+        try:
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if not future.done():
+                future.cancel()
+                self.waiting -= 1
+                self.timed_out += 1
+                raise QueueTimeoutError(
+                    f"Timed out after {timeout:.1f}s waiting for model '{self.name}'",
+                    self._retry_after(),
+                )
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release(0.0)
+            else:
+                future.cancel()
+                self.waiting -= 1
+            raise
+
+        return self._admit(start)
+
+    def _admit(self, start: float) -> Lease:
+        wait_time = time.monotonic() - start
+        self.admitted += 1
+        self._wait_times.append(wait_time)
+        return Lease(self, wait_time)
+
+    def release(self, service_time: float):
+        """Free a slot and hand it to the highest-priority waiter."""
+        if service_time > 0:
+            # Exponentially weighted average used for Retry-After estimates
+            self._service_time = (
+                service_time if not self._service_time
+                else 0.8 * self._service_time + 0.2 * service_time
+            )
+
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Slot passes directly to the waiter; running stays the same
+                self.waiting -= 1
+                future.set_result(None)
+                return
+
+        self.running -= 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Return queue depth and wait-time statistics."""
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            "running": self.running,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "wait_p50_ms": round(percentile(0.50) * 1000, 2),
+            "wait_p99_ms": round(percentile(0.99) * 1000, 2),
+            "avg_service_ms": round(self._service_time * 1000, 2),
+        }
+
+
+class RequestScheduler:
+    """Per-model admission control in front of the model registry."""
+
+    def __init__(self, config):
+        self.config = config
+        self.queues: Dict[str, ModelQueue] = {}
+        # Global settings the current queues were built from
+        self._settings = dict(config.get_scheduler_config())
+
+    def _get_queue(self, model_name: str) -> ModelQueue:
+        queue = self.queues.get(model_name)
+        if queue is None:
+            model_config = self.config.get_model(model_name) or {}
+            settings = {**self.config.get_scheduler_config(), **model_config.get("scheduler", {})}
+            # A resident pool can usefully run one request per worker slot
+            # (llama-server decodes its parallel slots in one batch)
+            default_concurrency = model_config.get("workers", 1)
+            if model_config.get("backend") == "server":
+                default_concurrency *= model_config.get("parallel", 1)
+            elif model_config.get("backend") == "remote":
+                # One request per slot across every upstream node
+                default_concurrency = sum(entry["parallel"] for entry in parse_upstreams(model_config)) or 1
+            queue = ModelQueue(
+                model_name,
+                max_concurrency=settings.get("max_concurrency", default_concurrency),
+                max_queue=settings.get("max_queue", 16),
+                queue_timeout=settings.get("queue_timeout", 30.0),
+            )
+            self.queues[model_name] = queue
+            logger.info(
+                f"Scheduler queue for {model_name}: concurrency={queue.max_concurrency}, "
+                f"queue={queue.max_queue}, timeout={queue.queue_timeout}s"
+            )
+        return queue
+
+    def forget(self, model_name: str):
+        """Drop a model's queue so the next request builds one from current settings.
+
+        Requests already admitted or waiting keep their place in the old queue.
+        """
+        self.queues.pop(model_name, None)
+
+    def reconfigure(self) -> bool:
+        """Drop every queue if the global scheduler settings changed; returns whether they did.
+
+        Per-model settings are handled by forget(); these defaults apply to
+        every model, changed or not.
+        """
+        settings = dict(self.config.get_scheduler_config())
+        if settings == self._settings:
+            return False
+        self._settings = settings
+        self.queues.clear()
+        logger.info("Scheduler settings changed, rebuilding every model queue")
+        return True
+
+    def capacity(self, model_name: str) -> int:
+        """Number of requests a model may run at once."""
+        return self._get_queue(model_name).max_concurrency
+
+    async def acquire(self, model_name: str, priority: str = "interactive") -> Lease:
+        """Acquire a slot for a model, raising SchedulerRejected on overload."""
+        if priority not in PRIORITIES:
+            raise ValueError(f"Unknown priority '{priority}'")
+        return await self._get_queue(model_name).acquire(PRIORITIES[priority])
+
+    @asynccontextmanager
+    async def slot(self, model_name: str, priority: str = "interactive"):
+        """Hold a slot for the duration of the block."""
+        lease = await self.acquire(model_name, priority)
+        try:
+            yield lease
+        finally:
+            lease.release()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return stats for every model queue."""
+        return {name: queue.stats() for name, queue in self.queues.items()}
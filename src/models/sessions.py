@@ -0,0 +1,158 @@
+import hashlib
+import json
+import os
+import secrets
+import tempfile
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional, List, Tuple
+
+from ..utils.logging import logger
+
+
+class Session:
+    """llama.cpp prompt/KV state kept for one conversation."""
+
+    def __init__(self, session_id: Tuple[int, int], model_name: str, cache_dir: str):
+        self.id = session_id
+        self.model_name = model_name
+        # Text already evaluated in this conversation (prompt + responses)
+        self.transcript = ""
+        # CLI backend: prompt cache file reused by --prompt-cache
+        self.prompt_cache_path = os.path.join(
+            cache_dir, f"{model_name}-{session_id[0]:08x}{session_id[1]:08x}.bin"
+        )
+        # Server backend: the worker and slot holding this conversation's KV cache
+        self.worker_index: Optional[int] = None
+        self.slot: Optional[int] = None
+        # Completed turns; state is only persisted once a conversation continues
+        self.turns = 0
+        self.size = 0
+        self.last_used = time.time()
+
+    @property
+    def context(self) -> List[int]:
+        """Opaque handle returned to clients in GenerateResponse.context."""
+        return list(self.id)
+
+    def refresh_size(self):
+        """Re-read the on-disk size of the prompt cache."""
+        try:
+            self.size = os.path.getsize(self.prompt_cache_path)
+        except OSError:
+            self.size = 0
+
+    def discard(self):
+        """Delete any on-disk state."""
+        try:
+            os.unlink(self.prompt_cache_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Failed to remove prompt cache {self.prompt_cache_path}: {e}")
+
+
+class SessionStore:
+    """Tracks per-conversation llama.cpp state and evicts idle sessions.
+
+    Sessions are looked up either by the ``context`` handle a client sends
+    back (generate) or by a digest of the conversation so far (chat), and are
+    evicted when idle longer than ``idle_ttl`` or when their prompt cache
+    files exceed ``max_bytes`` in total.
+    """
+
+    def __init__(self, cache_dir: str, max_sessions: int, max_bytes: int, idle_ttl: float):
+        self.cache_dir = cache_dir
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        self.idle_ttl = idle_ttl
+
+        self._sessions: "OrderedDict[Tuple[int, int], Session]" = OrderedDict()
+        self._by_history: Dict[str, Tuple[int, int]] = {}
+
+        self.evictions = 0
+
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def history_key(model_name: str, messages: List[Dict[str, str]]) -> str:
+        """Digest identifying a chat conversation by its messages."""
+        encoded = json.dumps([model_name, messages], separators=(",", ":"))
+        return hashlib.sha256(encoded.encode()).hexdigest()
+
+    def create(self, model_name: str) -> Session:
+        """Start a new session for a model."""
+        self.evict()
+        session_id = (secrets.randbits(31), secrets.randbits(31))
+        session = Session(session_id, model_name, self.cache_dir)
+        self._sessions[session_id] = session
+        return session
+
+    def get(self, model_name: str, context: Optional[List[int]]) -> Optional[Session]:
+        """Find a session from a client-supplied context handle."""
+        if not context or len(context) != 2:
+            return None
+        return self._lookup(model_name, (context[0], context[1]))
+
+    def get_by_history(self, model_name: str, messages: List[Dict[str, str]]) -> Optional[Session]:
+        """Find the session whose conversation matches these messages."""
+        session_id = self._by_history.get(self.history_key(model_name, messages))
+        if session_id is None:
+            return None
+        return self._lookup(model_name, session_id)
+
+    def remember_history(self, session: Session, messages: List[Dict[str, str]]):
+        """Index a session by the conversation it now holds."""
+        self._by_history[self.history_key(session.model_name, messages)] = session.id
+
+    def _lookup(self, model_name: str, session_id: Tuple[int, int]) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is None or session.model_name != model_name:
+            return None
+        session.last_used = time.time()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def evict(self):
+        """Drop idle sessions, then the least recently used beyond the budgets."""
+        now = time.time()
+        for session_id, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_ttl:
+                self._remove(session_id)
+
+        total = sum(session.size for session in self._sessions.values())
+        while self._sessions and (len(self._sessions) >= self.max_sessions or total > self.max_bytes):
+            session_id, session = next(iter(self._sessions.items()))
+            total -= session.size
+            self._remove(session_id)
+
+    def _remove(self, session_id: Tuple[int, int]):
+        session = self._sessions.pop(session_id)
+        session.discard()
+        self.evictions += 1
+        for key, value in list(self._by_history.items()):
+            if value == session_id:
+                del self._by_history[key]
+
+    def discard_model(self, model_name: str):
+        """Discard the sessions of a model whose configuration changed."""
+        for session_id, session in list(self._sessions.items()):
+            if session.model_name == model_name:
+                self._remove(session_id)
+
+    def clear(self):
+        """Discard every session (used on shutdown)."""
+        for session_id in list(self._sessions):
+            self._remove(session_id)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "sessions": len(self._sessions),
+            "bytes": sum(session.size for session in self._sessions.values()),
+            "evictions": self.evictions,
+        }
+
+
+def default_session_dir() -> str:
+    """Default directory for prompt cache files."""
+    return os.path.join(tempfile.gettempdir(), "llama-cpp-web-sessions")
@@ -0,0 +1,73 @@
+import asyncio
+from typing import AsyncIterator
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterator[str],
+    flush_interval: float = 0.0,
+    flush_bytes: int = 0
+) -> AsyncIterator[str]:
+    """Merge small streamed chunks to trade per-frame overhead against latency.
+
+    Buffered text is flushed once ``flush_interval`` seconds have passed since
+    the first buffered chunk or once ``flush_bytes`` bytes are buffered,
+    whichever comes first. With both disabled every chunk is passed straight
+    through.
+    """
+    if flush_interval <= 0 and flush_bytes <= 0:
+        try:
+            async for chunk in chunks:
+                yield chunk
+        finally:
+            # Close the source right away if our consumer stopped early
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+        return
+
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer = []
+    buffered_bytes = 0
+    deadline = None
+    pending = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if pending in done:
+                task, pending = pending, None
+                try:
+                    chunk = task.result()
+                except StopAsyncIteration:
+                    break
+
+                buffer.append(chunk)
+                buffered_bytes += len(chunk.encode())
+                if deadline is None and flush_interval > 0:
+                    deadline = loop.time() + flush_interval
+                if not (flush_bytes and buffered_bytes >= flush_bytes):
+                    continue
+
+            # Flush on size or on the window expiring; the next read may still be in flight
+            if buffer:
+                yield "".join(buffer)
+            buffer = []
+            buffered_bytes = 0
+            deadline = None
+    finally:
+        if pending is not None:
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, Exception):
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+
+    if buffer:
+        yield "".join(buffer)
@@ -0,0 +1,162 @@
+import re
+import time
+from typing import Dict, Any, Optional
+
+
+# llama.cpp perf summary lines, e.g.
+#   llama_perf_context_print: prompt eval time =  45.67 ms /  12 tokens (...)
+#   llama_print_timings:        eval time = 890.12 ms /  49 runs   (...)
+_PERF_LINE = re.compile(
+    r"^(?:llama_perf_context_print|llama_print_timings):\s*"
+    r"(load|prompt eval|eval) time =\s*([\d.]+) ms(?: /\s*(\d+) (?:tokens|runs))?",
+    re.MULTILINE,
+)
+
+# llama-speculative summary, e.g.
+#   encoded   12 tokens in    0.123 seconds, speed:   97.561 t/s
+#   decoded  128 tokens in    2.345 seconds, speed:   54.585 t/s
+#   n_drafted = 136
+#   n_accept  = 110
+_SPECULATIVE_LINE = re.compile(r"^(encoded|decoded)\s+(\d+) tokens in\s+([\d.]+) seconds", re.MULTILINE)
+_DRAFT_COUNT = re.compile(r"^n_(drafted|accept)\s*=\s*(\d+)", re.MULTILINE)
+
+
+class GenerationStats:
+    """Timing breakdown of one generation, filled in by the model wrapper.
+
+    Durations are in seconds. Counts and eval/prompt-eval times come from
+    llama.cpp's own perf output (llama-cli stderr or llama-server
+    ``timings``); they stay 0 when llama.cpp did not report them, e.g.
+    when llama-cli was terminated on a stop sequence.
+    """
+
+    def __init__(self):
+        self.spawn_duration: Optional[float] = None
+        self.load_duration = 0.0
+        self.prompt_eval_count = 0
+        self.prompt_eval_duration = 0.0
+        self.eval_count = 0
+        self.eval_duration = 0.0
+        # Speculative decoding: tokens proposed by the draft model and accepted
+        self.draft_count = 0
+        self.draft_accepted = 0
+        # Wall-clock time the first token was produced
+        self.first_token_at: Optional[float] = None
+        # "stop" (end of turn or a stop sequence) or "length" (ran out of
+        # max_tokens); None when the backend could not tell
+        self.done_reason: Optional[str] = None
+
+    def mark_first_token(self):
+        if self.first_token_at is None:
+            self.first_token_at = time.time()
+
+    def estimate_first_token(self, started_at: float):
+        """Derive first-token time for non-streamed output from the perf numbers."""
+        if self.first_token_at is None:
+            self.first_token_at = started_at + self.load_duration + self.prompt_eval_duration
+
+    def parse_llama_output(self, text: str):
+        """Read the perf summary llama-cli prints to stderr."""
+        for phase, milliseconds, count in _PERF_LINE.findall(text):
+            seconds = float(milliseconds) / 1000
+            if phase == "load":
+                self.load_duration = seconds
+            elif phase == "prompt eval":
+                self.prompt_eval_duration = seconds
+                self.prompt_eval_count = int(count or 0)
+            else:
+                self.eval_duration = seconds
+                self.eval_count = int(count or 0)
+
+        # llama-speculative prints the draft and target perf blocks, whose eval
+        # "runs" are decode batches rather than tokens; its own summary is exact
+        for phase, count, seconds in _SPECULATIVE_LINE.findall(text):
+            if phase == "encoded":
+                self.prompt_eval_count = int(count)
+                self.prompt_eval_duration = float(seconds)
+            else:
+                self.eval_count = int(count)
+                self.eval_duration = float(seconds)
+        for name, count in _DRAFT_COUNT.findall(text):
+            if name == "drafted":
+                self.draft_count = int(count)
+            else:
+                self.draft_accepted = int(count)
+
+    def update_from_server(self, timings: Optional[Dict[str, Any]]):
+        """Read the ``timings`` object of a llama-server completion."""
+        if not timings:
+            return
+        self.prompt_eval_count = int(timings.get("prompt_n", 0))
+        self.prompt_eval_duration = float(timings.get("prompt_ms", 0.0)) / 1000
+        self.eval_count = int(timings.get("predicted_n", 0))
+        self.eval_duration = float(timings.get("predicted_ms", 0.0)) / 1000
+        self.draft_count = int(timings.get("draft_n", 0))
+        self.draft_accepted = int(timings.get("draft_n_accepted", 0))
+
+    def update_stop_from_server(self, result: Dict[str, Any]):
+        """Read why a llama-server completion ended from its final response or event."""
+        if result.get("stopped_limit") or result.get("stop_type") == "limit":
+            self.done_reason = "length"
+        else:
+            self.done_reason = "stop"
+
+    def update_from_ollama(self, response: Optional[Dict[str, Any]]):
+        """Read the timing fields (in nanoseconds) of a final Ollama API response."""
+        if not response:
+            return
+        self.load_duration = int(response.get("load_duration", 0)) / 1_000_000_000
+        self.prompt_eval_count = int(response.get("prompt_eval_count", 0))
+        self.prompt_eval_duration = int(response.get("prompt_eval_duration", 0)) / 1_000_000_000
+        self.eval_count = int(response.get("eval_count", 0))
+        self.eval_duration = int(response.get("eval_duration", 0)) / 1_000_000_000
+        self.draft_count = int(response.get("draft_count", 0))
+        self.draft_accepted = int(response.get("draft_accepted_count", 0))
+        self.done_reason = response.get("done_reason", self.done_reason)
+
+    @property
+    def tokens_per_second(self) -> Optional[float]:
+        if not self.eval_count or not self.eval_duration:
+            return None
+        return self.eval_count / self.eval_duration
+
+    @property
+    def draft_acceptance_rate(self) -> Optional[float]:
+        """Share of drafted tokens the target model accepted."""
+        if not self.draft_count:
+            return None
+        return self.draft_accepted / self.draft_count
+
+    @property
+    def draft_speedup(self) -> Optional[float]:
+        """Tokens produced per target-model decode step (1.0 without a draft).
+
+        Each verification step yields the accepted draft tokens plus one
+        token from the target model, so this is the ideal speedup before
+        the draft model's own cost.
+        """
+        if not self.draft_count or self.eval_count <= self.draft_accepted:
+            return None
+        return self.eval_count / (self.eval_count - self.draft_accepted)
+
+    def response_fields(self, extra_load: float = 0.0) -> Dict[str, Any]:
+        """Ollama response timing fields, in nanoseconds.
+
+        ``extra_load`` adds time spent loading the model outside llama.cpp's
+        own accounting (e.g. starting resident workers). Speculative decoding
+        adds the draft counts, acceptance rate and estimated speedup.
+        """
+        fields = {
+            "load_duration": int((self.load_duration + extra_load) * 1_000_000_000),
+            "prompt_eval_count": self.prompt_eval_count,
+            "prompt_eval_duration": int(self.prompt_eval_duration * 1_000_000_000),
+            "eval_count": self.eval_count,
+            "eval_duration": int(self.eval_duration * 1_000_000_000),
+        }
+        if self.draft_count:
+            fields["draft_count"] = self.draft_count
+            fields["draft_accepted_count"] = self.draft_accepted
+            fields["draft_acceptance_rate"] = round(self.draft_acceptance_rate, 4)
+            if self.draft_speedup is not None:
+                fields["draft_speedup"] = round(self.draft_speedup, 3)
+        return fields
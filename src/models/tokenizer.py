@@ -0,0 +1,380 @@
+import heapq
+import os
+import re
+import threading
+from typing import Dict, Any, Optional, List, Tuple
+
+from .gguf import GGUFReader, GGUFArray
+
+try:
+    import regex
+except ImportError:
+    regex = None
+
+
+# tokenizer.ggml.model values we can tokenize with
+SPM = "llama"   # SentencePiece BPE with scores and byte fallback (Llama 2, Mistral, Phi-3, Gemma)
+BPE = "gpt2"    # byte-level BPE with merges (Llama 3, Qwen, GPT-2 style)
+
+# tokenizer.ggml.token_type values
+TOKEN_NORMAL = 1
+TOKEN_UNKNOWN = 2
+TOKEN_CONTROL = 3
+TOKEN_USER_DEFINED = 4
+TOKEN_UNUSED = 5
+TOKEN_BYTE = 6
+
+# Words whose BPE result is remembered; prompts repeat most of their words
+WORD_CACHE_SIZE = 65536
+
+# Pre-tokenizer split patterns (regex module syntax) by tokenizer.ggml.pre
+_GPT2_PATTERN = r"'s|'t|'re|'ve|'m|'ll|'d| ?\p{L}+| ?\p{N}+| ?[^\s\p{L}\p{N}]+|\s+(?!\S)|\s+"
+_LLAMA3_PATTERN = (
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}"
+    r"| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"
+)
+_QWEN2_PATTERN = (
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}"
+    r"| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"
+)
+PRE_TOKENIZERS = {
+    "llama3": _LLAMA3_PATTERN,
+    "llama-bpe": _LLAMA3_PATTERN,
+    "smaug-bpe": _LLAMA3_PATTERN,
+    "dbrx": _LLAMA3_PATTERN,
+    "qwen2": _QWEN2_PATTERN,
+    "deepseek-r1-qwen": _QWEN2_PATTERN,
+}
+
+# Pre-tokenizers whose vocabulary entries win over merges (Hugging Face ignore_merges)
+_IGNORE_MERGES = {"llama3", "llama-bpe", "smaug-bpe", "dbrx"}
+
+
+class UnsupportedTokenizerError(ValueError):
+    """Raised for GGUF vocabularies this tokenizer cannot reproduce."""
+
+
+def _compile_pattern(pattern: str):
+    """Compile a pre-tokenizer pattern, approximating Unicode classes without ``regex``."""
+    if regex is not None:
+        return regex.compile(pattern)
+    for unicode_class, approximation in (
+        (r"[^\r\n\p{L}\p{N}]", r"(?:[^\r\n\w]|_)"),
+        (r"[^\s\p{L}\p{N}]", r"(?:[^\s\w]|_)"),
+        (r"\p{L}", r"[^\W\d_]"),
+        (r"\p{N}", r"\d"),
+    ):
+        pattern = pattern.replace(unicode_class, approximation)
+    return re.compile(pattern)
+
+
+def _bytes_to_unicode() -> Dict[int, str]:
+    """GPT-2's reversible mapping of bytes to printable characters."""
+    printable = (
+        list(range(ord("!"), ord("~") + 1))
+        + list(range(ord("¡"), ord("¬") + 1))
+        + list(range(ord("®"), ord("ÿ") + 1))
+    )
+    chars = printable[:]
+    extra = 0
+    for byte in range(256):
+        if byte not in printable:
+            printable.append(byte)
+            chars.append(256 + extra)
+            extra += 1
+    return dict(zip(printable, map(chr, chars)))
+
+
+_BYTE_ENCODER = _bytes_to_unicode()
+_BYTE_DECODER = {char: byte for byte, char in _BYTE_ENCODER.items()}
+
+
+class GGUFTokenizer:
+    """Tokenizes text in-process with the vocabulary stored in a GGUF file.
+
+    Follows llama.cpp's tokenizers for SentencePiece ("llama") and
+    byte-level BPE ("gpt2") vocabularies, including special-token parsing,
+    so counts match what the model will see. Without the ``regex`` package
+    the BPE pre-tokenizer approximates Unicode letter and number classes.
+    """
+
+    def __init__(
+        self,
+        kind: str,
+        tokens: List[str],
+        token_types: List[int],
+        scores: List[float],
+        merges: List[str],
+        bos_id: Optional[int] = None,
+        eos_id: Optional[int] = None,
+        unk_id: Optional[int] = None,
+        add_bos: bool = True,
+        add_space_prefix: bool = True,
+        pre: str = "default",
+        fingerprint: str = "",
+    ):
+        if kind not in (SPM, BPE):
+            raise UnsupportedTokenizerError(f"Unsupported tokenizer model '{kind}'")
+        self.kind = kind
+        self.tokens = tokens
+        self.token_types = token_types or [TOKEN_NORMAL] * len(tokens)
+        self.scores = scores or [0.0] * len(tokens)
+        self.bos_id = bos_id
+        self.eos_id = eos_id
+        self.unk_id = unk_id
+        self.add_bos = add_bos
+        self.add_space_prefix = add_space_prefix
+        # Identifies the vocabulary for caches keyed on token counts
+        self.fingerprint = fingerprint
+
+        self.ids: Dict[str, int] = {}
+        for token_id, text in enumerate(tokens):
+            self.ids.setdefault(text, token_id)
+
+        self.byte_ids: Dict[int, int] = {}
+        for token_id, token_type in enumerate(self.token_types):
+            text = tokens[token_id]
+            if token_type == TOKEN_BYTE and len(text) == 6 and text.startswith("<0x"):
+                self.byte_ids[int(text[3:5], 16)] = token_id
+
+        # Control and user-defined tokens are matched literally in the text
+        specials = sorted(
+            (text for text, token_id in self.ids.items()
+             if text and self.token_types[token_id] in (TOKEN_CONTROL, TOKEN_USER_DEFINED)),
+            key=len, reverse=True,
+        )
+        self._special_pattern = re.compile("|".join(map(re.escape, specials))) if specials else None
+
+        self.merge_ranks: Dict[Tuple[str, str], int] = {}
+        for rank, merge in enumerate(merges):
+            left, _, right = merge.partition(" ")
+            self.merge_ranks.setdefault((left, right), rank)
+        self.ignore_merges = pre in _IGNORE_MERGES
+        self._pre_pattern = _compile_pattern(PRE_TOKENIZERS.get(pre, _GPT2_PATTERN)) if kind == BPE else None
+        self._word_cache: Dict[str, List[int]] = {}
+
+    @property
+    def vocab_size(self) -> int:
+        return len(self.tokens)
+
+    def _split_special(self, text: str):
+        """Yield (text, None) for plain fragments and (text, id) for special tokens."""
+        if self._special_pattern is None:
+            yield text, None
+            return
+        position = 0
+        for match in self._special_pattern.finditer(text):
+            if match.start() > position:
+                yield text[position:match.start()], None
+            yield match.group(), self.ids[match.group()]
+            position = match.end()
+        if position < len(text):
+            yield text[position:], None
+
+    def encode(self, text: str, add_bos: bool = False) -> List[int]:
+        """Token ids for text; BOS is only added when asked and the vocabulary uses it."""
+        ids = []
+        if add_bos and self.add_bos and self.bos_id is not None:
+            ids.append(self.bos_id)
+
+        # Like llama.cpp, text at the start or after a special token gets a space prefix
+        previous_special = True
+        for fragment, token_id in self._split_special(text):
+            if token_id is not None:
+                ids.append(token_id)
+                previous_special = True
+                continue
+            if self.kind == SPM:
+                if self.add_space_prefix and previous_special:
+                    fragment = " " + fragment
+                self._encode_spm(fragment.replace(" ", "▁"), ids)
+            else:
+                self._encode_bpe(fragment, ids)
+            previous_special = False
+        return ids
+
+    def count(self, text: str) -> int:
+        """Number of tokens in text, without BOS."""
+        return len(self.encode(text))
+
+    def _encode_spm(self, text: str, ids: List[int]):
+        """SentencePiece BPE: merge the best-scoring adjacent pair until none is in the vocabulary."""
+        if not text:
+            return
+        symbols: List[Optional[str]] = list(text)
+        count = len(symbols)
+        previous = list(range(-1, count - 1))
+        following = list(range(1, count + 1))
+        following[-1] = -1
+        heap = []
+        splits: Dict[str, Tuple[str, str]] = {}
+
+        def add_pair(left: int, right: int):
+            if left == -1 or right == -1:
+                return
+            merged = symbols[left] + symbols[right]
+            token_id = self.ids.get(merged)
+            if token_id is None:
+                return
+            # Highest score first, leftmost on ties
+            heapq.heappush(heap, (-self.scores[token_id], left, right, merged))
+            splits[merged] = (symbols[left], symbols[right])
+
+        for i in range(count - 1):
+            add_pair(i, i + 1)
+
+        while heap:
+            _, left, right, merged = heapq.heappop(heap)
+            if symbols[left] is None or symbols[right] is None or following[left] != right:
+                continue
+            if symbols[left] + symbols[right] != merged:
+                continue
+            symbols[left] = merged
+            symbols[right] = None
+            following[left] = following[right]
+            if following[right] != -1:
+                previous[following[right]] = left
+            add_pair(previous[left], left)
+            add_pair(left, following[left])
+
+        i = 0
+        while i != -1:
+            self._resegment(symbols[i], splits, ids)
+            i = following[i]
+
+    def _resegment(self, text: str, splits: Dict[str, Tuple[str, str]], ids: List[int]):
+        token_id = self.ids.get(text)
+        if token_id is not None:
+            ids.append(token_id)
+            return
+        pair = splits.get(text)
+        if pair is not None:
+            self._resegment(pair[0], splits, ids)
+            self._resegment(pair[1], splits, ids)
+            return
+        # Byte fallback for characters outside the vocabulary
+        for byte in text.encode("utf-8"):
+            token_id = self.byte_ids.get(byte, self.unk_id)
+            if token_id is not None:
+                ids.append(token_id)
+
+    def _encode_bpe(self, text: str, ids: List[int]):
+        for word in self._pre_pattern.findall(text):
+            word_ids = self._word_cache.get(word)
+            if word_ids is None:
+                word_ids = self._bpe_word(word)
+                if len(self._word_cache) < WORD_CACHE_SIZE:
+                    self._word_cache[word] = word_ids
+            ids.extend(word_ids)
+
+    def _bpe_word(self, word: str) -> List[int]:
+        """Byte-level BPE: apply the lowest-ranked merge until none applies."""
+        symbols = [_BYTE_ENCODER[byte] for byte in word.encode("utf-8")]
+        if self.ignore_merges and "".join(symbols) in self.ids:
+            return [self.ids["".join(symbols)]]
+
+        while len(symbols) > 1:
+            best_rank, best = None, -1
+            for i in range(len(symbols) - 1):
+                rank = self.merge_ranks.get((symbols[i], symbols[i + 1]))
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best_rank, best = rank, i
+            if best_rank is None:
+                break
+            pair = (symbols[best], symbols[best + 1])
+            merged, i = [], 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and (symbols[i], symbols[i + 1]) == pair:
+                    merged.append(symbols[i] + symbols[i + 1])
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    i += 1
+            symbols = merged
+
+        word_ids = []
+        for symbol in symbols:
+            token_id = self.ids.get(symbol)
+            if token_id is not None:
+                word_ids.append(token_id)
+                continue
+            for char in symbol:
+                token_id = self.ids.get(char, self.unk_id)
+                if token_id is not None:
+                    word_ids.append(token_id)
+        return word_ids
+
+    def decode(self, ids: List[int]) -> str:
+        """Text for token ids; special tokens are rendered as their text."""
+        pieces = []
+        for token_id in ids:
+            if not 0 <= token_id < len(self.tokens):
+                raise ValueError(f"Token id {token_id} is outside the vocabulary")
+            text = self.tokens[token_id]
+            token_type = self.token_types[token_id]
+            if token_type == TOKEN_BYTE and len(text) == 6 and text.startswith("<0x"):
+                pieces.append(bytes([int(text[3:5], 16)]))
+            elif self.kind == SPM or token_type in (TOKEN_CONTROL, TOKEN_USER_DEFINED):
+                pieces.append(text.replace("▁", " ").encode("utf-8"))
+            else:
+                pieces.append(bytes(_BYTE_DECODER.get(char, ord(char) & 0xFF) for char in text))
+
+        text = b"".join(pieces).decode("utf-8", errors="replace")
+        if self.kind == SPM and self.add_space_prefix and text.startswith(" "):
+            # Undo the space prefix added when encoding
+            text = text[1:]
+        return text
+
+
+def read_tokenizer(path: str) -> GGUFTokenizer:
+    """Build a tokenizer from the vocabulary in a GGUF file's header."""
+    stat = os.stat(path)
+    with GGUFReader(path) as reader:
+        metadata = reader.metadata
+
+        def array(key: str) -> List[Any]:
+            value = metadata.get(key)
+            if isinstance(value, GGUFArray):
+                return value.read()
+            return list(value or [])
+
+        kind = metadata.get("tokenizer.ggml.model", "")
+        if kind not in (SPM, BPE):
+            raise UnsupportedTokenizerError(f"Unsupported tokenizer model '{kind}' in {path}")
+        tokens = array("tokenizer.ggml.tokens")
+        if not tokens:
+            raise UnsupportedTokenizerError(f"No vocabulary in {path}")
+
+        return GGUFTokenizer(
+            kind,
+            tokens,
+            array("tokenizer.ggml.token_type"),
+            array("tokenizer.ggml.scores"),
+            array("tokenizer.ggml.merges"),
+            bos_id=metadata.get("tokenizer.ggml.bos_token_id"),
+            eos_id=metadata.get("tokenizer.ggml.eos_token_id"),
+            # llama.cpp assumes <unk> is token 0 in SentencePiece vocabularies
+            unk_id=metadata.get("tokenizer.ggml.unknown_token_id", 0 if kind == SPM else None),
+            add_bos=bool(metadata.get("tokenizer.ggml.add_bos_token", kind == SPM)),
+            add_space_prefix=bool(metadata.get("tokenizer.ggml.add_space_prefix", kind == SPM)),
+            pre=metadata.get("tokenizer.ggml.pre", "default"),
+            fingerprint=f"{path}:{stat.st_size}:{stat.st_mtime_ns}",
+        )
+
+
+# Tokenizers by model path, with the (size, mtime) they were read at
+_tokenizers: Dict[str, Tuple[Tuple[int, int], GGUFTokenizer]] = {}
+_tokenizers_lock = threading.Lock()
+
+
+def load_tokenizer(path: str) -> GGUFTokenizer:
+    """The tokenizer for a GGUF file, read once and shared until the file changes."""
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    with _tokenizers_lock:
+        cached = _tokenizers.get(path)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        tokenizer = read_tokenizer(path)
+        _tokenizers[path] = (key, tokenizer)
+        return tokenizer
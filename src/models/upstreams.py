@@ -0,0 +1,259 @@
+import asyncio
+import hashlib
+import itertools
+import json
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, List, AsyncIterator, Set
+
+import httpx
+
+from ..utils.logging import logger
+
+
+# Kinds of node a remote model can route to
+LLAMA_WEB = "llama-web"        # another llama.cpp-web (or Ollama) instance
+LLAMA_SERVER = "llama-server"  # a bare llama-server
+UPSTREAM_KINDS = {LLAMA_WEB, LLAMA_SERVER}
+
+
+class UpstreamUnavailableError(RuntimeError):
+    """No healthy upstream can take the request."""
+
+
+def parse_upstreams(model_config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Normalize a model's ``upstreams`` list (URLs or mappings) to mappings."""
+    upstreams = []
+    for entry in model_config.get("upstreams") or []:
+        if isinstance(entry, str):
+            entry = {"url": entry}
+        kind = entry.get("type", LLAMA_WEB)
+        if kind not in UPSTREAM_KINDS:
+            raise ValueError(f"Unknown upstream type '{kind}' for {entry.get('url')}")
+        upstreams.append({
+            "url": str(entry["url"]).rstrip("/"),
+            "type": kind,
+            "model": entry.get("model") or model_config.get("name"),
+            "parallel": max(1, int(entry.get("parallel", 1))),
+        })
+    return upstreams
+
+
+def _affinity_score(key: str, url: str) -> int:
+    """Rendezvous hash of a routing key on a node."""
+    digest = hashlib.sha256(f"{url}\0{key}".encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+class Upstream:
+    """One remote node serving a model, with its health and load as last seen."""
+
+    def __init__(self, index: int, url: str, kind: str, model: str, parallel: int):
+        self.index = index
+        self.url = url
+        self.kind = kind
+        # Model name on a llama-web node (llama-server serves a single model)
+        self.model = model
+        self.parallel = parallel
+        self.client: Optional[httpx.AsyncClient] = None
+
+        self.healthy = False
+        self.failures = 0
+        # Requests this process has in flight on the node
+        self.active = 0
+        # Requests from other clients running or queued there at the last check
+        self.external = 0
+
+    @property
+    def load(self) -> float:
+        """Requests per slot, counting our own in-flight ones live."""
+        return (self.active + self.external) / self.parallel
+
+    async def probe(self, timeout: float) -> Optional[int]:
+        """Check the node is serving and return its queue depth, if it reports one."""
+        if self.kind == LLAMA_WEB:
+            response = await self.client.get(f"{self.url}/api/queue", timeout=timeout)
+            if response.status_code == 404:
+                # Plain Ollama has no queue endpoint; answering is all we learn
+                return None
+            response.raise_for_status()
+            queue = response.json().get("queues", {}).get(self.model, {})
+            return int(queue.get("running", 0)) + int(queue.get("waiting", 0))
+
+        # llama-server answers 503 while the model is still loading
+        response = await self.client.get(f"{self.url}/health", timeout=timeout)
+        response.raise_for_status()
+        slots = await self.client.get(f"{self.url}/slots", timeout=timeout)
+        if slots.status_code != 200:
+            # The slots endpoint can be disabled on the server
+            return None
+        return sum(1 for slot in slots.json() if slot.get("is_processing"))
+
+    async def post(self, path: str, payload: Dict[str, Any]) -> Any:
+        """POST a JSON request and return the decoded reply."""
+        response = await self.client.post(f"{self.url}{path}", json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"Upstream {self.url} error {response.status_code}: {response.text}")
+        return response.json()
+
+    async def stream(self, path: str, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """POST a streaming request, yielding each event as soon as it arrives.
+
+        llama-web answers NDJSON and llama-server server-sent events; closing
+        the iterator closes the connection, which cancels the generation.
+        """
+        async with self.client.stream("POST", f"{self.url}{path}", json=payload) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise RuntimeError(
+                    f"Upstream {self.url} error {response.status_code}: {body.decode(errors='replace')}"
+                )
+            async for line in response.aiter_lines():
+                if line.startswith("data: "):
+                    line = line[6:]
+                if line.strip():
+                    yield json.loads(line)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "url": self.url,
+            "type": self.kind,
+            "healthy": self.healthy,
+            "active": self.active,
+            "external": self.external,
+            "failures": self.failures,
+        }
+
+
+class UpstreamPool:
+    """Health-checked set of remote nodes for one model.
+
+    Every node is probed each ``health_interval`` seconds; one that fails
+    ``unhealthy_after`` checks (or connection attempts) in a row is drained:
+    it gets no new requests until a check succeeds again. Requests go to
+    the least loaded healthy node, except that a session sticks to the node
+    holding its KV cache and requests sharing a prompt prefix prefer the
+    same node (rendezvous hashing) unless it is more than
+    ``affinity_slack`` requests per slot busier than the least loaded one.
+    All nodes share one pooled HTTP client.
+    """
+
+    def __init__(self, model_name: str, pool_config: Dict[str, Any]):
+        self.model_name = model_name
+        self.upstreams = [
+            Upstream(i, entry["url"], entry["type"], entry["model"], entry["parallel"])
+            for i, entry in enumerate(parse_upstreams(pool_config))
+        ]
+        if not self.upstreams:
+            raise ValueError(f"Model {model_name} uses the remote backend but lists no upstreams")
+
+        self.health_interval = float(pool_config.get("health_interval", 5.0))
+        self.health_timeout = float(pool_config.get("health_timeout", 2.0))
+        self.unhealthy_after = max(1, int(pool_config.get("unhealthy_after", 2)))
+        self.affinity_slack = float(pool_config.get("affinity_slack", 1.0))
+        self.request_timeout = float(pool_config.get("request_timeout", 600.0))
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._monitor: Optional[asyncio.Task] = None
+        self._round_robin = itertools.count()
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """Open the connection pool and check every node once (idempotent)."""
+        async with self._start_lock:
+            if self._client is not None:
+                return
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(self.request_timeout, connect=5.0))
+            for upstream in self.upstreams:
+                upstream.client = self._client
+            await self._check_all()
+            healthy = sum(upstream.healthy for upstream in self.upstreams)
+            logger.info(f"Remote model {self.model_name}: {healthy}/{len(self.upstreams)} upstreams healthy")
+            self._monitor = asyncio.create_task(self._monitor_loop())
+
+    async def stop(self):
+        """Stop health checks and close pooled connections."""
+        async with self._start_lock:
+            if self._monitor is not None:
+                self._monitor.cancel()
+                try:
+                    await self._monitor
+                except asyncio.CancelledError:
+                    pass
+                self._monitor = None
+            if self._client is not None:
+                await self._client.aclose()
+                self._client = None
+
+    async def _monitor_loop(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await self._check_all()
+
+    async def _check_all(self):
+        await asyncio.gather(*(self._check(upstream) for upstream in self.upstreams))
+
+    async def _check(self, upstream: Upstream):
+        active = upstream.active
+        try:
+            depth = await upstream.probe(self.health_timeout)
+        except (httpx.HTTPError, ValueError) as e:
+            self.mark_failed(upstream, e)
+            return
+
+        # The reported depth includes our own requests, which are counted live
+        upstream.external = max(0, depth - active) if depth is not None else 0
+        upstream.failures = 0
+        if not upstream.healthy:
+            upstream.healthy = True
+            logger.info(f"Upstream {upstream.url} for {self.model_name} is healthy")
+
+    def mark_failed(self, upstream: Upstream, error: BaseException):
+        """Count a failed check or connection; drain the node once it keeps failing."""
+        upstream.failures += 1
+        if upstream.healthy and upstream.failures >= self.unhealthy_after:
+            upstream.healthy = False
+            logger.warning(f"Upstream {upstream.url} for {self.model_name} is unhealthy, draining it: {error}")
+
+    def _choose(self, key: Optional[str], preferred: Optional[int], exclude: Set[int]) -> Upstream:
+        healthy = [u for u in self.upstreams if u.healthy and u.index not in exclude]
+        if not healthy:
+            raise UpstreamUnavailableError(f"No healthy upstream for model {self.model_name}")
+
+        if preferred is not None and preferred < len(self.upstreams):
+            upstream = self.upstreams[preferred]
+            if upstream.healthy and upstream.index not in exclude:
+                return upstream
+
+        least = min(upstream.load for upstream in healthy)
+        if key is not None:
+            owner = max(healthy, key=lambda u: _affinity_score(key, u.url))
+            if owner.load <= least + self.affinity_slack:
+                return owner
+
+        # Rotate before picking so ties are spread across nodes
+        offset = next(self._round_robin) % len(healthy)
+        healthy = healthy[offset:] + healthy[:offset]
+        return min(healthy, key=lambda u: u.load)
+
+    @asynccontextmanager
+    async def acquire(self, key: Optional[str] = None, preferred: Optional[int] = None, exclude: Set[int] = frozenset()):
+        """Lease a node for the duration of a request.
+
+        ``preferred`` is the node a session already lives on and ``key`` a
+        prompt prefix for affinity; nodes in ``exclude`` (e.g. ones that just
+        refused a connection) are skipped.
+        """
+        await self.start()
+        upstream = self._choose(key, preferred, exclude)
+        upstream.active += 1
+        try:
+            yield upstream
+        finally:
+            upstream.active -= 1
+
+    @property
+    def capacity(self) -> int:
+        return sum(upstream.parallel for upstream in self.upstreams)
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [upstream.stats() for upstream in self.upstreams]
@@ -0,0 +1,226 @@
+import asyncio
+import os
+import time
+from typing import Dict, Any, Optional, List
+
+from ..utils.logging import logger
+from .backends.base import GENERATE
+
+
+# Bytes read per call when pulling a model file into the page cache
+PREFETCH_CHUNK = 8 * 1024 * 1024
+
+# Seconds one model may take to prefetch, load and answer before it is given up on
+DEFAULT_TIMEOUT = 300.0
+
+# Per-model warmup states, in the order a model goes through them
+PENDING = "pending"
+PREFETCHING = "prefetching"
+LOADING = "loading"
+WARMING = "warming"
+READY = "ready"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+def prefetch_file(path: str) -> int:
+    """Read a file once so its pages are in the page cache; returns the bytes read.
+
+    The read goes through a single reused buffer, so it costs no memory
+    beyond the page cache itself; llama.cpp then maps the weights without
+    touching the disk.
+    """
+    size = 0
+    buffer = bytearray(PREFETCH_CHUNK)
+    with open(path, "rb", buffering=0) as f:
+        if hasattr(os, "posix_fadvise"):
+            # Let the kernel read ahead in large sequential chunks
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            size += n
+    return size
+
+
+class ModelWarmup:
+    """Warmup progress and timings of one model."""
+
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+        self.state = PENDING
+        self.prefetch_bytes = 0
+        self.prefetch_duration = 0.0
+        self.load_duration = 0.0
+        self.generate_duration = 0.0
+        self.total_duration = 0.0
+        # Why the model failed or was skipped
+        self.detail: Optional[str] = None
+
+    def stats(self) -> Dict[str, Any]:
+        stats = {
+            "state": self.state,
+            "prefetch_bytes": self.prefetch_bytes,
+            "prefetch_duration": round(self.prefetch_duration, 3),
+            "load_duration": round(self.load_duration, 3),
+            "generate_duration": round(self.generate_duration, 3),
+            "total_duration": round(self.total_duration, 3),
+        }
+        if self.detail is not None:
+            stats["detail"] = self.detail
+        return stats
+
+
+class Warmup:
+    """Gets models ready to serve before the instance reports ready.
+
+    Each model is warmed in turn: its GGUF files are read into the page
+    cache, it is loaded (starting resident llama-server workers or the
+    in-process engine) and answers a short generation per instance, so the
+    first real request pays neither for a cold disk nor for a cold engine.
+    Models go through the scheduler at batch priority and the lifecycle
+    like any request, so their keep_alive and the memory budget apply; a
+    model that would not fit next to the ones already warmed is only
+    prefetched. A model that fails to warm is reported but does not keep
+    the instance from becoming ready.
+    """
+
+    def __init__(self, settings: Dict[str, Any], registry, lifecycle, scheduler):
+        self.settings = settings
+        self.registry = registry
+        self.lifecycle = lifecycle
+        self.scheduler = scheduler
+        self.enabled = bool(settings.get("enabled", True))
+        self.prefetch = bool(settings.get("prefetch", True))
+        self.prompt = str(settings.get("prompt", "Hello"))
+        self.max_tokens = int(settings.get("max_tokens", 1))
+        self.timeout = float(settings.get("timeout", DEFAULT_TIMEOUT))
+
+        self.models: Dict[str, ModelWarmup] = {}
+        self.ready = not self.enabled
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self.stopping = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _selected(self) -> List[str]:
+        """Models to warm: the configured list, else every model not opted out."""
+        names = self.settings.get("models")
+        if names is None:
+            names = self.registry.list_models()
+        selected = []
+        for name in names:
+            model = self.registry.get_model(name)
+            if model is None:
+                logger.warning(f"Warmup: unknown model '{name}'")
+            elif model.model_config.get("warmup", True):
+                selected.append(name)
+        return selected
+
+    def start(self):
+        """Begin warming in the background; /ready answers 200 once it is done."""
+        if not self.enabled or self._task is not None:
+            return
+        self.models = {name: ModelWarmup(name) for name in self._selected()}
+        self.started_at = time.monotonic()
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        """Stop reporting ready and abandon a warmup still in progress."""
+        self.ready = False
+        self.stopping = True
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        logger.info(f"Warming up {len(self.models)} model(s)")
+        for name, progress in self.models.items():
+            started = time.monotonic()
+            try:
+                await asyncio.wait_for(self._warm(name, progress), self.timeout)
+            except asyncio.TimeoutError:
+                progress.state, progress.detail = FAILED, f"timed out after {self.timeout:.0f}s"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                progress.state, progress.detail = FAILED, str(e)
+            progress.total_duration = time.monotonic() - started
+            if progress.state == FAILED:
+                logger.warning(f"Warmup of {name} failed: {progress.detail}")
+            else:
+                logger.info(f"Warmup of {name}: {progress.state} in {progress.total_duration:.2f}s")
+
+        self.duration = time.monotonic() - self.started_at
+        self.ready = True
+        logger.info(f"Warmup finished in {self.duration:.2f}s, ready to serve")
+
+    async def _warm(self, name: str, progress: ModelWarmup):
+        model = self.registry.get_model(name)
+        if model is None:
+            # Removed by a reload while earlier models were warming
+            progress.state = SKIPPED
+            return
+
+        if self.prefetch and model.model_path:
+            progress.state = PREFETCHING
+            started = time.monotonic()
+            for path in (model.model_path, model.draft_model_path):
+                if path:
+                    progress.prefetch_bytes += await asyncio.to_thread(prefetch_file, path)
+            progress.prefetch_duration = time.monotonic() - started
+
+        budget = self.lifecycle.memory_budget
+        if budget and self.lifecycle.used_memory + model.memory_footprint() > budget:
+            # Loading it would only evict a model warmed before it
+            progress.state, progress.detail = SKIPPED, "does not fit the memory budget next to the models already warm"
+            return
+
+        progress.state = LOADING
+        lease = await self.scheduler.acquire(name, "batch")
+        try:
+            residency = await self.lifecycle.acquire(model, self.lifecycle.resolve_keep_alive(model))
+            lease.on_release(residency.release)
+            progress.load_duration = residency.load_duration
+
+            if GENERATE in model.capabilities and model.backend.instances:
+                progress.state = WARMING
+                started = time.monotonic()
+                await self._generate(model)
+                progress.generate_duration = time.monotonic() - started
+        finally:
+            lease.release()
+        progress.state = READY
+
+    async def _generate(self, model):
+        """One short generation per model instance, so every worker has run once."""
+        try:
+            prompt = model.render_chat([{"role": "user", "content": self.prompt}])
+        except ValueError:
+            prompt = self.prompt
+        options = {"max_tokens": self.max_tokens}
+        # The pool hands concurrent requests to different workers
+        await asyncio.gather(*(
+            model.generate(prompt, options) for _ in range(model.backend.instances)
+        ))
+
+    def stats(self) -> Dict[str, Any]:
+        if self.stopping:
+            state = "stopping"
+        elif not self.enabled:
+            state = "disabled"
+        elif self.ready:
+            state = "ready"
+        elif self._task is None:
+            state = "pending"
+        else:
+            state = "warming"
+        return {
+            "status": state,
+            "duration": round(self.duration, 3),
+            "models": {name: progress.stats() for name, progress in self.models.items()},
+        }
@@ -0,0 +1,350 @@
+import asyncio
+import itertools
+import json
+import os
+import socket
+import tempfile
+from contextlib import asynccontextmanager
+from typing import Dict, Any, Optional, List, AsyncIterator
+
+import httpx
+
+from ..utils.logging import logger
+from .cpu import cpu_planner, CpuSlot
+
+
+# Numbers each llama-server start's unix socket, so that two generations of a
+# worker (e.g. during a reload) never share, or unlink, each other's socket
+_socket_ids = itertools.count()
+
+
+def _find_free_port(host: str) -> int:
+    """Ask the OS for a free TCP port on the given host."""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+def has_flag(args: List[str], *flags: str) -> bool:
+    """Whether a command line already sets one of the given options."""
+    return any(arg in flags or arg.startswith(tuple(f"{flag}=" for flag in flags)) for arg in args)
+
+
+class LlamaServerWorker:
+    """A supervised, long-lived llama-server child process.
+
+    The model is loaded once when the worker starts and stays resident, so
+    requests only pay for prompt evaluation and generation. If the child
+    exits unexpectedly it is restarted with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        model_path: str,
+        name: str,
+        index: int = 0,
+        host: str = "127.0.0.1",
+        transport: str = "tcp",
+        extra_args: Optional[List[str]] = None,
+        startup_timeout: float = 120.0,
+        request_timeout: float = 600.0,
+        cpu_owner: Optional[object] = None,
+    ):
+        self.model_path = model_path
+        self.name = name
+        self.index = index
+        self.host = host
+        self.transport = transport
+        self.extra_args = list(extra_args or [])
+        self.startup_timeout = startup_timeout
+        self.request_timeout = request_timeout
+        # Model whose share of the cores (see cpu.py) this worker runs on
+        self.cpu_owner = cpu_owner
+
+        self.port: Optional[int] = None
+        self.socket_path: Optional[str] = None
+        self.process: Optional[asyncio.subprocess.Process] = None
+        self.active = 0
+        self.restarts = 0
+
+        self._client: Optional[httpx.AsyncClient] = None
+        self._ready = asyncio.Event()
+        self._stopping = False
+        self._supervisor: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def _cpu_slot(self) -> Optional[CpuSlot]:
+        """This worker's share of the cores, if the model registered one."""
+        if self.cpu_owner is None:
+            return None
+        return cpu_planner.slot(self.cpu_owner, self.index)
+
+    def _build_command(self) -> List[str]:
+        """Build the llama-server command line for this worker."""
+        if self.transport == "unix":
+            # A socket left by this worker's previous process is of no further use
+            self._remove_socket()
+            # llama-server listens on a unix socket when --host ends in .sock
+            self.socket_path = os.path.join(
+                tempfile.gettempdir(), f"llama-web-{os.getpid()}-{next(_socket_ids)}-{self.name}.sock"
+            )
+            listen = ["--host", self.socket_path]
+        else:
+            self.port = _find_free_port(self.host)
+            listen = ["--host", self.host, "--port", str(self.port)]
+
+        # Threads sized to the worker's share of the cores unless server_args set them
+        threads = []
+        slot = self._cpu_slot()
+        if slot is not None:
+            if slot.threads and not has_flag(self.extra_args, "-t", "--threads"):
+                threads.extend(["--threads", str(slot.threads)])
+            if slot.threads_batch and not has_flag(self.extra_args, "-tb", "--threads-batch"):
+                threads.extend(["--threads-batch", str(slot.threads_batch)])
+
+        return ["llama-server", "-m", self.model_path, *listen, *threads, *self.extra_args]
+
+    def _make_client(self) -> httpx.AsyncClient:
+        """Create a pooled HTTP client bound to this worker's endpoint."""
+        timeout = httpx.Timeout(self.request_timeout, connect=5.0)
+        if self.transport == "unix":
+            return httpx.AsyncClient(
+                base_url="http://llama-server",
+                transport=httpx.AsyncHTTPTransport(uds=self.socket_path),
+                timeout=timeout,
+            )
+        return httpx.AsyncClient(base_url=f"http://{self.host}:{self.port}", timeout=timeout)
+
+    async def start(self):
+        """Start the worker and its supervisor, waiting until it is ready."""
+        self._stopping = False
+        await self._spawn()
+        self._supervisor = asyncio.create_task(self._supervise())
+
+    async def _spawn(self):
+        """Spawn the child process and wait for its health endpoint."""
+        cmd = self._build_command()
+        logger.info(f"Starting llama-server worker {self.name}: {' '.join(cmd)}")
+
+        slot = self._cpu_slot()
+        if slot is not None and self.process is not None:
+            slot.detach(self.process.pid)
+
+        self.process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.DEVNULL,
+        )
+        if slot is not None:
+            slot.attach(self.process.pid)
+
+        if self._client is not None:
+            await self._client.aclose()
+        self._client = self._make_client()
+
+        await self._wait_until_healthy()
+        self._ready.set()
+        logger.info(f"Worker {self.name} ready (pid {self.process.pid})")
+
+    async def _wait_until_healthy(self):
+        """Poll /health until the model has finished loading."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.startup_timeout
+
+        while loop.time() < deadline:
+            if self.process.returncode is not None:
+                raise RuntimeError(
+                    f"llama-server worker {self.name} exited during startup "
+                    f"with code {self.process.returncode}"
+                )
+            try:
+                response = await self._client.get("/health", timeout=2.0)
+                if response.status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.25)
+
+        await self._terminate()
+        raise TimeoutError(f"llama-server worker {self.name} did not become ready in time")
+
+    async def _supervise(self):
+        """Restart the child process whenever it exits unexpectedly."""
+        backoff = 1.0
+        while not self._stopping:
+            await self.process.wait()
+            self._ready.clear()
+            if self._stopping:
+                break
+
+            logger.error(
+                f"Worker {self.name} exited with code {self.process.returncode}, "
+                f"restarting in {backoff:.0f}s"
+            )
+            await asyncio.sleep(backoff)
+            try:
+                await self._spawn()
+                self.restarts += 1
+                backoff = 1.0
+            except Exception as e:
+                logger.error(f"Failed to restart worker {self.name}: {e}")
+                backoff = min(backoff * 2, 60.0)
+
+    async def _terminate(self):
+        """Terminate the child process, killing it if it does not exit."""
+        if self.process is None or self.process.returncode is not None:
+            return
+        self.process.terminate()
+        try:
+            await asyncio.wait_for(self.process.wait(), timeout=10.0)
+        except asyncio.TimeoutError:
+            self.process.kill()
+            await self.process.wait()
+
+    async def stop(self):
+        """Stop the worker and its supervisor."""
+        self._stopping = True
+        self._ready.clear()
+        if self._supervisor is not None:
+            self._supervisor.cancel()
+            try:
+                await self._supervisor
+            except asyncio.CancelledError:
+                pass
+            self._supervisor = None
+        await self._terminate()
+        slot = self._cpu_slot()
+        if slot is not None and self.process is not None:
+            slot.detach(self.process.pid)
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+        self._remove_socket()
+
+    def _remove_socket(self):
+        """Delete the unix socket this worker created, if any."""
+        if self.socket_path is None:
+            return
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+        self.socket_path = None
+
+    async def request(self, path: str, payload: Dict[str, Any]) -> Any:
+        """POST a JSON request to the worker and return the decoded reply."""
+        await self._ready.wait()
+        response = await self._client.post(path, json=payload)
+        if response.status_code != 200:
+            raise RuntimeError(f"llama-server error {response.status_code}: {response.text}")
+        return response.json()
+
+    async def complete(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Run a blocking completion request against the worker."""
+        return await self.request("/completion", {**payload, "stream": False})
+
+    async def complete_stream(self, payload: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """Run a streaming completion request, yielding server events."""
+        await self._ready.wait()
+        async with self._client.stream(
+            "POST", "/completion", json={**payload, "stream": True}
+        ) as response:
+            if response.status_code != 200:
+                body = await response.aread()
+                raise RuntimeError(
+                    f"llama-server error {response.status_code}: {body.decode(errors='replace')}"
+                )
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                event = json.loads(line[6:])
+                yield event
+                if event.get("stop"):
+                    break
+
+
+class WorkerPool:
+    """A pool of resident llama-server workers for one model."""
+
+    def __init__(self, model_path: str, model_name: str, pool_config: Dict[str, Any], cpu_owner: Optional[object] = None):
+        self.model_name = model_name
+        size = int(pool_config.get("workers", 1))
+        # Slots per worker; llama-server decodes this many requests in parallel
+        self.parallel = int(pool_config.get("parallel", 1))
+
+        extra_args = [str(arg) for arg in pool_config.get("server_args", [])]
+        if self.parallel > 1:
+            extra_args.extend(["--parallel", str(self.parallel)])
+        if pool_config.get("embeddings"):
+            extra_args.append("--embeddings")
+
+        self.workers = [
+            LlamaServerWorker(
+                model_path,
+                name=f"{model_name}-{i}",
+                index=i,
+                host=pool_config.get("host", "127.0.0.1"),
+                transport=pool_config.get("transport", "tcp"),
+                extra_args=extra_args,
+                startup_timeout=float(pool_config.get("startup_timeout", 120.0)),
+                cpu_owner=cpu_owner,
+            )
+            for i in range(size)
+        ]
+        self._round_robin = itertools.count()
+        self._slot_counter = itertools.count()
+        self._started = False
+        self._start_lock = asyncio.Lock()
+
+    async def start(self):
+        """Start all workers (idempotent)."""
+        async with self._start_lock:
+            if self._started:
+                return
+            await asyncio.gather(*(worker.start() for worker in self.workers))
+            self._started = True
+
+    async def stop(self):
+        """Stop all workers."""
+        async with self._start_lock:
+            await asyncio.gather(*(worker.stop() for worker in self.workers))
+            self._started = False
+
+    def next_slot(self) -> int:
+        """Assign slots to new sessions round-robin."""
+        return next(self._slot_counter) % self.parallel
+
+    @asynccontextmanager
+    async def acquire(self, preferred: Optional[int] = None):
+        """Lease a worker for the duration of a request.
+
+        A session's own worker is used when it is healthy, since its slot
+        already holds the conversation's KV cache; otherwise the least busy
+        ready worker is chosen.
+        """
+        await self.start()
+
+        if preferred is not None and preferred < len(self.workers) and self.workers[preferred].ready:
+            worker = self.workers[preferred]
+            worker.active += 1
+            try:
+                yield worker
+            finally:
+                worker.active -= 1
+            return
+
+        ready = [worker for worker in self.workers if worker.ready] or self.workers
+        offset = next(self._round_robin)
+        # Rotate before picking so ties are spread across workers
+        ready = ready[offset % len(ready):] + ready[:offset % len(ready)]
+        worker = min(ready, key=lambda w: w.active)
+
+        worker.active += 1
+        try:
+            yield worker
+        finally:
+            worker.active -= 1
@@ -1,10 +1,14 @@
+import asyncio
+import signal
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from .api.routes import router
+from .api.routes import router, init_services, shutdown_services, reload_models, start_warmup, readiness
 from .utils.config import config
-from .utils.logging import logger
+from .utils import metrics
+from .utils.logging import logger, RequestIdMiddleware
 
 
 # Create FastAPI app
@@ -23,6 +27,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Tag every log record with the ID of the request that produced it
+app.add_middleware(RequestIdMiddleware)
+
 # Include API routes
 app.include_router(router)
 
@@ -39,10 +46,59 @@ async def root():
 
 @app.get("/health")
 async def health():
-    """Health check endpoint."""
+    """Liveness check: the process is up, whether or not models are warm."""
     return {"status": "healthy"}
 
 
+@app.get("/ready")
+async def ready():
+    """Readiness check: 200 once startup warmup is done, 503 before and while shutting down."""
+    is_ready, status = readiness()
+    return JSONResponse(status_code=200 if is_ready else 503, content=status)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics endpoint."""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+# Reloads started by SIGHUP, referenced so they aren't garbage collected mid-flight
+_reload_tasks = set()
+
+
+async def _reload_on_signal():
+    try:
+        await reload_models()
+    except Exception as e:
+        logger.error(f"Configuration reload failed: {e}")
+
+
+def _schedule_reload():
+    logger.info("SIGHUP received, reloading configuration")
+    task = asyncio.ensure_future(_reload_on_signal())
+    _reload_tasks.add(task)
+    task.add_done_callback(_reload_tasks.discard)
+
+
+@app.on_event("startup")
+async def startup():
+    """Load the configuration, start warming models and reload on SIGHUP."""
+    init_services()
+    start_warmup()
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, _schedule_reload)
+    except (AttributeError, NotImplementedError, RuntimeError):
+        # No SIGHUP on Windows, and signals only work in the main thread
+        logger.info("SIGHUP reload unavailable; use POST /api/reload")
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Unload models, stop resident llama.cpp workers and drop conversation state."""
+    await shutdown_services()
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request, exc):
     """Global exception handler."""
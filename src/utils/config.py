@@ -3,12 +3,37 @@ import yaml
 from typing import Dict, Any, Optional
 from pathlib import Path
 
+from ..models.context_budget import POLICIES, WINDOW
+
+
+# Overrides the configuration file path (used by the benchmark suite)
+CONFIG_PATH_ENV = "LLAMA_WEB_CONFIG"
+
 
 class Config:
-    def __init__(self, config_path: str = "config/models.yaml"):
-        self.config_path = config_path
-        self.config = self._load_config()
-        self._validate_config()
+    """Settings from the YAML configuration file.
+
+    The file is read on first use rather than on construction, so importing
+    the application does not require it; ``reload`` re-reads it in place.
+    """
+
+    def __init__(self, config_path: Optional[str] = None):
+        self.config_path = config_path or os.environ.get(CONFIG_PATH_ENV, "config/models.yaml")
+        self._config: Optional[Dict[str, Any]] = None
+
+    @property
+    def config(self) -> Dict[str, Any]:
+        if self._config is None:
+            config = self._load_config()
+            self._validate_config(config)
+            self._config = config
+        return self._config
+
+    def reload(self):
+        """Re-read the configuration file, keeping the current one if the new one is invalid."""
+        config = self._load_config()
+        self._validate_config(config)
+        self._config = config
 
     def _load_config(self) -> Dict[str, Any]:
         """Load configuration from YAML file."""
@@ -20,35 +45,87 @@ class Config:
         
         return config
 
-    def _validate_config(self):
-        """Validate configuration structure and model paths."""
-        if 'models' not in self.config:
+    def _validate_config(self, config: Dict[str, Any]):
+        """Validate configuration structure.
+
+        Model files are checked when the models are loaded, so a missing
+        file only disables that model.
+        """
+        if not isinstance(config, dict) or 'models' not in config:
             raise ValueError("Configuration must contain 'models' section")
         
-        if 'server' not in self.config:
+        if 'server' not in config:
             raise ValueError("Configuration must contain 'server' section")
         
-        # Validate model paths
-        for model_name, model_config in self.config['models'].items():
-            if 'path' not in model_config:
+        self._validate_context_policy("context", config.get('context'))
+        for model_name, model_config in (config['models'] or {}).items():
+            if 'path' not in model_config and model_config.get('backend') != 'remote':
                 raise ValueError(f"Model '{model_name}' must have 'path' specified")
-            
-            model_path = model_config['path']
-            if not os.path.exists(model_path):
-                raise FileNotFoundError(f"Model file not found: {model_path}")
+            self._validate_context_policy(f"Model '{model_name}' context", model_config.get('context'))
+
+    @staticmethod
+    def _validate_context_policy(section: str, settings: Optional[Dict[str, Any]]):
+        """Reject an unknown history overflow policy before it reaches a request."""
+        policy = (settings or {}).get('policy', WINDOW)
+        if policy not in POLICIES:
+            raise ValueError(f"{section}: unknown policy '{policy}', expected one of {sorted(POLICIES)}")
 
     def get_models(self) -> Dict[str, Any]:
         """Get all configured models."""
-        return self.config.get('models', {})
+        return self.config.get('models') or {}
 
     def get_model(self, model_name: str) -> Optional[Dict[str, Any]]:
         """Get specific model configuration."""
-        return self.config.get('models', {}).get(model_name)
+        return self.get_models().get(model_name)
 
     def get_server_config(self) -> Dict[str, Any]:
         """Get server configuration."""
         return self.config.get('server', {})
 
+    def get_scheduler_config(self) -> Dict[str, Any]:
+        """Get default request scheduler settings."""
+        return self.config.get('scheduler', {})
+
+    def get_cache_config(self) -> Dict[str, Any]:
+        """Get response cache settings."""
+        return self.config.get('cache', {})
+
+    def get_sessions_config(self) -> Dict[str, Any]:
+        """Get conversation session (prompt cache) settings."""
+        return self.config.get('sessions', {})
+
+    def get_lifecycle_config(self) -> Dict[str, Any]:
+        """Get model load/unload (keep_alive, memory budget) settings."""
+        return self.config.get('lifecycle', {})
+
+    def get_model_index_config(self) -> Dict[str, Any]:
+        """Get model metadata/digest index settings."""
+        return self.config.get('model_index', {})
+
+    def get_generation_config(self) -> Dict[str, Any]:
+        """Get generation limits (server-wide timeout)."""
+        return self.config.get('generation', {})
+
+    def get_embeddings_config(self) -> Dict[str, Any]:
+        """Get embedding micro-batching and cache settings."""
+        return self.config.get('embeddings', {})
+
+    def get_logging_config(self) -> Dict[str, Any]:
+        """Get log level, format, destination and sampling settings."""
+        return self.config.get('logging', {})
+
+    def get_context_config(self) -> Dict[str, Any]:
+        """Get chat history trimming settings."""
+        return self.config.get('context', {})
+
+    def get_warmup_config(self) -> Dict[str, Any]:
+        """Get startup warmup settings."""
+        return self.config.get('warmup', {})
+
+    def get_cpu_config(self) -> Dict[str, Any]:
+        """Get how llama.cpp workers share the host's cores."""
+        return self.config.get('cpu', {})
+
     def get_server_host(self) -> str:
         """Get server host."""
         return self.get_server_config().get('host', '0.0.0.0')
@@ -58,5 +135,5 @@ class Config:
         return self.get_server_config().get('port', 11434)
 
 
-# Global config instance
+# Global config instance; the file is read on first access
 config = Config() 
\ No newline at end of file
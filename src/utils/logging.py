@@ -1,33 +1,246 @@
+import atexit
+import contextvars
+import copy
+import json
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from typing import Optional
+import threading
+import time
+import uuid
+from datetime import datetime
+from typing import Dict, Any, Optional
 
+from . import metrics
 
-def setup_logging(level: str = "INFO", log_file: Optional[str] = None) -> logging.Logger:
-    """Setup logging configuration."""
-    logger = logging.getLogger("llama-cpp-web")
+
+LOGGER_NAME = "llama-cpp-web"
+
+# ID of the HTTP request being served, stamped on every record it logs
+request_id_var: contextvars.ContextVar[str] = contextvars.ContextVar("request_id", default="-")
+
+# Records waiting for the writer thread; beyond this they are dropped
+DEFAULT_QUEUE_SIZE = 10000
+
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s'
+
+# extra= for high-volume records, thinned out by the "sampling" settings
+REQUEST_LOG = {"sample": "request"}
+CHUNK_LOG = {"sample": "chunk"}
+
+dropped_records = metrics.registry.counter(
+    "llama_web_log_records_dropped_total",
+    "Log records dropped by sampling or because the log queue was full",
+    ["reason"],
+)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: timestamp, level, logger, request ID and message."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+        }
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """Thins out high-volume records tagged with ``extra={"sample": category}``.
+
+    Each category keeps a ``rate`` fraction of its records and at most
+    ``per_second`` of them (0 means no limit). Warnings and errors are never
+    dropped, nor are records without a category.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Dict[str, Any]]] = None):
+        super().__init__()
+        self.rules = {}
+        for category, rule in (rules or {}).items():
+            rate = float(rule.get("rate", 1.0))
+            per_second = float(rule.get("per_second", 0))
+            # [rate, per_second, tokens, last refill]
+            self.rules[category] = [rate, per_second, per_second, time.monotonic()]
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        category = getattr(record, "sample", None)
+        if category is None or record.levelno >= logging.WARNING:
+            return True
+        rule = self.rules.get(category)
+        if rule is None:
+            return True
+
+        rate, per_second = rule[0], rule[1]
+        if rate < 1.0 and random.random() >= rate:
+            dropped_records.inc(reason="sampled")
+            return False
+        if per_second:
+            with self._lock:
+                now = time.monotonic()
+                # Token bucket holding up to one second's worth of records
+                rule[2] = min(per_second, rule[2] + (now - rule[3]) * per_second)
+                rule[3] = now
+                if rule[2] < 1.0:
+                    dropped_records.inc(reason="sampled")
+                    return False
+                rule[2] -= 1.0
+        return True
+
+
+# Renders tracebacks before records cross to the writer thread
+_traceback_formatter = logging.Formatter()
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """Hands records to the writer thread, dropping them if it falls behind.
+
+    The caller (usually the event loop) never waits on stdout or disk; the
+    request ID is captured here because the writer thread has no context.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Unlike QueueHandler.prepare, the traceback stays in exc_text instead
+        # of being folded into the message, so each formatter can place it
+        record.request_id = request_id_var.get()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            dropped_records.inc(reason="queue_full")
+
+
+class RequestIdMiddleware:
+    """ASGI middleware giving each HTTP request an ID for its log records.
+
+    A client-supplied ``X-Request-ID`` is kept, otherwise one is generated;
+    either way it is echoed in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = dict(scope.get("headers", [])).get(b"x-request-id", b"").decode("latin-1")[:64]
+        request_id = request_id or uuid.uuid4().hex[:16]
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            request_id_var.reset(token)
+
+
+# Writer thread of the current configuration, replaced by setup_logging
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _stop_listener():
+    global _listener
+    if _listener is not None:
+        try:
+            # Drains the records still queued before returning
+            _listener.stop()
+        except queue.Full:
+            # No room for the stop marker; don't wait on a stalled writer
+            pass
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def setup_logging(
+    level: str = "INFO",
+    log_file: Optional[str] = None,
+    log_format: str = "text",
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    sampling: Optional[Dict[str, Dict[str, Any]]] = None
+) -> logging.Logger:
+    """Setup logging configuration.
+
+    Records go through a bounded queue to a background writer thread, so
+    logging never blocks the event loop. Calling this again replaces the
+    previous configuration instead of adding handlers.
+    """
+    global _listener
+    logger = logging.getLogger(LOGGER_NAME)
     logger.setLevel(getattr(logging, level.upper()))
+    logger.propagate = False
 
     # Create formatter
-    formatter = logging.Formatter(
-        '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-    )
+    if log_format == "json":
+        formatter = JsonFormatter()
+    else:
+        formatter = logging.Formatter(TEXT_FORMAT)
 
     # Create console handler
     console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setLevel(logging.INFO)
     console_handler.setFormatter(formatter)
-    logger.addHandler(console_handler)
+    handlers = [console_handler]
 
     # Create file handler if specified
     if log_file:
         file_handler = logging.FileHandler(log_file)
-        file_handler.setLevel(logging.DEBUG)
         file_handler.setFormatter(formatter)
-        logger.addHandler(file_handler)
+        handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=max(1, int(queue_size)))
+    queue_handler = NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(SamplingFilter(sampling))
+
+    # Install the new pipeline before retiring the old one so no record is lost
+    previous_handlers = list(logger.handlers)
+    logger.addHandler(queue_handler)
+    for handler in previous_handlers:
+        logger.removeHandler(handler)
+    _stop_listener()
+    for handler in previous_handlers:
+        handler.close()
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
 
     return logger
 
 
+def configure_logging(settings: Dict[str, Any]):
+    """Apply the ``logging`` section of the configuration."""
+    setup_logging(
+        level=settings.get("level", "INFO"),
+        log_file=settings.get("file"),
+        log_format=settings.get("format", "text"),
+        queue_size=int(settings.get("queue_size", DEFAULT_QUEUE_SIZE)),
+        sampling=settings.get("sampling"),
+    )
+
+
 # Global logger instance
-logger = setup_logging() 
\ No newline at end of file
+logger = setup_logging()
@@ -0,0 +1,170 @@
+import bisect
+import threading
+from typing import Dict, List, Sequence, Tuple
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing value per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+            for key, value in items
+        ]
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = sorted(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, [list(s[0]), s[1], s[2]]) for key, s in self._series.items())
+
+        lines = []
+        bounds = self.buckets + [float("inf")]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(bounds, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(float(bound))}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Collects metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: List = []
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+    ) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Global metrics registry
+registry = MetricsRegistry()
+
+_LABELS = ("model", "endpoint")
+
+time_to_first_token = registry.histogram(
+    "llama_web_time_to_first_token_seconds",
+    "Time from request arrival to the first generated token",
+    _LABELS,
+)
+tokens_per_second = registry.histogram(
+    "llama_web_tokens_per_second",
+    "Generation speed reported by llama.cpp",
+    _LABELS,
+    buckets=(1, 2.5, 5, 10, 15, 20, 30, 50, 75, 100, 150, 250, 500),
+)
+queue_wait = registry.histogram(
+    "llama_web_queue_wait_seconds",
+    "Time spent waiting for a scheduler slot",
+    _LABELS,
+)
+spawn_time = registry.histogram(
+    "llama_web_spawn_seconds",
+    "Time to start a llama-cli subprocess",
+    _LABELS,
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+request_latency = registry.histogram(
+    "llama_web_request_duration_seconds",
+    "End-to-end generation latency",
+    _LABELS,
+)
+draft_acceptance = registry.histogram(
+    "llama_web_draft_acceptance_ratio",
+    "Share of draft-model tokens accepted in speculative decoding",
+    _LABELS,
+    buckets=(0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0),
+)
+prompt_tokens = registry.counter(
+    "llama_web_prompt_tokens_total",
+    "Prompt tokens evaluated",
+    _LABELS,
+)
+generated_tokens = registry.counter(
+    "llama_web_generated_tokens_total",
+    "Tokens generated",
+    _LABELS,
+)
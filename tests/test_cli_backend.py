@@ -0,0 +1,46 @@
+from types import SimpleNamespace
+
+from src.models.backends.cli import CliBackend
+
+
+class FakeModel:
+    """The parts of LlamaCppModel the cli command line is built from."""
+
+    def __init__(self, draft_model_path=None):
+        self.model_name = "fake"
+        self.model_path = "/models/fake.gguf"
+        self.draft_model_path = draft_model_path
+        self.model_config = {}
+
+    def merged_parameters(self, options=None):
+        return dict(options or {})
+
+
+def test_prompt_is_read_from_stdin_without_conversation_mode():
+    cmd = CliBackend(FakeModel())._build_command({"max_tokens": 8})
+    assert cmd[0] == "llama-cli"
+    # The rendered prompt must not be templated again by llama-cli's chat mode
+    assert "-no-cnv" in cmd
+    assert cmd[cmd.index("-f") + 1] == "/dev/stdin"
+    assert "-p" not in cmd and "--prompt-cache" not in cmd
+
+
+def test_continued_session_saves_the_prompt_cache_non_interactively():
+    session = SimpleNamespace(turns=1, prompt_cache_path="/cache/fake-1.bin")
+    cmd = CliBackend(FakeModel())._build_command(None, session)
+    assert cmd[cmd.index("--prompt-cache") + 1] == "/cache/fake-1.bin"
+    assert "--prompt-cache-all" in cmd
+    assert "-no-cnv" in cmd
+
+
+def test_first_session_turn_writes_no_prompt_cache():
+    session = SimpleNamespace(turns=0, prompt_cache_path="/cache/fake-1.bin")
+    assert "--prompt-cache" not in CliBackend(FakeModel())._build_command(None, session)
+
+
+def test_draft_model_uses_llama_speculative():
+    cmd = CliBackend(FakeModel("/models/draft.gguf"))._build_command({"draft_max": 4})
+    assert cmd[0] == "llama-speculative"
+    assert cmd[cmd.index("-md") + 1] == "/models/draft.gguf"
+    assert cmd[cmd.index("-f") + 1] == "/dev/stdin"
+    assert cmd[cmd.index("--draft-max") + 1] == "4"
@@ -0,0 +1,140 @@
+import asyncio
+
+import pytest
+
+from make_gguf import write_gguf
+from src.models.chat_template import BUILTIN_TEMPLATES
+from src.models.context_budget import ContextBudget
+from src.models.tokenizer import read_tokenizer
+
+
+WORDS = ["hello", "world", "the", "quick", "brown", "fox", "system", "user", "assistant"]
+
+
+class FakeModel:
+    """The parts of LlamaCppModel the context budget uses."""
+
+    def __init__(self, tokenizer, context_size=256, parameters=None, context=None):
+        self.model_name = "fake"
+        self.model_config = {"context": context or {}}
+        self.chat_template = BUILTIN_TEMPLATES["chatml"]
+        self.context_size = context_size
+        self.default_params = parameters or {}
+        self.tokenizer = tokenizer
+
+    def render_chat(self, messages):
+        return self.chat_template.render(messages)
+
+    def merged_parameters(self, options=None):
+        return {**self.default_params, **(options or {})}
+
+    async def get_tokenizer(self):
+        return self.tokenizer
+
+
+@pytest.fixture(scope="module")
+def tokenizer(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp("gguf") / "vocab.gguf")
+    write_gguf(path, words=WORDS)
+    return read_tokenizer(path)
+
+
+def conversation(turns):
+    messages = [{"role": "system", "content": "the system"}]
+    for turn in range(turns):
+        messages.append({"role": "user", "content": f"hello world {turn} " * 5})
+        messages.append({"role": "assistant", "content": f"the quick brown fox {turn} " * 5})
+    messages.append({"role": "user", "content": "hello"})
+    return messages
+
+
+def fit(budget, model, messages, options=None):
+    return asyncio.run(budget.fit(model, messages, options))
+
+
+def total_tokens(budget, model, messages):
+    return sum(budget.count_messages(model, model.tokenizer, messages))
+
+
+def test_history_within_budget_is_untouched(tokenizer):
+    budget = ContextBudget({"policy": "window"})
+    model = FakeModel(tokenizer, context_size=4096)
+    messages = conversation(3)
+    assert fit(budget, model, messages, {"max_tokens": 64}) is messages
+
+
+@pytest.mark.parametrize("policy", ["window", "truncate"])
+def test_policies_keep_system_and_latest_message(tokenizer, policy):
+    budget = ContextBudget({"policy": policy})
+    model = FakeModel(tokenizer, context_size=256)
+    messages = conversation(20)
+
+    kept = fit(budget, model, messages, {"max_tokens": 64})
+    assert len(kept) < len(messages)
+    assert kept[0] == messages[0]
+    assert kept[-1] == messages[-1]
+    assert total_tokens(budget, model, kept) <= 256 - 64
+
+
+def test_window_drops_whole_turns(tokenizer):
+    budget = ContextBudget({"policy": "window"})
+    model = FakeModel(tokenizer, context_size=256)
+    messages = conversation(20)
+
+    kept = fit(budget, model, messages, {"max_tokens": 64})
+    # What is left of the history is an unmodified suffix of it
+    assert kept[1:] == messages[len(messages) - len(kept) + 1:]
+
+
+def test_truncate_keeps_the_tail_of_the_newest_dropped_message(tokenizer):
+    budget = ContextBudget({"policy": "truncate"})
+    model = FakeModel(tokenizer, context_size=256)
+    messages = conversation(20)
+
+    kept = fit(budget, model, messages, {"max_tokens": 64})
+    intact = len(kept) - 2
+    dropped = messages[len(messages) - intact - 1]
+    partial = kept[1]
+    assert partial["role"] == dropped["role"]
+    assert partial["content"] != dropped["content"]
+    assert dropped["content"].endswith(partial["content"])
+    assert kept[2:] == messages[len(messages) - intact:]
+
+
+def test_max_tokens_is_reserved(tokenizer):
+    budget = ContextBudget({"policy": "window"})
+    model = FakeModel(tokenizer, context_size=512)
+    messages = conversation(6)
+    size = total_tokens(budget, model, messages)
+    assert size < 512
+
+    assert fit(budget, model, messages, {"max_tokens": 512 - size}) is messages
+    kept = fit(budget, model, messages, {"max_tokens": 512 - size + 1})
+    assert len(kept) < len(messages)
+    assert total_tokens(budget, model, kept) <= size - 1
+
+    # A max_tokens from the model's defaults reserves the same room
+    model.default_params = {"max_tokens": 512 - size + 1}
+    assert fit(budget, model, messages) == kept
+
+
+def test_reserve_tokens_apply_without_max_tokens(tokenizer):
+    budget = ContextBudget({"policy": "window", "reserve_tokens": 200})
+    model = FakeModel(tokenizer, context_size=256)
+    kept = fit(budget, model, conversation(20))
+    assert total_tokens(budget, model, kept) <= 256 - 200
+
+
+def test_memoized_prefix_counts_match_fresh_counts(tokenizer):
+    budget = ContextBudget({})
+    model = FakeModel(tokenizer)
+    messages = conversation(5)
+
+    first = budget.count_messages(model, tokenizer, messages[:-2])
+    assert budget.hits == 0
+    grown = budget.count_messages(model, tokenizer, messages)
+    assert budget.hits == len(messages) - 2
+    assert grown[:-2] == first
+
+    fresh = ContextBudget({}).count_messages(model, tokenizer, messages)
+    assert grown == fresh
@@ -0,0 +1,49 @@
+from src.models.output_filter import OutputFilter
+
+
+def run(output_filter, chunks):
+    """Feed chunks one by one, then flush; returns everything emitted."""
+    return "".join(output_filter.feed(chunk) for chunk in chunks) + output_filter.flush()
+
+
+def test_artifact_split_across_chunks_is_removed():
+    output_filter = OutputFilter(artifacts=["<|im_end|>"])
+    assert run(output_filter, ["Hello<|im", "_e", "nd|> world"]) == "Hello world"
+
+
+def test_partial_artifact_is_held_back_until_decided():
+    output_filter = OutputFilter(artifacts=["<|im_end|>"])
+    assert output_filter.feed("Hello <|im") == "Hello "
+    # The held tail turned out not to be an artifact
+    assert output_filter.feed("possible") == "<|impossible"
+
+
+def test_stop_sequence_split_across_chunks_ends_output():
+    output_filter = OutputFilter(artifacts=[], stop=["\n\n"])
+    emitted = [output_filter.feed(chunk) for chunk in ["def f():\n    return 1\n", "\nprint(f())"]]
+    assert "".join(emitted) == "def f():\n    return 1"
+    assert output_filter.stopped
+    assert output_filter.stop_sequence == "\n\n"
+    assert output_filter.feed("more") == ""
+    assert output_filter.flush() == ""
+
+
+def test_prompt_echo_is_suppressed_across_chunks():
+    output_filter = OutputFilter(artifacts=[], prompt="User: hi\nAssistant:")
+    assert run(output_filter, ["User: h", "i\nAssis", "tant: Hello!"]) == "Hello!"
+
+
+def test_output_that_diverges_from_the_prompt_is_kept():
+    output_filter = OutputFilter(artifacts=[], prompt="User: hi")
+    assert run(output_filter, ["User", ": bye"]) == "User: bye"
+
+
+def test_flush_releases_held_back_tail():
+    output_filter = OutputFilter(artifacts=["EOF by user"])
+    assert output_filter.feed("The end. EOF") == "The end. "
+    assert output_filter.flush() == "EOF"
+
+
+def test_quote_markers_are_kept():
+    output_filter = OutputFilter()
+    assert run(output_filter, ["> Quote:\n", "> to be or not\n", "> "]) == "> Quote:\n> to be or not\n> "
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from make_gguf import write_gguf
+from src.models.tokenizer import load_tokenizer, read_tokenizer
+
+
+WORDS = ["hello", "world", "the", "quick", "brown", "fox", "system", "user", "assistant"]
+
+
+@pytest.fixture
+def gguf_path(tmp_path):
+    path = str(tmp_path / "vocab.gguf")
+    write_gguf(path, words=WORDS)
+    return path
+
+
+@pytest.fixture
+def tokenizer(gguf_path):
+    return read_tokenizer(gguf_path)
+
+
+@pytest.mark.parametrize("text", [
+    "hello world",
+    "the quick brown fox",
+    "  leading and trailing spaces  ",
+    "line one\nline two\n\n",
+    "héllo wörld, naïve café",
+    "emoji 🦙 and CJK 你好",
+    "<|im_end|>",
+])
+def test_encode_decode_round_trip(tokenizer, text):
+    assert tokenizer.decode(tokenizer.encode(text)) == text
+
+
+def test_known_words_are_single_pieces(tokenizer):
+    ids = tokenizer.encode("hello world")
+    assert [tokenizer.tokens[i] for i in ids] == ["▁hello", "▁world"]
+
+
+def test_unknown_text_falls_back_to_bytes(tokenizer):
+    ids = tokenizer.encode("é")
+    # "▁" is a piece, é is its two UTF-8 bytes
+    assert [tokenizer.tokens[i] for i in ids] == ["▁", "<0xC3>", "<0xA9>"]
+
+
+def test_special_tokens_are_matched_literally(tokenizer):
+    ids = tokenizer.encode("<|im_start|>user\nhello<|im_end|>")
+    assert ids[0] == tokenizer.ids["<|im_start|>"]
+    assert ids[-1] == tokenizer.ids["<|im_end|>"]
+    # Like llama.cpp, text after a special token gets a space prefix
+    assert tokenizer.tokens[ids[1]] == "▁user"
+    assert tokenizer.decode(ids) == "<|im_start|> user\nhello<|im_end|>"
+
+
+def test_bos_only_when_asked(tokenizer):
+    assert tokenizer.encode("hello", add_bos=True) == [tokenizer.bos_id] + tokenizer.encode("hello")
+    assert tokenizer.count("hello world") == 2
+
+
+def test_decode_rejects_ids_outside_vocabulary(tokenizer):
+    with pytest.raises(ValueError):
+        tokenizer.decode([tokenizer.vocab_size])
+
+
+def test_load_tokenizer_is_shared_until_the_file_changes(gguf_path):
+    first = load_tokenizer(gguf_path)
+    assert load_tokenizer(gguf_path) is first
+
+    write_gguf(gguf_path, words=WORDS + ["llama"])
+    stat = os.stat(gguf_path)
+    os.utime(gguf_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1))
+    reloaded = load_tokenizer(gguf_path)
+    assert reloaded is not first
+    assert "▁llama" in reloaded.ids
+    assert reloaded.fingerprint != first.fingerprint